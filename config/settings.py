@@ -150,12 +150,19 @@ STATICFILES_FINDERS = [
 
 # File upload settings
 FILE_UPLOAD_HANDLERS = [
+    'processor.uploadhandlers.Sha256UploadHandler',  # must stay first: hashes chunks as they stream in
     'django.core.files.uploadhandler.MemoryFileUploadHandler',
     'django.core.files.uploadhandler.TemporaryFileUploadHandler',
 ]
 
 MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10MB
 
+# Processes that render segregation section workbooks in parallel (1 renders in the request thread).
+# Every gunicorn worker starts its own pool of this size on first use, so the worst case is
+# workers (2 x CPUs + 1) x REPORT_RENDER_PROCESSES extra Python processes of roughly 100 MB each
+# (18 processes, about 1.8 GB, on 4 cores with a value of 2). Raise it only when that fits in memory.
+REPORT_RENDER_PROCESSES = config('REPORT_RENDER_PROCESSES', default=1, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
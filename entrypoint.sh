@@ -20,8 +20,16 @@ else:
 PY
 fi
 
-python manage.py migrate --noinput
-python manage.py collectstatic --noinput
+# Only the web service applies migrations; other services (the worker) wait for them
+if [ "${RUN_MIGRATIONS:-1}" = "1" ]; then
+  python manage.py migrate --noinput
+  python manage.py collectstatic --noinput
+else
+  echo "Waiting for migrations to be applied..."
+  until python manage.py migrate --check >/dev/null 2>&1; do
+    sleep 2
+  done
+fi
 
 # Create media subdirectories
 mkdir -p /app/media/processed /app/media/uploads
@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth import get_user_model
-from .models import ProcessedFile, StaffDetails, Department, Section
+from .models import ProcessedFile, ProcessingJob, StaffDetails, Department, Section
 
 User = get_user_model()
 
@@ -34,15 +34,23 @@ class CustomUserAdmin(UserAdmin):
 @admin.register(ProcessedFile)
 class ProcessedFileAdmin(admin.ModelAdmin):
     """Admin for ProcessedFile model"""
-    list_display = ('filename', 'user', 'status', 'created_at', 'updated_at')
-    list_filter = ('status', 'created_at', 'user')
+    list_display = ('filename', 'user', 'status', 'detected_layout', 'created_at', 'updated_at')
+    list_filter = ('status', 'detected_layout', 'created_at', 'user')
     search_fields = ('original_file', 'user__email', 'user__first_name', 'user__last_name')
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('-created_at',)
     
     fieldsets = (
         ('File Information', {
-            'fields': ('user', 'original_file', 'processed_file', 'status')
+            'fields': ('user', 'original_file', 'processed_file', 'attendance_artifact', 'status')
+        }),
+        ('Detection', {
+            'fields': ('detected_layout', 'layout_confidence', 'content_hash'),
+            'classes': ('collapse',)
+        }),
+        ('File Metadata', {
+            'fields': ('period_text', 'period_start', 'period_end'),
+            'classes': ('collapse',)
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -55,6 +63,16 @@ class ProcessedFileAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(ProcessingJob)
+class ProcessingJobAdmin(admin.ModelAdmin):
+    """Admin for ProcessingJob model"""
+    list_display = ('id', 'processed_file', 'status', 'attempts', 'worker_id', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('processed_file__original_file', 'worker_id')
+    readonly_fields = ('created_at', 'started_at', 'heartbeat_at', 'finished_at')
+    ordering = ('-created_at',)
+
+
 @admin.register(StaffDetails)
 class StaffDetailsAdmin(admin.ModelAdmin):
     """Admin for StaffDetails model"""
@@ -0,0 +1,300 @@
+"""
+Indexed in-memory view of the normalized attendance frame shared by the report builders
+"""
+import re
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+
+
+class AttendanceMatrix:
+    """Single Responsibility: dense employee × day access to normalized attendance data.
+
+    Built once from the frame produced by ExcelProcessorService. Employees and
+    days keep their first-appearance order, so iterating the matrix visits
+    employees in the same order as ``df['Employee_ID'].dropna().unique()``.
+
+    Two views are kept:
+    * dense (employee × day) grids of the raw cell values plus numeric
+      in/out minutes, worked hours and status codes (last record wins when an
+      employee has the same day twice);
+    * the employee's records in original row order, for per-record rules such
+      as counting every row.
+    """
+
+    FIELDS = ('InTime', 'OutTime', 'Status', 'WorkedHours')
+    TIME_PATTERN = r'^\s*(\d{1,2}):(\d{2})'
+
+    def __init__(self, data: pd.DataFrame):
+        data = data.reset_index(drop=True)
+        if 'Employee_ID' in data.columns:
+            data = data[data['Employee_ID'].notna()].reset_index(drop=True)
+        else:
+            data = data.iloc[0:0]
+
+        emp_codes, employee_ids = pd.factorize(self._column(data, 'Employee_ID'), sort=False)
+        day_codes, days = pd.factorize(self._column(data, 'Date'), sort=False)
+        status_values = self._column(data, 'Status')
+        status_codes, statuses = pd.factorize(status_values, sort=False)
+
+        self.employee_ids: List[Any] = list(employee_ids)
+        self.index: Dict[Any, int] = {emp_id: i for i, emp_id in enumerate(self.employee_ids)}
+        self.days: List[Any] = list(days)
+        self.statuses: List[Any] = list(statuses)
+        n_emp, n_days = len(self.employee_ids), len(self.days)
+
+        # First record per employee / per day carries name, designation and day name
+        first_emp_row = self._first_rows(emp_codes, n_emp)
+        self.names = self._column(data, 'Employee_Name')[first_emp_row]
+        self.designations = self._column(data, 'Designation')[first_emp_row]
+        self.day_names = self._column(data, 'Day_Name')[self._first_rows(day_codes, n_days)]
+
+        # Records grouped by employee, original order kept within each employee
+        order = np.argsort(emp_codes, kind='stable')
+        self._order = order
+        self._offsets = np.searchsorted(emp_codes[order], np.arange(n_emp + 1))
+        self.record_emp = emp_codes
+        self.record_day = day_codes
+        self.record_status = status_codes
+        self.record_values = {field: self._column(data, field) for field in self.FIELDS}
+        self.record_dates = self._column(data, 'Date')
+
+        # Dense grids (last record wins for repeated employee/day pairs)
+        has_day = day_codes >= 0
+        cell = emp_codes[has_day] * max(n_days, 1) + day_codes[has_day]
+        rows = np.flatnonzero(has_day)
+        _, last_from_end = np.unique(cell[::-1], return_index=True)
+        keep = rows[len(rows) - 1 - last_from_end] if len(rows) else rows
+        ke, kd = emp_codes[keep], day_codes[keep]
+
+        self.has_record = np.zeros((n_emp, n_days), dtype=bool)
+        self.has_record[ke, kd] = True
+        self.status_code = np.full((n_emp, n_days), -1, dtype=np.int32)
+        self.status_code[ke, kd] = status_codes[keep]
+        self.cells: Dict[str, np.ndarray] = {}
+        for field in self.FIELDS:
+            grid = np.full((n_emp, n_days), None, dtype=object)
+            grid[ke, kd] = self.record_values[field][keep]
+            self.cells[field] = grid
+
+        self.in_minutes = self._minutes_grid(self.record_values['InTime'], keep, ke, kd, (n_emp, n_days))
+        self.out_minutes = self._minutes_grid(self.record_values['OutTime'], keep, ke, kd, (n_emp, n_days))
+        self.worked_hours = self._hours_grid(self.record_values['WorkedHours'], keep, ke, kd, (n_emp, n_days))
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame) -> 'AttendanceMatrix':
+        return cls(data)
+
+    @staticmethod
+    def _column(data: pd.DataFrame, name: str) -> np.ndarray:
+        if name in data.columns:
+            return data[name].to_numpy(dtype=object)
+        return np.full(len(data), None, dtype=object)
+
+    @staticmethod
+    def _first_rows(codes: np.ndarray, n: int) -> np.ndarray:
+        valid = np.flatnonzero(codes >= 0)
+        _, first = np.unique(codes[valid], return_index=True)
+        return valid[first] if n else np.array([], dtype=int)
+
+    @classmethod
+    def _minutes_grid(cls, values, keep, ke, kd, shape) -> np.ndarray:
+        grid = np.full(shape, np.nan)
+        if len(keep):
+            parts = pd.Series(values[keep], dtype=object).astype(str).str.extract(cls.TIME_PATTERN)
+            grid[ke, kd] = parts[0].astype(float).to_numpy() * 60 + parts[1].astype(float).to_numpy()
+        return grid
+
+    @classmethod
+    def _hours_grid(cls, values, keep, ke, kd, shape) -> np.ndarray:
+        """Worked hours from 'HH:MM[:SS]' strings (matrix layout) or plain numbers (legacy layout)"""
+        grid = cls._minutes_grid(values, keep, ke, kd, shape) / 60
+        if len(keep):
+            numeric = np.full(shape, np.nan)
+            numeric[ke, kd] = pd.to_numeric(pd.Series(values[keep], dtype=object), errors='coerce').to_numpy(dtype=float)
+            grid = np.where(np.isnan(grid), numeric, grid)
+        return grid
+
+    def __len__(self) -> int:
+        return len(self.employee_ids)
+
+    def __contains__(self, emp_id) -> bool:
+        return emp_id in self.index
+
+    def row_of(self, emp_id) -> Optional[int]:
+        """Matrix row of an employee ID, or None when the file has no records for it"""
+        return self.index.get(emp_id)
+
+    def record_positions(self, row: int) -> np.ndarray:
+        """Positions of an employee's records, in original row order"""
+        return self._order[self._offsets[row]:self._offsets[row + 1]]
+
+    def records(self, row: int) -> Dict[str, np.ndarray]:
+        """An employee's records (Date plus FIELDS), in original row order"""
+        positions = self.record_positions(row)
+        records = {field: values[positions] for field, values in self.record_values.items()}
+        records['Date'] = self.record_dates[positions]
+        return records
+
+    def days_with_records(self, rows) -> np.ndarray:
+        """Day columns where at least one of the given employees has a record"""
+        rows = np.asarray(rows, dtype=int)
+        if not len(rows):
+            return np.array([], dtype=int)
+        return np.flatnonzero(self.has_record[rows].any(axis=0))
+
+
+class StatusClassifier:
+    """Single Responsibility: map raw attendance status strings to report categories.
+
+    Rules are evaluated top to bottom on the stripped, upper-cased status and
+    the first match wins. 'P' is tested before 'PL', so a 'PL' status counts
+    as present, as it always has in the reports. A sheet only holds a few
+    dozen distinct statuses, so each one is classified once and cached.
+    """
+
+    CATEGORIES = (
+        'present', 'absent', 'weekly_off', 'personal_leave', 'sick_leave',
+        'casual_leave', 'substitute_leave', 'duty_leave', 'other_leave',
+    )
+
+    # (category, test, tokens)
+    RULES = (
+        ('present', 'contains', ('P', 'A *')),
+        ('absent', 'equals', ('A',)),
+        ('weekly_off', 'contains', ('WO', 'HO')),
+        ('personal_leave', 'contains', ('PL',)),
+        ('sick_leave', 'contains', ('SL',)),
+        ('casual_leave', 'contains', ('CL',)),
+        ('substitute_leave', 'contains', ('SUBSTITUTE', 'SUBL')),
+        ('duty_leave', 'contains', ('DUTY',)),
+        ('other_leave', 'contains', ('L',)),
+    )
+    DEFAULT_CATEGORY = 'other_leave'
+
+    def __init__(self):
+        self.code = {category: i for i, category in enumerate(self.CATEGORIES)}
+        self._cache: Dict[str, int] = {}
+
+    def classify(self, status) -> int:
+        """Category code of one raw status value"""
+        key = str(status).strip().upper()
+        code = self._cache.get(key)
+        if code is None:
+            code = self.code[self.DEFAULT_CATEGORY]
+            for category, test, tokens in self.RULES:
+                if (test == 'equals' and key in tokens) or (test == 'contains' and any(t in key for t in tokens)):
+                    code = self.code[category]
+                    break
+            self._cache[key] = code
+        return code
+
+    def classify_codes(self, statuses: List[Any]) -> np.ndarray:
+        """Category codes for factorized statuses; the extra last entry covers missing (-1) statuses"""
+        return np.array([self.classify(s) for s in list(statuses) + [None]], dtype=np.int64)
+
+
+class AttendanceSummary:
+    """Single Responsibility: per-employee attendance totals shared by every report.
+
+    Counts come from one bincount over (employee, category) pairs. Weekly-off
+    days earn an allowance only when an in or out time was recorded.
+    """
+
+    TOTALS = (
+        'present_days', 'absent_days', 'weekly_off_days', 'allowance_days',
+        'personal_leave_days', 'sick_leave_days', 'casual_leave_days',
+        'substitute_leave_days', 'duty_leave_days', 'other_leave_days',
+    )
+
+    # Totals as sums of category counts
+    TOTAL_CATEGORIES = {
+        'present_days': ('present', 'weekly_off'),
+        'absent_days': ('absent',),
+        'weekly_off_days': ('weekly_off',),
+        'personal_leave_days': ('personal_leave',),
+        'sick_leave_days': ('sick_leave',),
+        'casual_leave_days': ('casual_leave',),
+        'substitute_leave_days': ('substitute_leave',),
+        'duty_leave_days': ('duty_leave',),
+        'other_leave_days': ('other_leave', 'duty_leave'),
+    }
+
+    # Remarks column: label and category, in display order
+    REMARKS = (
+        ('PL', 'personal_leave'),
+        ('CL', 'casual_leave'),
+        ('SL', 'sick_leave'),
+        ('SUBSTITUTE', 'substitute_leave'),
+        ('DUTY', 'duty_leave'),
+        ('Other', 'other_leave'),
+        ('Absent', 'absent'),
+    )
+
+    DAY_NUMBER_PATTERN = re.compile(r"\s*(\d{1,2})\b")
+
+    def __init__(self, matrix: AttendanceMatrix, classifier: Optional[StatusClassifier] = None):
+        self.matrix = matrix
+        self.classifier = classifier or StatusClassifier()
+        n_emp, n_cat = len(matrix), len(self.classifier.CATEGORIES)
+        code = self.classifier.code
+
+        self.record_category = self.classifier.classify_codes(matrix.statuses)[matrix.record_status]
+        self.counts = np.bincount(
+            matrix.record_emp * n_cat + self.record_category, minlength=n_emp * n_cat
+        ).reshape(n_emp, n_cat)
+
+        self.totals_array = np.zeros((n_emp, len(self.TOTALS)), dtype=np.int64)
+        for i, name in enumerate(self.TOTALS):
+            if name in self.TOTAL_CATEGORIES:
+                for category in self.TOTAL_CATEGORIES[name]:
+                    self.totals_array[:, i] += self.counts[:, code[category]]
+
+        worked_off = (self.record_category == code['weekly_off']) & self._has_work_time()
+        allowance = self.counts[:, code['present']] + np.bincount(matrix.record_emp[worked_off], minlength=n_emp)
+        self.totals_array[:, self.TOTALS.index('allowance_days')] = allowance
+
+        # Records grouped by (employee, category), original order kept inside each group
+        order = np.lexsort((self.record_category, matrix.record_emp))
+        self._order = order
+        self._offsets = np.searchsorted(
+            (matrix.record_emp * n_cat + self.record_category)[order], np.arange(n_emp * n_cat + 1)
+        )
+
+    def _has_work_time(self) -> np.ndarray:
+        """Per record: an in or out time is present (not blank, not NaN)"""
+        present = np.zeros(len(self.matrix.record_emp), dtype=bool)
+        for field in ('InTime', 'OutTime'):
+            codes, uniques = pd.factorize(pd.Series(self.matrix.record_values[field], dtype=object), use_na_sentinel=True)
+            has = np.array([bool(v) and str(v).strip() not in ('', 'nan') for v in uniques] + [False], dtype=bool)
+            present |= has[codes]
+        return present
+
+    def totals(self, row: Optional[int]) -> Dict[str, int]:
+        """Report totals of one matrix row; all zeros for employees without records"""
+        if row is None:
+            return {name: 0 for name in self.TOTALS}
+        return {name: int(value) for name, value in zip(self.TOTALS, self.totals_array[row])}
+
+    def dates(self, row: Optional[int], category: str) -> List[Any]:
+        """Dates of an employee's records in one category, in original row order"""
+        if row is None:
+            return []
+        slot = row * len(self.classifier.CATEGORIES) + self.classifier.code[category]
+        positions = self._order[self._offsets[slot]:self._offsets[slot + 1]]
+        return list(self.matrix.record_dates[positions])
+
+    @classmethod
+    def day_only(cls, value) -> str:
+        text = str(value)
+        m = cls.DAY_NUMBER_PATTERN.match(text)
+        return m.group(1) if m else text
+
+    def remarks(self, row: Optional[int]) -> str:
+        """Remarks text such as 'CL on 3, 4, Absent on 9' (day numbers only)"""
+        parts = []
+        for label, category in self.REMARKS:
+            dates = self.dates(row, category)
+            if dates:
+                parts.append(f"{label} on {', '.join(self.day_only(d) for d in dates)}")
+        return ', '.join(parts)
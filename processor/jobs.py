@@ -0,0 +1,246 @@
+"""
+Database-backed job queue for file processing.
+Views enqueue a ProcessingJob; `manage.py run_workers` claims queued jobs with
+SELECT ... FOR UPDATE SKIP LOCKED and runs them in a process pool. Postgres is
+the only broker.
+"""
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import ProcessedFile, ProcessingJob
+from .services import ExcelProcessorService
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def enqueue_processing(processed_file, template_path=None):
+    """
+    Queue a processing run for the file unless one is already waiting or running.
+    Returns the active job.
+    """
+    with transaction.atomic():
+        # Lock the file row: with no active job a FOR UPDATE on the jobs matches nothing,
+        # so two concurrent requests would both create one
+        ProcessedFile.objects.select_for_update().only('pk').get(pk=processed_file.pk)
+        job = (ProcessingJob.objects
+               .filter(processed_file=processed_file, status__in=['queued', 'running'])
+               .first())
+        if job:
+            if template_path != job.template_path:
+                discard_template(template_path)
+            return job
+        job = ProcessingJob.objects.create(processed_file=processed_file, template_path=template_path)
+        ProcessedFile.objects.filter(pk=processed_file.pk).update(status='pending', error_message=None)
+    logger.info(f"Queued job {job.id} for file {processed_file.id}")
+    return job
+
+
+def discard_template(template_path):
+    """Remove a template uploaded for one job; only files under MEDIA_ROOT/templates are touched"""
+    if not template_path:
+        return
+    templates_dir = os.path.abspath(os.path.join(settings.MEDIA_ROOT, 'templates'))
+    path = os.path.abspath(template_path)
+    if os.path.dirname(path) != templates_dir:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove template {path}: {e}")
+
+
+def claim_next_job(worker_id):
+    """Claim the oldest queued job; concurrent workers skip rows that are already locked"""
+    with transaction.atomic():
+        job = (ProcessingJob.objects.select_for_update(skip_locked=True)
+               .filter(status='queued')
+               .order_by('created_at')
+               .first())
+        if job is None:
+            return None
+        now = timezone.now()
+        job.status = 'running'
+        job.worker_id = worker_id
+        job.attempts += 1
+        job.started_at = now
+        job.heartbeat_at = now
+        job.save(update_fields=['status', 'worker_id', 'attempts', 'started_at', 'heartbeat_at'])
+    return job
+
+
+def touch_jobs(job_ids):
+    """Refresh the heartbeat of jobs this worker is still running"""
+    if job_ids:
+        ProcessingJob.objects.filter(id__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+
+def requeue_stale_jobs(stale_after_seconds):
+    """
+    Put running jobs whose worker stopped heartbeating back on the queue.
+    Jobs that already used up MAX_ATTEMPTS are failed instead.
+    Returns the number of jobs touched.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after_seconds)
+    touched = 0
+    with transaction.atomic():
+        stale = ProcessingJob.objects.select_for_update(skip_locked=True).filter(status='running', heartbeat_at__lt=cutoff)
+        for job in stale:
+            if job.attempts >= MAX_ATTEMPTS:
+                fail_job(job, f"Worker {job.worker_id} stopped responding after {job.attempts} attempts")
+            else:
+                job.status = 'queued'
+                job.worker_id = None
+                job.save(update_fields=['status', 'worker_id'])
+                ProcessedFile.objects.filter(pk=job.processed_file_id).update(status='pending')
+                logger.warning(f"Requeued stale job {job.id} for file {job.processed_file_id}")
+            touched += 1
+    return touched
+
+
+def fail_job(job, error):
+    job.status = 'failed'
+    job.error_message = str(error)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at'])
+    ProcessedFile.objects.filter(pk=job.processed_file_id).update(status='failed', error_message=str(error))
+    discard_template(job.template_path)
+
+
+class ThrottledProgressRecorder:
+    """
+    progress_callback(pct, message, rows=None) that persists onto a ProcessingJob.
+    Writes are throttled to one UPDATE per `min_interval` seconds; stage changes
+    and completion are always written so the bar never skips a stage.
+    """
+
+    STAGES = [
+        (20, 'starting'),
+        (40, 'reading'),
+        (80, 'parsing'),
+        (95, 'writing'),
+        (100, 'saving'),
+    ]
+
+    def __init__(self, job, min_interval=0.25):
+        self.job_id = job.pk
+        self.min_interval = min_interval
+        self._last_write = 0.0
+        self._written_stage = None
+        self._pending = None
+        self.rows = 0
+
+    @classmethod
+    def stage_for(cls, pct):
+        for upper, stage in cls.STAGES:
+            if pct < upper:
+                return stage
+        return 'done'
+
+    def __call__(self, pct, message, rows=None):
+        if rows is not None:
+            self.rows = rows
+        stage = self.stage_for(pct)
+        self._pending = {
+            'progress': int(max(0, min(pct, 100))),
+            'stage': stage,
+            'progress_message': str(message)[:255],
+            'rows_processed': self.rows,
+        }
+        now = time.monotonic()
+        if stage != self._written_stage or pct >= 100 or now - self._last_write >= self.min_interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending is None:
+            return
+        ProcessingJob.objects.filter(pk=self.job_id).update(progress_updated_at=timezone.now(), **self._pending)
+        self._written_stage = self._pending['stage']
+        self._last_write = time.monotonic()
+        self._pending = None
+
+
+def process_uploaded_file(processed_file, template_path=None, progress_callback=None):
+    """
+    Run ExcelProcessorService on the stored upload and record the outcome on the ProcessedFile.
+    Returns the service result dict.
+    """
+    input_path = processed_file.original_file.path
+    output_filename = f"processed_{os.path.basename(input_path)}"
+    output_path = os.path.join(settings.MEDIA_ROOT, 'processed', output_filename)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+
+    processed_file.status = 'processing'
+    processed_file.save(update_fields=['status', 'updated_at'])
+
+    logger.info(f"Processing file: input_path={input_path}, output_path={output_path}")
+    service = ExcelProcessorService()
+    result = service.process_file(input_path, output_path, template_path, progress_callback=progress_callback)
+
+    if result['success']:
+        processed_file.status = 'completed'
+        processed_file.processed_file = os.path.join('processed', output_filename)
+        # Without an artifact the report views parse the upload and backfill it
+        processed_file.attendance_artifact = (
+            os.path.relpath(result['artifact_path'], settings.MEDIA_ROOT) if result['artifact_path'] else None
+        )
+        processed_file.detected_layout = result['layout']
+        processed_file.layout_confidence = result['layout_confidence']
+        processed_file.apply_metadata(result['metadata'])
+        processed_file.error_message = None
+    else:
+        processed_file.status = 'failed'
+        processed_file.error_message = result.get('error', 'Unknown error')
+    processed_file.save()
+    return result
+
+
+def run_job(job_id):
+    """
+    Process one claimed job. Runs inside a pool worker process.
+    Returns the final job status.
+    """
+    job = ProcessingJob.objects.select_related('processed_file').get(id=job_id)
+    recorder = ThrottledProgressRecorder(job)
+    try:
+        result = process_uploaded_file(job.processed_file, job.template_path, progress_callback=recorder)
+    except Exception as e:
+        logger.exception(f"Job {job.id} crashed")
+        fail_job(job, e)
+        return job.status
+    finally:
+        recorder.flush()
+
+    if result['success']:
+        job.status = 'completed'
+        job.error_message = None
+    else:
+        job.status = 'failed'
+        job.error_message = result.get('error', 'Unknown error')
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error_message', 'finished_at'])
+    discard_template(job.template_path)
+    return job.status
+
+
+def run_job_in_pool(job_id):
+    """Pool entry point; the executor initializer has already run django.setup() in this process"""
+    close_old_connections()
+    try:
+        return run_job(job_id)
+    finally:
+        close_old_connections()
@@ -0,0 +1,128 @@
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from processor.services import DataProcessor, ExcelWriter
+
+
+class Command(BaseCommand):
+    help = 'Compare the openpyxl and streaming XML writers on a synthetic attendance matrix'
+
+    STATUSES = ['P', 'A', 'WO', 'HD', 'L']
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--employees',
+            type=int,
+            default=3000,
+            help='Employees in the synthetic matrix (default: 3000)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=32,
+            help='Day columns per employee (default: 32)',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=1,
+            help='Timed runs per writer; the fastest is reported',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Read both outputs back and check that the cell values match',
+        )
+
+    def handle(self, *args, **options):
+        data = self.synthetic_frame(options['employees'], options['days'])
+        self.stdout.write(
+            f"{options['employees']} employees x {options['days']} days x 4 values: {len(data)} rows"
+        )
+
+        writer = ExcelWriter()
+        writers = {
+            'openpyxl': writer._write_new_file,
+            'xml': writer._write_xml_stream,
+        }
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            results = {}
+            for name, write in writers.items():
+                output_path = os.path.join(tmp_dir, f'{name}.xlsx')
+                seconds = min(self._timed(write, data, output_path) for _ in range(max(1, options['repeat'])))
+                # Memory is measured on a separate run; tracemalloc slows the writers down a lot
+                tracemalloc.start()
+                try:
+                    write(data, output_path)
+                    peak = tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+                results[name] = seconds
+                self.stdout.write(
+                    f'{name:10s} {seconds:8.2f}s  peak {peak / 1e6:7.1f} MB  '
+                    f'size {os.path.getsize(output_path) / 1e6:6.2f} MB'
+                )
+
+            self.stdout.write(self.style.SUCCESS(f"Speedup: {results['openpyxl'] / results['xml']:.1f}x"))
+
+            if options['verify']:
+                expected, actual = (self._values(os.path.join(tmp_dir, f'{name}.xlsx')) for name in writers)
+                if expected == actual:
+                    self.stdout.write(self.style.SUCCESS('Cell values match'))
+                else:
+                    self.stdout.write(self.style.ERROR('Cell values differ'))
+
+    def synthetic_frame(self, employees, days):
+        """Processed matrix frame: one row per employee-day with in/out time, status and worked hours (empty when absent)"""
+        rng = np.random.default_rng(0)
+        n_rows = employees * days
+        employee = np.repeat(np.arange(employees), days)
+        day = np.tile(np.arange(1, days + 1), employees)
+        day_names = np.array(['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'], dtype=object)
+        in_minutes = rng.integers(7 * 60, 10 * 60, n_rows)
+        out_minutes = in_minutes + rng.integers(4 * 60, 11 * 60, n_rows)
+
+        def clock(minutes):
+            return np.array([f'{m // 60:02d}:{m % 60:02d}:00' for m in minutes], dtype=object)
+
+        status = np.array(self.STATUSES, dtype=object)[rng.integers(0, len(self.STATUSES), n_rows)]
+        # Absent days and weekly offs have no times, as in parsed uploads: empty strings, not None
+        no_times = np.isin(status, ['A', 'WO'])
+
+        def times(values):
+            values[no_times] = ''
+            return values
+
+        columns = [
+            np.array([f'S.N-{e}' for e in employee], dtype=object),
+            np.array([f'NAME {e}' for e in employee], dtype=object),
+            np.array([f'POST {e % 40}' for e in employee], dtype=object),
+            np.array([f'{d:02d} {day_names[d % 7]}' for d in day], dtype=object),
+            day_names[day % 7],
+            times(clock(in_minutes)),
+            times(clock(out_minutes)),
+            status,
+            times(clock(out_minutes - in_minutes)),
+        ]
+        return pd.DataFrame(dict(zip(DataProcessor.MATRIX_COLUMNS, columns)), columns=DataProcessor.MATRIX_COLUMNS)
+
+    @staticmethod
+    def _timed(write, data, output_path):
+        started = time.perf_counter()
+        write(data, output_path)
+        return time.perf_counter() - started
+
+    @staticmethod
+    def _values(path):
+        workbook = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return list(workbook.active.iter_rows(values_only=True))
+        finally:
+            workbook.close()
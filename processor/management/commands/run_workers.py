@@ -0,0 +1,111 @@
+import multiprocessing
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from processor.jobs import (
+    claim_next_job, default_worker_id, fail_job, requeue_stale_jobs, run_job_in_pool, touch_jobs,
+)
+from processor.models import ProcessingJob
+
+
+class Command(BaseCommand):
+    help = 'Run background workers that process queued file uploads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=max(1, multiprocessing.cpu_count() - 1),
+            help='Number of worker processes (default: CPU count - 1)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait between queue checks when idle',
+        )
+        parser.add_argument(
+            '--stale-after',
+            type=int,
+            default=600,
+            help='Seconds without a heartbeat before a running job is requeued',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of running forever',
+        )
+
+    def handle(self, *args, **options):
+        processes = max(1, options['processes'])
+        poll_interval = options['poll_interval']
+        stale_after = options['stale_after']
+        worker_id = default_worker_id()
+
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+
+        self.stdout.write(f'Worker {worker_id} starting with {processes} processes')
+
+        # spawn: children never inherit the parent's database connections
+        executor = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+        in_flight = {}
+        try:
+            while True:
+                close_old_connections()
+                requeued = requeue_stale_jobs(stale_after)
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale job(s)'))
+
+                # Fill free pool slots with queued jobs
+                while not self._stopping and len(in_flight) < processes:
+                    job = claim_next_job(worker_id)
+                    if job is None:
+                        break
+                    self.stdout.write(f'Claimed job {job.id} for file {job.processed_file_id}')
+                    in_flight[executor.submit(run_job_in_pool, job.id)] = job.id
+
+                if not in_flight:
+                    if self._stopping or options['once']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                done, _ = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = in_flight.pop(future)
+                    self._report(future, job_id)
+                touch_jobs(list(in_flight.values()))
+        finally:
+            executor.shutdown(wait=True)
+
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker_id} stopped'))
+
+    def _report(self, future, job_id):
+        try:
+            status = future.result()
+        except Exception as e:
+            # The pool process died before the job could record its own outcome
+            job = ProcessingJob.objects.filter(id=job_id).first()
+            if job and job.status == 'running':
+                fail_job(job, f'Worker process failed: {e}')
+            self.stdout.write(self.style.ERROR(f'Job {job_id} failed: {e}'))
+            return
+        if status == 'completed':
+            self.stdout.write(self.style.SUCCESS(f'Job {job_id} completed'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Job {job_id} {status}'))
+
+    def _request_stop(self, signum, frame):
+        self.stdout.write('Stop requested, finishing running jobs...')
+        self._stopping = True
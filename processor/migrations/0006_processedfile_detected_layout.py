@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-16 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0005_alter_staffdetails_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedfile',
+            name='detected_layout',
+            field=models.CharField(blank=True, choices=[('matrix', 'Matrix (InTime/OutTime/Status/Worked blocks)'), ('legacy', 'Legacy (Report (1).xls)'), ('tabular', 'Flat table'), ('unknown', 'Unknown')], max_length=20, null=True, verbose_name='Detected Layout'),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='layout_confidence',
+            field=models.FloatField(blank=True, null=True, verbose_name='Layout Confidence'),
+        ),
+    ]
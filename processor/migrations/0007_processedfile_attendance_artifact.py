@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-16 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0006_processedfile_detected_layout'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedfile',
+            name='attendance_artifact',
+            field=models.FileField(blank=True, null=True, upload_to='processed/', verbose_name='Attendance Artifact'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-16 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0007_processedfile_attendance_artifact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedfile',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True, verbose_name='Content SHA-256'),
+        ),
+    ]
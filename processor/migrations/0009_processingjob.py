@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-16 11:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0008_processedfile_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], db_index=True, default='queued', max_length=20)),
+                ('template_path', models.CharField(blank=True, max_length=500, null=True, verbose_name='Template Path')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('worker_id', models.CharField(blank=True, max_length=100, null=True, verbose_name='Worker')),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_file', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='processor.processedfile', verbose_name='File')),
+            ],
+            options={
+                'verbose_name': 'Processing Job',
+                'verbose_name_plural': 'Processing Jobs',
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='processor_p_status_d731f3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-16 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0009_processingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processingjob',
+            name='progress',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='stage',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='progress_message',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='rows_processed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='processingjob',
+            name='progress_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-16 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0010_processingjob_progress'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='processedfile',
+            name='period_text',
+            field=models.CharField(blank=True, max_length=255, null=True, verbose_name='Period'),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='period_start',
+            field=models.CharField(blank=True, max_length=20, null=True, verbose_name='Period Start'),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='period_end',
+            field=models.CharField(blank=True, max_length=20, null=True, verbose_name='Period End'),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='header_row_index',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='Header Row Index'),
+        ),
+        migrations.AddField(
+            model_name='processedfile',
+            name='day_columns',
+            field=models.JSONField(blank=True, null=True, verbose_name='Day Columns'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0011_processedfile_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaffVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32, unique=True, verbose_name='Scope')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='Version')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Staff Version',
+                'verbose_name_plural': 'Staff Versions',
+            },
+        ),
+    ]
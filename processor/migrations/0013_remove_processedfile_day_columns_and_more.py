@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 12:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('processor', '0012_staffversion'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='processedfile',
+            name='day_columns',
+        ),
+        migrations.RemoveField(
+            model_name='processedfile',
+            name='header_row_index',
+        ),
+    ]
@@ -1,4 +1,7 @@
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
 from django.utils import timezone
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.contrib.auth import get_user_model
@@ -118,13 +121,30 @@ class ProcessedFile(models.Model):
         ('failed', 'Failed'),
     ]
     
+    LAYOUT_CHOICES = [
+        ('matrix', 'Matrix (InTime/OutTime/Status/Worked blocks)'),
+        ('legacy', 'Legacy (Report (1).xls)'),
+        ('tabular', 'Flat table'),
+        ('unknown', 'Unknown'),
+    ]
+    
     user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, verbose_name="Uploaded By", null=True, blank=True)
     original_file = models.FileField(upload_to='uploads/')
     processed_file = models.FileField(upload_to='processed/', blank=True, null=True)
+    attendance_artifact = models.FileField(upload_to='processed/', blank=True, null=True, verbose_name="Attendance Artifact")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     error_message = models.TextField(blank=True, null=True)
+    detected_layout = models.CharField(max_length=20, choices=LAYOUT_CHOICES, blank=True, null=True, verbose_name="Detected Layout")
+    layout_confidence = models.FloatField(blank=True, null=True, verbose_name="Layout Confidence")
+    content_hash = models.CharField(max_length=64, blank=True, null=True, db_index=True, verbose_name="Content SHA-256")
+    # File-level metadata extracted once at processing time
+    period_text = models.CharField(max_length=255, blank=True, null=True, verbose_name="Period")
+    period_start = models.CharField(max_length=20, blank=True, null=True, verbose_name="Period Start")
+    period_end = models.CharField(max_length=20, blank=True, null=True, verbose_name="Period End")
+    
+    METADATA_FIELDS = ['period_text', 'period_start', 'period_end']
     
     class Meta:
         ordering = ['-created_at']
@@ -141,6 +161,95 @@ class ProcessedFile(models.Model):
         if self.processed_file:
             return os.path.basename(self.processed_file.name)
         return None
+    
+    @classmethod
+    def find_completed_duplicate(cls, content_hash):
+        """Most recent completed file with the same upload content, if any"""
+        if not content_hash:
+            return None
+        candidates = cls.objects.filter(content_hash=content_hash, status='completed').exclude(processed_file='').exclude(processed_file__isnull=True)
+        for candidate in candidates.order_by('-created_at'):
+            if candidate.original_file and os.path.exists(candidate.original_file.path) \
+                    and os.path.exists(candidate.processed_file.path):
+                return candidate
+        return None
+    
+    def reuse_result_from(self, other):
+        """Point this record at another record's stored upload and processing outputs"""
+        self.original_file = other.original_file.name
+        self.processed_file = other.processed_file.name
+        self.attendance_artifact = other.attendance_artifact.name if other.attendance_artifact else None
+        self.detected_layout = other.detected_layout
+        self.layout_confidence = other.layout_confidence
+        for field in self.METADATA_FIELDS:
+            setattr(self, field, getattr(other, field))
+        self.status = 'completed'
+        self.error_message = None
+    
+    def apply_metadata(self, metadata):
+        """Set the file-level metadata fields from ExcelProcessorService.extract_metadata output"""
+        for field in self.METADATA_FIELDS:
+            setattr(self, field, metadata.get(field))
+    
+    @property
+    def has_metadata(self):
+        return self.period_text is not None
+    
+    def is_shared_file(self, field_name):
+        """True when another record still references the stored file behind field_name"""
+        name = getattr(self, field_name).name
+        if not name:
+            return False
+        return ProcessedFile.objects.filter(**{field_name: name}).exclude(pk=self.pk).exists()
+
+
+class ProcessingJob(models.Model):
+    """Queued processing run for an uploaded file, claimed by `manage.py run_workers`"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    processed_file = models.ForeignKey(ProcessedFile, on_delete=models.CASCADE, related_name='jobs', verbose_name="File")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', db_index=True)
+    template_path = models.CharField(max_length=500, blank=True, null=True, verbose_name="Template Path")
+    attempts = models.PositiveIntegerField(default=0)
+    worker_id = models.CharField(max_length=100, blank=True, null=True, verbose_name="Worker")
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    progress = models.PositiveSmallIntegerField(default=0)
+    stage = models.CharField(max_length=20, blank=True, default='')
+    progress_message = models.CharField(max_length=255, blank=True, default='')
+    rows_processed = models.PositiveIntegerField(default=0)
+    progress_updated_at = models.DateTimeField(blank=True, null=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        verbose_name = "Processing Job"
+        verbose_name_plural = "Processing Jobs"
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.id} for file {self.processed_file_id} - {self.status}"
+    
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return 0.0
+        end = self.finished_at or timezone.now()
+        return max((end - self.started_at).total_seconds(), 0.0)
+    
+    def rows_per_second(self):
+        elapsed = self.elapsed_seconds()
+        if not elapsed or not self.rows_processed:
+            return 0.0
+        return self.rows_processed / elapsed
 
 
 class StaffDetails(models.Model):
@@ -184,3 +293,61 @@ class StaffDetails(models.Model):
     
     def get_full_info(self):
         return f"{self.staffid} | {self.name} | {self.designation} | {self.section}"
+
+
+class StaffVersion(models.Model):
+    """Counter bumped on every staff or section write; report caches are keyed on it.
+    
+    There is one row per department, plus an 'all' row that every write bumps
+    for reports that are not limited to a department.
+    """
+    ALL = 'all'
+    
+    scope = models.CharField(max_length=32, unique=True, verbose_name="Scope")
+    version = models.PositiveBigIntegerField(default=0, verbose_name="Version")
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Staff Version"
+        verbose_name_plural = "Staff Versions"
+    
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
+    
+    @classmethod
+    def scope_for(cls, department_id):
+        return cls.ALL if department_id is None else str(department_id)
+    
+    @classmethod
+    def current(cls, department_id):
+        """Staff version seen by a report for department_id (None: all departments)"""
+        version = cls.objects.filter(scope=cls.scope_for(department_id)).values_list('version', flat=True).first()
+        return version or 0
+    
+    @classmethod
+    def bump(cls, department_ids):
+        """Record a staff or section write touching the given departments"""
+        scopes = {cls.ALL} | {cls.scope_for(department_id) for department_id in department_ids if department_id is not None}
+        for scope in sorted(scopes):
+            cls.objects.get_or_create(scope=scope)
+            cls.objects.filter(scope=scope).update(version=F('version') + 1)
+
+
+@receiver(pre_save, sender=StaffDetails)
+@receiver(pre_save, sender=Section)
+def remember_stored_department(sender, instance, raw=False, **kwargs):
+    """Department the row is stored under before this save, so moving it invalidates both departments"""
+    instance._stored_department_id = None
+    if instance.pk is not None and not raw:
+        instance._stored_department_id = (
+            sender.objects.filter(pk=instance.pk).values_list('department_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=StaffDetails)
+@receiver(post_delete, sender=StaffDetails)
+@receiver(post_save, sender=Section)
+@receiver(post_delete, sender=Section)
+def bump_staff_version(sender, instance, **kwargs):
+    """ORM writes (admin, shell); the raw SQL views call StaffVersion.bump themselves"""
+    StaffVersion.bump([instance.department_id, getattr(instance, '_stored_department_id', None)])
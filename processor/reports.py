@@ -0,0 +1,747 @@
+"""
+Declarative template reports.
+A ReportSpec says which staff a report covers, how they are ordered, which
+template it fills and what goes in each column. Specs are compiled once per
+process and rendered by TemplateReportEngine.
+"""
+import hashlib
+import io
+import itertools
+import logging
+import multiprocessing
+import os
+import pickle
+import re
+import threading
+import zipfile
+import zlib
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import openpyxl
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.indexed_list import IndexedList
+
+from .attendance import AttendanceMatrix, AttendanceSummary
+from .services import atomic_output
+from .styles import StyleRegistry
+from .xlsx import ZipChunkBuffer
+
+try:
+    import fcntl
+except ImportError:  # Windows: requests in one process still share the thread lock
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def staffid_number(staffid) -> int:
+    """Numeric part of a staff ID used for ordering, 999999 when it has no digits"""
+    digits = re.sub(r'[^0-9]', '', str(staffid))
+    return int(digits) if digits else 999999
+
+
+# Bump when a change to the rendering code alters report output, so cached reports are rendered again
+RENDER_VERSION = 1
+
+
+class ReportSpec:
+    """Declaration of one template report"""
+
+    # ORDER BY fragments that specs can combine by name, with the equivalent Python sort key
+    ORDERINGS = {
+        'priority': (
+            "priority ASC",
+            lambda staff: (staff['priority'] is None, staff['priority'] or 0),
+        ),
+        'employment_type': (
+            """CASE
+                    WHEN type_of_employment = 'permanent' THEN 1
+                    WHEN type_of_employment = 'contract' THEN 2
+                    ELSE 3
+                END""",
+            lambda staff: {'permanent': 1, 'contract': 2}.get(staff['type_of_employment'], 3),
+        ),
+        'staffid_number': (
+            """CASE
+                    WHEN REGEXP_REPLACE(staffid, '[^0-9]', '', 'g') ~ '^[0-9]+$'
+                    THEN CAST(REGEXP_REPLACE(staffid, '[^0-9]', '', 'g') AS INTEGER)
+                    ELSE 999999
+                END ASC""",
+            lambda staff: staffid_number(staff['staffid']),
+        ),
+    }
+
+    def __init__(self, name: str, title: str, output_name: str, employment_types: Iterable[str],
+                 order_by: Iterable[str], columns: Dict[str, str], template: str = 'detailed_attendance_template.xlsx',
+                 sheet: str = 'Template Sheet', period_cell: str = 'E1', total_days_cell: str = 'F2', first_row: int = 4):
+        self.name = name
+        self.title = title
+        self.output_name = output_name
+        self.employment_types = tuple(employment_types)
+        self.order_by = tuple(order_by)
+        self.columns = dict(columns)
+        self.template = template
+        self.sheet = sheet
+        self.period_cell = period_cell
+        self.total_days_cell = total_days_cell
+        self.first_row = first_row
+
+    def fingerprint(self) -> str:
+        """Short hash of everything that shapes the rendered report, plus RENDER_VERSION"""
+        fields = (RENDER_VERSION, self.name, self.output_name, self.employment_types, self.order_by,
+                  sorted(self.columns.items()), self.template, self.sheet, self.period_cell,
+                  self.total_days_cell, self.first_row)
+        return hashlib.sha1(repr(fields).encode()).hexdigest()[:12]
+
+    def compile(self) -> 'CompiledReport':
+        return CompiledReport(self)
+
+
+class CompiledReport:
+    """A ReportSpec resolved into its staff query and per-column value getters"""
+
+    STAFF_COLUMNS = "staffid, name, designation, level, section, weekly_off, type_of_employment, priority"
+
+    # Every column any report needs, for callers that fetch staff once and select per report
+    ALL_STAFF_SQL = f"""
+        SELECT {STAFF_COLUMNS}, department_id
+        FROM staff_details
+        WHERE staffid = ANY(%s)
+    """
+
+    def __init__(self, spec: ReportSpec):
+        self.spec = spec
+        self.fingerprint = spec.fingerprint()
+        self.staff_sql = self._build_staff_sql(spec)
+        self.department_sql = self.staff_sql.replace('{department_filter}', " AND department_id = %s")
+        self.staff_sql = self.staff_sql.replace('{department_filter}', "")
+        self.sort_keys = [ReportSpec.ORDERINGS[key][1] for key in spec.order_by]
+        self.columns: List[Tuple[str, Callable]] = [
+            (column, self._getter(source)) for column, source in spec.columns.items()
+        ]
+
+    @classmethod
+    def _build_staff_sql(cls, spec: ReportSpec) -> str:
+        if len(spec.employment_types) == 1:
+            employment_filter = f"type_of_employment = '{spec.employment_types[0]}'"
+        else:
+            employment_filter = "type_of_employment IN ({})".format(
+                ", ".join(f"'{t}'" for t in spec.employment_types)
+            )
+        ordering = ",\n                ".join(ReportSpec.ORDERINGS[key][0] for key in spec.order_by)
+        return f"""
+            SELECT {cls.STAFF_COLUMNS}
+            FROM staff_details
+            WHERE staffid = ANY(%s)
+            AND {employment_filter}
+            {{department_filter}}
+            ORDER BY
+                {ordering}
+        """
+
+    @staticmethod
+    def _getter(source: str) -> Callable:
+        """Value getter for a column source: a staff field, an attendance total, 'weekly_off' or 'remarks'"""
+        if source == 'name':
+            return lambda staff, totals, remarks: staff['name'].title()
+        if source == 'weekly_off':
+            return lambda staff, totals, remarks: staff.get('weekly_off', '').title() if staff.get('weekly_off') else ''
+        if source == 'remarks':
+            return lambda staff, totals, remarks: remarks()
+        if source in AttendanceSummary.TOTALS:
+            return lambda staff, totals, remarks: totals[source]
+        return lambda staff, totals, remarks: staff[source]
+
+    def staff_query(self, employee_ids: List[Any], department_id: Optional[int] = None) -> Tuple[str, List[Any]]:
+        """SQL and parameters selecting the report's staff in report order"""
+        if department_id is not None:
+            return self.department_sql, [list(employee_ids), department_id]
+        return self.staff_sql, [list(employee_ids)]
+
+    def select(self, staff_rows: Iterable[Dict[str, Any]], department_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        The report's staff out of rows fetched with ALL_STAFF_SQL, filtered and
+        ordered the same way staff_query does in the database
+        """
+        selected = {}
+        for staff in staff_rows:
+            if staff['type_of_employment'] not in self.spec.employment_types:
+                continue
+            if department_id is not None and staff.get('department_id') != department_id:
+                continue
+            selected[staff['staffid']] = staff
+        return sorted(selected.values(), key=lambda staff: tuple(key(staff) for key in self.sort_keys))
+
+
+REPORT_SPECS: Dict[str, ReportSpec] = {}
+
+# Template columns shared by both staff reports
+ATTENDANCE_COLUMNS = {
+    'B': 'name',
+    'C': 'staffid',
+    'D': 'designation',
+    'E': 'level',
+    'F': 'present_days',
+    'G': 'personal_leave_days',
+    'H': 'sick_leave_days',
+    'I': 'casual_leave_days',
+    'J': 'substitute_leave_days',
+    'L': 'absent_days',
+    'M': 'other_leave_days',
+    'N': 'allowance_days',
+    'R': 'weekly_off',
+    'S': 'remarks',
+}
+
+
+def register_report(spec: ReportSpec) -> ReportSpec:
+    REPORT_SPECS[spec.name] = spec
+    return spec
+
+
+register_report(ReportSpec(
+    name='detailed_attendance',
+    title='detailed attendance report',
+    output_name='detailed_attendance_{file_id}.xlsx',
+    employment_types=('permanent', 'contract'),
+    order_by=('priority', 'employment_type', 'staffid_number'),
+    columns=ATTENDANCE_COLUMNS,
+))
+
+register_report(ReportSpec(
+    name='monthly_wages',
+    title='monthly wages report',
+    output_name='monthly_wages_attendance_{file_id}.xlsx',
+    employment_types=('monthly wages',),
+    order_by=('priority', 'staffid_number'),
+    columns=ATTENDANCE_COLUMNS,
+))
+
+_compiled_reports: Dict[str, CompiledReport] = {}
+
+
+def get_report(name: str) -> CompiledReport:
+    """Compiled report by name, compiled on first use and kept for the life of the process"""
+    compiled = _compiled_reports.get(name)
+    if compiled is None:
+        compiled = REPORT_SPECS[name].compile()
+        _compiled_reports[name] = compiled
+    return compiled
+
+
+def total_days_in_period(period_bounds: Tuple[Optional[str], Optional[str]], data: pd.DataFrame) -> int:
+    """Inclusive day count of the period stored at processing time, else the number of distinct dates"""
+    try:
+        period_start, period_end = period_bounds
+        if period_start and period_end:
+            # Periods are one BS month, which datetime cannot represent; the day parts give the count
+            return int(re.split(r'[/-]', period_end)[2]) - int(re.split(r'[/-]', period_start)[2]) + 1
+        return len(data['Date'].dropna().unique())
+    except Exception as e:
+        logger.error(f"Error calculating total days: {e}")
+        return 0
+
+
+class _WorkbookPickler(pickle.Pickler):
+    """
+    Pickler for openpyxl workbooks. IndexedList's default pickling appends items
+    through a class-level lookup dict, which silently drops styles on the second
+    unpickle; rebuild it from its items instead.
+    """
+
+    def reducer_override(self, obj):
+        if type(obj) is IndexedList:
+            return IndexedList, (list(obj),)
+        return NotImplemented
+
+
+class MergedCellIndex:
+    """Every coordinate covered by a worksheet's merged ranges, mapped to the range's top-left anchor"""
+
+    def __init__(self, worksheet):
+        self.anchors: Dict[str, str] = {}
+        for merged_range in worksheet.merged_cells.ranges:
+            anchor = f"{get_column_letter(merged_range.min_col)}{merged_range.min_row}"
+            for row, col in merged_range.cells:
+                self.anchors[f"{get_column_letter(col)}{row}"] = anchor
+
+    def set_cell(self, worksheet, cell_address, value):
+        """Set a cell value; writes inside a merged range go to its top-left cell"""
+        try:
+            worksheet[self.anchors.get(cell_address, cell_address)] = value
+        except Exception as e:
+            logger.warning(f"Could not set cell {cell_address}: {e}")
+
+
+class TemplateCache:
+    """
+    Report templates parsed once per process.
+    Each template is kept pickled and every load unpickles a private copy, which
+    is cheaper than parsing the xlsx again and shares nothing between threads.
+    The merged-cell index of every sheet is built alongside it. A template is
+    re-parsed when its file's mtime changes.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[int, bytes, Dict[str, MergedCellIndex]]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, path: str) -> Tuple[int, bytes, Dict[str, MergedCellIndex]]:
+        mtime = os.stat(path).st_mtime_ns
+        entry = self._entries.get(path)
+        if entry is None or entry[0] != mtime:
+            with self._lock:
+                entry = self._entries.get(path)
+                if entry is None or entry[0] != mtime:
+                    wb = openpyxl.load_workbook(path)
+                    buffer = io.BytesIO()
+                    _WorkbookPickler(buffer, protocol=pickle.HIGHEST_PROTOCOL).dump(wb)
+                    entry = (mtime, buffer.getvalue(), {ws.title: MergedCellIndex(ws) for ws in wb.worksheets})
+                    self._entries[path] = entry
+                    logger.info(f"Cached report template {path}")
+        return entry
+
+    def load(self, path: str):
+        """A fresh workbook for the template at path, with the merged-cell index of each sheet"""
+        _, data, merged = self._entry(path)
+        return pickle.loads(data), merged
+
+
+template_cache = TemplateCache()
+
+
+class TemplateReportEngine:
+    """Single Responsibility: fill a report template from staff rows and attendance totals"""
+
+    def __init__(self, template_dir: str, cache: Optional[TemplateCache] = None):
+        self.template_dir = template_dir
+        self.cache = cache or template_cache
+
+    def template_path(self, report: CompiledReport) -> str:
+        return os.path.join(self.template_dir, report.spec.template)
+
+    def revision(self, report: CompiledReport) -> str:
+        """Cache revision of a report: its spec fingerprint and its template file's mtime"""
+        return f"{report.fingerprint}-{os.stat(self.template_path(report)).st_mtime_ns}"
+
+    def render(self, report: CompiledReport, staff_rows: Iterable[Dict[str, Any]], data: pd.DataFrame, period: str,
+               summary: Optional[AttendanceSummary] = None,
+               period_bounds: Tuple[Optional[str], Optional[str]] = (None, None)):
+        """
+        Workbook with the template filled in for the given staff (already in report order).
+        Pass a summary built over `data` to share it between reports, and the
+        file's stored period_start/period_end as period_bounds for the day count.
+        """
+        spec = report.spec
+        wb, merged = self.cache.load(self.template_path(report))
+        ws = wb[spec.sheet]
+        set_cell = merged[spec.sheet].set_cell
+
+        set_cell(ws, spec.period_cell, f"Period: {period}")
+        set_cell(ws, spec.total_days_cell, total_days_in_period(period_bounds, data))
+
+        if summary is None:
+            summary = AttendanceSummary(AttendanceMatrix.from_frame(data))
+        matrix = summary.matrix
+        row = spec.first_row
+        for staff in staff_rows:
+            emp_index = matrix.row_of(staff['staffid'])
+            totals = summary.totals(emp_index)
+            remarks = lambda: summary.remarks(emp_index)
+            for column, getter in report.columns:
+                set_cell(ws, f'{column}{row}', getter(staff, totals, remarks))
+            row += 1
+        return wb
+
+
+class ReportCache:
+    """Single Responsibility: keep rendered reports on disk for identical requests
+
+    Entries are keyed by the upload's content hash, the report, the requesting
+    department (None: all departments), the report's revision (spec
+    fingerprint and template mtime, see TemplateReportEngine.revision) and
+    that department's staff version. Editing a template or a ReportSpec, or a
+    staff or section write, changes the key, so older entries are never looked
+    up again; they are deleted when the report is stored under the new key.
+    evict() drops every entry of an upload when its file is deleted.
+
+    Entries are written to a temporary file and renamed into place, so a
+    reader never opens a partial workbook. open_or_render() hands back an open
+    file rather than a path: an entry pruned by a newer key after it was
+    opened stays readable through that handle. Renders hold a lock (threads
+    and, where fcntl exists, worker processes), so concurrent identical
+    requests render once and share the result. Keys map onto a fixed set of
+    LOCK_STRIPES lock files, which are never deleted.
+    """
+
+    SUFFIX = '.xlsx'
+    LOCK_PREFIX = '.lock-'
+    LOCK_STRIPES = 64
+    _thread_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def _prefix(content_hash: str, report_name: str, department_id: Optional[int]) -> str:
+        scope = 'all' if department_id is None else f'dept{department_id}'
+        return f'{report_name}_{content_hash}_{scope}_'
+
+    def path(self, content_hash: str, report_name: str, department_id: Optional[int], revision: str,
+             staff_version: int) -> str:
+        prefix = self._prefix(content_hash, report_name, department_id)
+        return os.path.join(self.root, f'{prefix}r{revision}_v{staff_version}{self.SUFFIX}')
+
+    def put(self, content_hash: str, report_name: str, department_id: Optional[int], revision: str,
+            staff_version: int, wb) -> str:
+        """Publish the rendered workbook, drop entries stored under older keys and return its path"""
+        path = self.path(content_hash, report_name, department_id, revision, staff_version)
+        with atomic_output(path) as tmp_path:
+            wb.save(tmp_path)
+        self._prune(content_hash, report_name, department_id, keep=path)
+        return path
+
+    def open_or_render(self, content_hash: str, report_name: str, department_id: Optional[int], revision: str,
+                       staff_version: int, render: Callable[[], Any]) -> BinaryIO:
+        """Stored report opened for reading, calling render() for the workbook and storing it on a miss.
+
+        The caller closes the file (FileResponse does so when the response is done).
+        """
+        path = self.path(content_hash, report_name, department_id, revision, staff_version)
+        cached = self._open(path)
+        if cached is not None:
+            return cached
+        with self._lock(content_hash, report_name, department_id):
+            # Another request may have published it while this one waited
+            cached = self._open(path)
+            if cached is None:
+                self.put(content_hash, report_name, department_id, revision, staff_version, render())
+                # Entries of this key are only pruned under the lock, so the new file is still there
+                cached = open(path, 'rb')
+        return cached
+
+    def evict(self, content_hash: str) -> int:
+        """Delete every stored report of an upload; returns the number of files removed"""
+        if not os.path.isdir(self.root):
+            return 0
+        marker = f'_{content_hash}_'
+        removed = 0
+        for name in os.listdir(self.root):
+            if marker in name and name.endswith(self.SUFFIX):
+                try:
+                    os.remove(os.path.join(self.root, name))
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"Could not remove cached report {name}: {e}")
+        return removed
+
+    @staticmethod
+    def _open(path: str) -> Optional[BinaryIO]:
+        try:
+            return open(path, 'rb')
+        except FileNotFoundError:
+            return None
+
+    @contextmanager
+    def _lock(self, content_hash: str, report_name: str, department_id: Optional[int]) -> Iterator[None]:
+        """Exclusive lock on a cache key across threads and worker processes"""
+        # crc32 rather than hash(): every worker process has to pick the same lock file for a key
+        stripe = zlib.crc32(self._prefix(content_hash, report_name, department_id).encode()) % self.LOCK_STRIPES
+        with self._thread_locks[stripe]:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.root, exist_ok=True)
+            with open(os.path.join(self.root, f'{self.LOCK_PREFIX}{stripe}'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _prune(self, content_hash: str, report_name: str, department_id: Optional[int], keep: str) -> None:
+        prefix = self._prefix(content_hash, report_name, department_id)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(prefix) and name.endswith(self.SUFFIX) and path != keep:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.warning(f"Could not remove stale report {path}: {e}")
+
+
+class SegregationReport:
+    """Single Responsibility: build one attendance workbook per staff section"""
+
+    TIME_ROWS = [("In Time", 'InTime'), ("Out Time", 'OutTime'), ("Status", 'Status'), ("Worked Hours", 'WorkedHours')]
+    # Employment types whose section is looked up; everyone else lands in "Unknown Section"
+    EMPLOYMENT_TYPES = ('permanent', 'contract')
+    SQL = """
+        SELECT staffid, section, type_of_employment, priority
+        FROM staff_details
+        WHERE staffid = ANY(%s) AND type_of_employment IN ('permanent', 'contract')
+    """
+
+    def __init__(self, matrix: AttendanceMatrix, staff_rows: Iterable[Dict[str, Any]], period: str):
+        self.matrix = matrix
+        self.period = period
+        self.employee_details = self._employee_details(matrix, staff_rows)
+
+    @classmethod
+    def _employee_details(cls, matrix: AttendanceMatrix, staff_rows: Iterable[Dict[str, Any]]) -> Dict[Any, Dict[str, Any]]:
+        by_staffid = {}
+        for staff in staff_rows:
+            if staff['type_of_employment'] in cls.EMPLOYMENT_TYPES:
+                by_staffid.setdefault(str(staff['staffid']), staff)
+
+        details = {}
+        for emp_id in matrix.employee_ids:
+            if pd.isna(emp_id) or str(emp_id).strip() == '':
+                continue
+            staff = by_staffid.get(str(emp_id))
+            if staff:
+                details[emp_id] = {
+                    'section': staff['section'] if staff['section'] else "Unknown Section",
+                    'type_of_employment': staff['type_of_employment'] if staff['type_of_employment'] else 'monthly wages',
+                    'priority': staff['priority'] if staff['priority'] else 999,
+                }
+            else:
+                details[emp_id] = {'section': "Unknown Section", 'type_of_employment': 'monthly wages', 'priority': 999}
+        return details
+
+    def sections(self) -> Dict[str, List[int]]:
+        """Matrix rows of each section's employees, in first-seen order"""
+        section_data: Dict[str, List[int]] = {}
+        for emp_id, details in self.employee_details.items():
+            section_data.setdefault(details['section'], []).append(self.matrix.row_of(emp_id))
+        return section_data
+
+    @staticmethod
+    def filename(section: str) -> str:
+        clean_section_name = "".join(c for c in section if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        return f"{clean_section_name}_Attendance_Report.xlsx"
+
+    def _day_header(self, day: int) -> str:
+        date = self.matrix.days[day]
+        day_number = ""
+        # Prefer Day_Name from the records of this date
+        day_name = self.matrix.day_names[day]
+        if pd.isna(day_name):
+            day_name = ''
+        # Parse "DD Weekday" from the date string (set once, no duplication)
+        if isinstance(date, str):
+            m = re.match(r"^\s*(\d{1,2})\s+([A-Za-z]+)\s*$", date)
+            if m:
+                day_number = m.group(1)
+                if not day_name:
+                    day_name = m.group(2)
+            else:
+                day_number = date
+        return f"{day_number} {day_name}".strip()
+
+    def _sorted_employees(self, emp_rows: List[int]) -> List[Tuple[Any, int]]:
+        """(emp_id, matrix row) by priority, then employment type, then numeric staff ID"""
+        def key(item):
+            details = self.employee_details.get(item[0], {})
+            employment_type = details.get('type_of_employment')
+            return (
+                details.get('priority', 999),
+                0 if employment_type == 'permanent' else 1 if employment_type == 'contract' else 2,
+                staffid_number(item[0]),
+            )
+        return sorted(((self.matrix.employee_ids[row], row) for row in emp_rows), key=key)
+
+    def section_slice(self, section: str, emp_rows: List[int]) -> Dict[str, Any]:
+        """
+        Everything needed to render one section's workbook, without the matrix:
+        employees in report order and an (employee × day) grid per time row,
+        None where the employee has no record that day. Cheap to pickle.
+        """
+        matrix = self.matrix
+        # Days recorded for this section's employees, as column headers
+        day_columns = sorted(
+            (day for day in matrix.days_with_records(emp_rows) if matrix.days[day]),
+            key=lambda day: matrix.days[day]
+        )
+        sorted_employees = self._sorted_employees(emp_rows)
+        rows = [emp_index for _, emp_index in sorted_employees]
+        block = np.ix_(rows, day_columns)
+        missing = ~matrix.has_record[block]
+        grids = {}
+        for _, field in self.TIME_ROWS:
+            grid = matrix.cells[field][block].astype(object)
+            grid[missing] = None
+            grids[field] = grid
+        return {
+            'section': section,
+            'period': self.period,
+            'day_headers': [self._day_header(day) for day in day_columns],
+            'employees': [(emp_id, matrix.names[row], matrix.designations[row]) for emp_id, row in sorted_employees],
+            'grids': grids,
+        }
+
+    def render_section(self, section: str, emp_rows: List[int]) -> Workbook:
+        return build_section_workbook(self.section_slice(section, emp_rows))
+
+    def workbooks(self, pool=None, in_flight: int = 1) -> Iterator[Tuple[str, bytes]]:
+        """
+        (filename, xlsx bytes) per non-empty section.
+        With a process pool up to `in_flight` sections render at once and are
+        yielded as they finish, so finished workbooks never pile up unread.
+        """
+        slices = (self.section_slice(section, emp_rows) for section, emp_rows in self.sections().items() if emp_rows)
+        if pool is None:
+            for section_slice in slices:
+                yield self.filename(section_slice['section']), render_section_workbook(section_slice)
+            return
+
+        pending = {}
+        try:
+            for section_slice in slices:
+                pending[pool.submit(render_section_workbook, section_slice)] = section_slice
+                while len(pending) >= max(1, in_flight):
+                    yield from self._collect(pending, FIRST_COMPLETED)
+            while pending:
+                yield from self._collect(pending, FIRST_COMPLETED)
+        except BrokenProcessPool:
+            logger.warning("Render pool broke, rendering the remaining sections in-process")
+            discard_render_pool(pool)
+            for section_slice in list(pending.values()) + list(slices):
+                yield self.filename(section_slice['section']), render_section_workbook(section_slice)
+
+    def _collect(self, pending, return_when) -> Iterator[Tuple[str, bytes]]:
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            data = future.result()
+            section_slice = pending.pop(future)
+            yield self.filename(section_slice['section']), data
+
+
+def build_section_workbook(section_slice: Dict[str, Any]) -> Workbook:
+    """Segregation workbook for one section slice from SegregationReport.section_slice"""
+    section = section_slice['section']
+    day_headers = section_slice['day_headers']
+    employees = section_slice['employees']
+    grids = section_slice['grids']
+
+    wb = Workbook()
+    ws = wb.active
+    ws.title = f"{section}_Attendance"
+    styles = StyleRegistry(wb)
+
+    title_cell = ws.cell(row=1, column=1, value=f"Attendance Record of {section} for the period {section_slice['period']}")
+    styles.apply(title_cell, 'title')
+    ws.merge_cells('A1:Z1')
+
+    # Header row (row 3)
+    current_col = 5 + len(day_headers)
+    for col, header_text in enumerate(["Emp ID", "Emp Name", "Designation", "Time"] + list(day_headers), 1):
+        styles.apply(ws.cell(row=3, column=col, value=header_text), 'bordered_header')
+    ws.row_dimensions[3].height = 20
+
+    # Each employee takes 4 rows: one per field, one column per day (only days with a record are filled).
+    # Only cells with a value are touched; borders and the per-employee banding are conditional formats.
+    centered = styles.name('centered')
+    time_label = styles.name('time_label')
+    current_row = 5
+    for position, (emp_id, name, designation) in enumerate(employees):
+        for col, value in enumerate((emp_id, name, designation), 1):
+            ws.cell(row=current_row, column=col, value=value).style = centered
+        ws.merge_cells(f'A{current_row}:A{current_row + 3}')
+        ws.merge_cells(f'B{current_row}:B{current_row + 3}')
+        ws.merge_cells(f'C{current_row}:C{current_row + 3}')
+        for offset, (label, field) in enumerate(SegregationReport.TIME_ROWS):
+            row = current_row + offset
+            # Fixed single-line height prevents word wrap
+            ws.row_dimensions[row].height = 20
+            ws.cell(row=row, column=4, value=label).style = time_label
+            for col, value in enumerate(grids[field][position], 5):
+                if value is not None:
+                    ws.cell(row=row, column=col, value=value).style = centered
+        current_row += 4
+    if employees:
+        StyleRegistry.band(ws, f"A5:{get_column_letter(current_col - 1)}{current_row - 1}", "INT((ROW()-5)/4)", bordered=True)
+
+    ws.column_dimensions['A'].width = 12  # Emp ID
+    ws.column_dimensions['B'].width = 30  # Emp Name
+    ws.column_dimensions['C'].width = 25  # Designation
+    ws.column_dimensions['D'].width = 15  # Time
+    for col in range(5, current_col):
+        ws.column_dimensions[get_column_letter(col)].width = 12
+    return wb
+
+
+def render_section_workbook(section_slice: Dict[str, Any]) -> bytes:
+    """xlsx bytes of one section's workbook; a top-level function so pool workers can run it"""
+    excel_buffer = io.BytesIO()
+    build_section_workbook(section_slice).save(excel_buffer)
+    return excel_buffer.getvalue()
+
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+
+def render_pool(max_workers: int):
+    """
+    Process pool shared by this process's requests for rendering section workbooks,
+    created on first use. Returns None when max_workers is below 2.
+    """
+    global _render_pool
+    if max_workers < 2:
+        return None
+    if _render_pool is None:
+        with _render_pool_lock:
+            if _render_pool is None:
+                # spawn: never fork a multi-threaded server process
+                _render_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    return _render_pool
+
+
+def discard_render_pool(pool) -> None:
+    """Drop a broken pool so the next request starts a fresh one"""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is pool:
+            _render_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def prefetch_first(members: Iterator[Tuple[str, bytes]]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Produce the first member now and return an iterator over all of them.
+    Views call this before the response starts, so a failure building the
+    first member can still be reported as an error page instead of a broken archive.
+    """
+    members = iter(members)
+    first = next(members, None)
+    if first is None:
+        return iter(())
+    return itertools.chain([first], members)
+
+
+def stream_zip(members: Iterable[Tuple[str, bytes]], description: str = 'ZIP archive') -> Iterator[bytes]:
+    """
+    ZIP archive of (name, data) members, yielded member by member for a
+    StreamingHttpResponse. Only the member being added is held in memory.
+    If a member fails after the response has started the error is logged and
+    re-raised without sending the central directory, so the server drops the
+    connection and the client sees a failed download rather than a valid-looking
+    partial archive.
+    """
+    buffer = ZipChunkBuffer()
+    try:
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for name, data in members:
+                zip_file.writestr(name, data)
+                yield buffer.drain()
+    except Exception:
+        logger.exception(f"{description} failed mid-stream; aborting the download")
+        raise
+    yield buffer.drain()
@@ -1,17 +1,49 @@
 """
 Service layer for Excel processing following SOLID principles
 """
+import re
+import numpy as np
 import pandas as pd
 import openpyxl
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment
-from typing import Dict, List, Any, Optional, Callable
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
+from typing import Dict, List, Any, Optional, Callable, Iterator, Iterable
 import logging
+import os
+import tempfile
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from .styles import StyleRegistry
+from .xlsx import XlsxStreamWriter
 
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def atomic_output(path: str) -> Iterator[str]:
+    """
+    Temporary path in the same directory as `path` to write the file to.
+    When the block finishes it is renamed over `path` in one step, so readers
+    see either the previous file or the complete new one, never a partial write.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix=os.path.splitext(path)[1], dir=directory)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
 class ExcelProcessorInterface(ABC):
     """Interface for Excel processing following Interface Segregation Principle"""
     
@@ -33,6 +65,13 @@ class ExcelProcessorInterface(ABC):
 
 class ExcelReader:
     """Single Responsibility: Read Excel files"""
+
+    # Strings pd.read_excel reads as NaN by default (its documented na_values list)
+    NA_STRINGS = frozenset({
+        '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+        '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+        'n/a', 'nan', 'null',
+    })
     
     def read_excel(self, file_path: str, progress_callback: Optional[Callable] = None) -> pd.DataFrame:
         """Read Excel file and return DataFrame"""
@@ -55,6 +94,69 @@ class ExcelReader:
             logger.error(f"Error reading Excel file {file_path}: {str(e)}")
             raise ValueError(f"Could not read Excel file: {str(e)}")
 
+    def read_raw_grid(self, file_path: str, progress_callback: Optional[Callable] = None) -> pd.DataFrame:
+        """Read the whole sheet as a header-less cell matrix.
+
+        The raw grid is loaded once per request and handed to format detection
+        and to every parser, so a fallback never has to re-read the workbook.
+        """
+        try:
+            if progress_callback:
+                progress_callback(20, "Reading Excel file...")
+
+            if file_path.lower().endswith('.xls'):
+                raw = pd.read_excel(file_path, engine='xlrd', header=None)
+            else:
+                raw = pd.read_excel(file_path, engine='openpyxl', header=None)
+
+            if progress_callback:
+                progress_callback(30, f"Successfully loaded {len(raw)} rows from Excel file")
+
+            logger.info(f"Successfully read raw grid from Excel file: {file_path}")
+            return raw
+        except Exception as e:
+            logger.error(f"Error reading Excel file {file_path}: {str(e)}")
+            raise ValueError(f"Could not read Excel file: {str(e)}")
+
+    def iter_rows(self, file_path: str) -> Iterator[List[Any]]:
+        """Stream the active sheet of an .xlsx file row by row (openpyxl read-only mode).
+
+        Cell values are converted the same way ``pd.read_excel`` converts them,
+        so streaming parsers see what the raw grid would have held; empty and
+        NA-like cells come back as None.
+        """
+        from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+
+        wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            ws = wb.active
+            ws.reset_dimensions()
+            for row in ws.iter_rows():
+                values = []
+                for cell in row:
+                    value = cell.value
+                    if value is None or cell.data_type == TYPE_ERROR:
+                        value = None
+                    elif cell.data_type == TYPE_NUMERIC:
+                        value = int(value) if int(value) == value else float(value)
+                    elif isinstance(value, str) and value in self.NA_STRINGS:
+                        value = None
+                    values.append(value)
+                yield values
+        finally:
+            wb.close()
+
+    @staticmethod
+    def frame_from_raw_grid(raw: pd.DataFrame) -> pd.DataFrame:
+        """Promote the first row of a raw grid to column labels (same as header=0)"""
+        if raw.empty:
+            return raw.copy()
+        header = raw.iloc[0].tolist()
+        columns = [f"Unnamed: {idx}" if pd.isna(val) else val for idx, val in enumerate(header)]
+        frame = raw.iloc[1:].reset_index(drop=True)
+        frame.columns = columns
+        return frame.infer_objects()
+
 
 class DataProcessor:
     """Single Responsibility: Process data according to business rules"""
@@ -99,7 +201,7 @@ class DataProcessor:
             )
             
             if progress_callback:
-                progress_callback(60, "Data processing completed")
+                progress_callback(60, "Data processing completed", rows=len(processed_data))
             
             logger.info("Data processing completed successfully")
             return processed_data
@@ -108,23 +210,16 @@ class DataProcessor:
             logger.error(f"Error processing data: {str(e)}")
             raise ValueError(f"Data processing failed: {str(e)}")
     
-    def process_attendance_file(self, file_path: str, progress_callback: Optional[Callable] = None) -> pd.DataFrame:
+    def process_attendance_file(self, file_path: str, progress_callback: Optional[Callable] = None, raw: Optional[pd.DataFrame] = None) -> pd.DataFrame:
         """Process the specific Report (1).xls attendance file format"""
         try:
-            import pandas as pd
-            from datetime import datetime
-            import re
-            
             if progress_callback:
                 progress_callback(40, "Processing attendance file...")
             
             logger.info(f"Processing attendance file: {file_path}")
             
-            # Read the Excel file using pandas with appropriate engine
-            if file_path.lower().endswith('.xls'):
-                df = pd.read_excel(file_path, engine='xlrd', header=None)
-            else:
-                df = pd.read_excel(file_path, engine='openpyxl', header=None)
+            # Reuse the already loaded raw grid when the caller has one
+            df = raw if raw is not None else ExcelReader().read_raw_grid(file_path)
             
             if progress_callback:
                 progress_callback(50, f"Loaded {len(df)} rows, extracting data...")
@@ -135,46 +230,10 @@ class DataProcessor:
             period_cell = df.iloc[8, 0] if len(df) > 8 else None
             logger.info(f"Period cell content: {period_cell}")
             
-            # Helper to detect if a header cell is date-like
-            def is_date_like(value) -> bool:
-                try:
-                    if value is None:
-                        return False
-                    # Datetime-like objects
-                    from datetime import datetime, date
-                    if isinstance(value, (datetime, date)):
-                        return True
-                    # Excel serial date (rough bounds)
-                    if isinstance(value, (int, float)) and 20000 <= float(value) <= 50000:
-                        return True
-                    # Strings containing plausible date patterns
-                    text = str(value).strip()
-                    if not text:
-                        return False
-                    if re.search(r"\d{1,2}[/-]\d{1,2}[/-]\d{2,4}", text):
-                        return True
-                    # Year-month-day or day-month with names could be added here if needed
-                    return False
-                except Exception:
-                    return False
-
             # Locate header row (default row 10). If it fails to yield date columns, scan a window to find a better header row.
-            def find_header_row(frame) -> int:
-                default_idx = 10
-                candidate_indices = list(range(default_idx, min(default_idx + 10, len(frame))))
-                for idx in candidate_indices:
-                    row = frame.iloc[idx]
-                    # Count date-like cells from column 5 onwards
-                    date_like_count = 0
-                    for i in range(5, len(row)):
-                        if is_date_like(row.iloc[i]):
-                            date_like_count += 1
-                        # Early accept if enough
-                        if date_like_count >= 3:
-                            return idx
-                return default_idx
-
-            header_row_index = find_header_row(df)
+            header_row_index = self.find_legacy_header_row(df.head(20).values.tolist())
+            if header_row_index is None:
+                header_row_index = 10
             data_start_row = header_row_index
             if len(df) <= data_start_row:
                 raise ValueError("File does not contain enough data rows")
@@ -185,7 +244,7 @@ class DataProcessor:
             date_columns = []
             for i in range(5, len(headers)):
                 cell_value = headers.iloc[i]
-                if is_date_like(cell_value):
+                if self.is_date_like(cell_value):
                     date_columns.append(i)
             
             if progress_callback:
@@ -198,320 +257,448 @@ class DataProcessor:
             
             logger.info(f"Found {len(date_columns)} date columns")
             
-            # Process each employee row
-            processed_data = []
-            
-            logger.info(f"Starting to process employee rows from row {data_start_row + 1}")
-            
-            # Start from the row after headers for employee data
-            for row_idx in range(data_start_row + 1, len(df)):
-                row = df.iloc[row_idx]
-                
-                # Skip empty rows
-                if pd.isna(row.iloc[0]) or str(row.iloc[0]).strip() == '':
-                    logger.debug(f"Skipping empty row {row_idx}")
-                    continue
-                
-                logger.info(f"Processing row {row_idx}: Employee ID: {str(row.iloc[0]).strip()}")
-                
-                # Extract employee information
-                employee_id = str(row.iloc[0]).strip()
-                employee_name = str(row.iloc[1]).strip() if not pd.isna(row.iloc[1]) else ''
-                designation = str(row.iloc[2]).strip() if not pd.isna(row.iloc[2]) else ''
-                
-                # Process each date column
-                logger.info(f"Found {len(date_columns)} date columns to process for this employee")
-                for col_idx in date_columns:
-                    date_header = headers.iloc[col_idx]
-                    attendance_value = row.iloc[col_idx]
-                    
-                    logger.debug(f"Processing column {col_idx}, date: {date_header}, value: {attendance_value}")
-                    
-                    if pd.isna(attendance_value) or str(attendance_value).strip() == '':
-                        logger.debug(f"Skipping empty attendance value for column {col_idx}")
-                        continue
-                    
-                    # Parse the attendance value
-                    attendance_str = str(attendance_value).strip()
-                    
-                    # Extract time information
-                    in_time = None
-                    out_time = None
-                    status = 'Present'
-                    worked_hours = 0
-                    
-                    if 'P' in attendance_str or 'Present' in attendance_str:
-                        status = 'Present'
-                        # Extract both in and out times
-                        time_matches = re.findall(r'(\d{1,2}:\d{2})', attendance_str)
-                        if len(time_matches) >= 2:
-                            in_time = time_matches[0]
-                            out_time = time_matches[1]
-                            try:
-                                # Validate times
-                                datetime.strptime(in_time, '%H:%M')
-                                datetime.strptime(out_time, '%H:%M')
-                            except ValueError:
-                                in_time = None
-                                out_time = None
-                        elif len(time_matches) == 1:
-                            in_time = time_matches[0]
-                    elif 'A' in attendance_str or 'Absent' in attendance_str:
-                        status = 'Absent'
-                    elif 'L' in attendance_str or 'Leave' in attendance_str:
-                        status = 'Leave'
-                    elif 'H' in attendance_str or 'Holiday' in attendance_str:
-                        status = 'Holiday'
-                        
-                    # Add logging to debug time extraction
-                    logger.debug(f"Attendance string: {attendance_str}")
-                    logger.debug(f"Extracted times: in={in_time}, out={out_time}")
-                    
-                    # Calculate worked hours if both in and out times are available
-                    if in_time and out_time:
-                        try:
-                            from datetime import datetime, timedelta
-                            in_dt = datetime.strptime(in_time, '%H:%M')
-                            out_dt = datetime.strptime(out_time, '%H:%M')
-                            if out_dt < in_dt:
-                                out_dt += timedelta(days=1)
-                            worked_hours = (out_dt - in_dt).total_seconds() / 3600
-                        except:
-                            worked_hours = 0
-                    
-                    # Parse date from header robustly
-                    try:
-                        if isinstance(date_header, str):
-                            text = date_header.strip()
-                            # Try common formats
-                            fmt_candidates = ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%m/%d/%Y']
-                            parsed = None
-                            for fmt in fmt_candidates:
-                                try:
-                                    parsed = datetime.strptime(text, fmt)
-                                    break
-                                except Exception:
-                                    continue
-                            if parsed is None:
-                                continue
-                            date_obj = parsed
-                        elif isinstance(date_header, (int, float)):
-                            # Excel serial date
-                            from datetime import datetime, timedelta
-                            excel_base = datetime(1899, 12, 30)  # Excel's epoch
-                            date_obj = excel_base + timedelta(days=float(date_header))
-                        else:
-                            date_obj = date_header
-
-                        day_name = date_obj.strftime('%A')
-                        date_str = date_obj.strftime('%Y-%m-%d')
-                    except Exception:
-                        continue
-                    
-                    processed_data.append({
-                        'Employee_ID': employee_id,
-                        'Employee_Name': employee_name,
-                        'Designation': designation,
-                        'Date': date_str,
-                        'Day_Name': day_name,
-                        'InTime': in_time,
-                        'OutTime': out_time,
-                        'Status': status,
-                        'WorkedHours': worked_hours
-                    })
+            # Resolve every date header once per column; headers that cannot be parsed are skipped
+            resolved = [(col_idx, self._resolve_date_header(headers.iloc[col_idx])) for col_idx in date_columns]
+            resolved = [(col_idx, parsed) for col_idx, parsed in resolved if parsed is not None]
+            
+            # Employee rows start after the header; rows without an employee ID are skipped
+            body = df.iloc[data_start_row + 1:]
+            employee_ids = self._cell_text(body.iloc[:, 0].to_numpy(dtype=object))
+            employee_rows = (employee_ids != '').to_numpy()
+            body = body[employee_rows]
+            employee_ids = employee_ids[employee_rows].to_numpy(dtype=object)
+            employee_names = self._cell_text(body.iloc[:, 1].to_numpy(dtype=object)).to_numpy(dtype=object)
+            designations = self._cell_text(body.iloc[:, 2].to_numpy(dtype=object)).to_numpy(dtype=object)
+            logger.debug(f"Processing {len(body)} employee rows from row {data_start_row + 1}")
+            
+            # Stack the attendance cells (employee-major, date-minor) and drop empty ones
+            cells = body.iloc[:, [col_idx for col_idx, _ in resolved]].to_numpy(dtype=object)
+            text = self._cell_text(cells.ravel())
+            filled = (text != '').to_numpy()
+            emp_pos = np.repeat(np.arange(cells.shape[0]), cells.shape[1])[filled]
+            date_pos = np.tile(np.arange(cells.shape[1]), cells.shape[0])[filled]
+            text = text[filled].reset_index(drop=True)
+            
+            # Status from the first matching marker; unmatched values default to Present
+            is_present = text.str.contains('P', regex=False).to_numpy()
+            status = np.select(
+                [is_present,
+                 text.str.contains('A', regex=False).to_numpy(),
+                 text.str.contains('L', regex=False).to_numpy(),
+                 text.str.contains('H', regex=False).to_numpy()],
+                ['Present', 'Absent', 'Leave', 'Holiday'],
+                default='Present',
+            ).astype(object)
+            
+            # First two HH:MM tokens of present cells, in one vectorized extraction
+            times = text.str.extract(r'(?s)^.*?(\d{1,2}:\d{2})(?:.*?(\d{1,2}:\d{2}))?')
+            times[~is_present] = np.nan
+            first, second = times[0], times[1]
+            has_pair = second.notna().to_numpy()
+            
+            in_time = first.to_numpy(dtype=object)
+            out_time = second.to_numpy(dtype=object)
+            in_time[pd.isna(in_time)] = None
+            out_time[~has_pair] = None
+            worked_hours = np.zeros(len(text), dtype=float if has_pair.any() else int)
+            if has_pair.any():
+                first_parts = first.str.split(':', expand=True).astype(float)
+                second_parts = second.str.split(':', expand=True).astype(float)
+                in_h, in_m = first_parts[0].to_numpy(), first_parts[1].to_numpy()
+                out_h, out_m = second_parts[0].to_numpy(), second_parts[1].to_numpy()
+                # Both times must be valid %H:%M values, otherwise neither is kept
+                valid = has_pair & (in_h <= 23) & (in_m <= 59) & (out_h <= 23) & (out_m <= 59)
+                in_time[has_pair & ~valid] = None
+                out_time[has_pair & ~valid] = None
+                # Worked hours with overnight wrap-around
+                minutes = (out_h * 60 + out_m) - (in_h * 60 + in_m)
+                minutes = np.where(minutes < 0, minutes + 24 * 60, minutes)
+                worked_hours[valid] = minutes[valid] * 60 / 3600
+            
+            date_strs = np.array([parsed[0] for _, parsed in resolved], dtype=object)
+            day_names = np.array([parsed[1] for _, parsed in resolved], dtype=object)
+            processed_data = pd.DataFrame({
+                'Employee_ID': employee_ids[emp_pos],
+                'Employee_Name': employee_names[emp_pos],
+                'Designation': designations[emp_pos],
+                'Date': date_strs[date_pos],
+                'Day_Name': day_names[date_pos],
+                'InTime': in_time,
+                'OutTime': out_time,
+                'Status': status,
+                'WorkedHours': worked_hours,
+            })
             
             if progress_callback:
-                progress_callback(70, f"Processed {len(processed_data)} attendance records")
+                progress_callback(70, f"Processed {len(processed_data)} attendance records", rows=len(processed_data))
             
             logger.info(f"Successfully processed {len(processed_data)} attendance records")
             
-            df_out = pd.DataFrame(processed_data)
-            if df_out.empty:
+            if processed_data.empty:
                 raise ValueError("Parsed attendance produced 0 rows. Verify header row and date columns.")
-            return df_out
+            return processed_data
             
         except Exception as e:
             logger.error(f"Error processing attendance file: {str(e)}")
             raise ValueError(f"Attendance file processing failed: {str(e)}")
 
-    def process_matrix_attendance(self, file_path: str, progress_callback: Optional[Callable] = None) -> pd.DataFrame:
-        """Process matrix-style attendance where header has fixed ID/Name/Designation and day columns like '1 Mon'."""
-        import re
+    @staticmethod
+    def is_date_like(value) -> bool:
+        """Detect if a legacy header cell is date-like"""
+        try:
+            if value is None:
+                return False
+            # Datetime-like objects
+            from datetime import datetime, date
+            if isinstance(value, (datetime, date)):
+                return True
+            # Excel serial date (rough bounds)
+            if isinstance(value, (int, float)) and 20000 <= float(value) <= 50000:
+                return True
+            # Strings containing plausible date patterns
+            text = str(value).strip()
+            if not text:
+                return False
+            if re.search(r"\d{1,2}[/-]\d{1,2}[/-]\d{2,4}", text):
+                return True
+            # Year-month-day or day-month with names could be added here if needed
+            return False
+        except Exception:
+            return False
+
+    def find_legacy_header_row(self, header_rows: List[List[Any]]) -> Optional[int]:
+        """Return the first row from index 10 with at least three date-like cells from column F onwards"""
+        for idx in range(10, min(20, len(header_rows))):
+            row = header_rows[idx]
+            # Count date-like cells from column 5 onwards
+            date_like_count = 0
+            for value in row[5:]:
+                if self.is_date_like(value):
+                    date_like_count += 1
+                # Early accept if enough
+                if date_like_count >= 3:
+                    return idx
+        return None
+
+    @staticmethod
+    def _resolve_date_header(date_header) -> Optional[tuple]:
+        """Parse a legacy date header into ('YYYY-MM-DD', weekday name), or None if it is not a usable date"""
         from datetime import datetime, timedelta
+        try:
+            if isinstance(date_header, str):
+                text = date_header.strip()
+                # Try common formats
+                date_obj = None
+                for fmt in ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%m/%d/%Y'):
+                    try:
+                        date_obj = datetime.strptime(text, fmt)
+                        break
+                    except ValueError:
+                        continue
+                if date_obj is None:
+                    return None
+            elif isinstance(date_header, (int, float)):
+                # Excel serial date
+                excel_base = datetime(1899, 12, 30)  # Excel's epoch
+                date_obj = excel_base + timedelta(days=float(date_header))
+            else:
+                date_obj = date_header
+            return date_obj.strftime('%Y-%m-%d'), date_obj.strftime('%A')
+        except Exception:
+            return None
+
+    # Row labels of the four-row employee block, in the order the legacy loop tested them
+    MATRIX_IN, MATRIX_OUT, MATRIX_STATUS, MATRIX_WORK = 0, 1, 2, 3
+    MATRIX_COLUMNS = ['Employee_ID', 'Employee_Name', 'Designation', 'Date', 'Day_Name', 'InTime', 'OutTime', 'Status', 'WorkedHours']
+
+    def process_matrix_attendance(self, file_path: str, progress_callback: Optional[Callable] = None, raw: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+        """Process matrix-style attendance where header has fixed ID/Name/Designation and day columns like '1 Mon'."""
         try:
             if progress_callback:
                 progress_callback(40, "Processing matrix attendance file...")
 
-            # Read sheet without headers to locate header row dynamically
-            if file_path.lower().endswith('.xls'):
-                raw = pd.read_excel(file_path, engine='xlrd', header=None)
+            # Read sheet without headers to locate header row dynamically (unless the caller already has it)
+            if raw is None:
+                raw = ExcelReader().read_raw_grid(file_path)
+
+            layout = self.locate_matrix_header(raw.head(50).values.tolist())
+            body = raw.iloc[layout['header_row_idx'] + 1:]
+            if body.empty:
+                raise ValueError("Parsed matrix attendance produced 0 rows. Verify header row and day columns.")
+
+            # Classify every row by its 'Time' column label in one pass
+            labels = self._cell_text(body.iloc[:, layout['time_col']].to_numpy(dtype=object)).str.lower()
+            kinds = np.select(
+                [labels.str.startswith('intime') | (labels == 'in time'),
+                 labels.str.startswith('out'),
+                 labels.str.contains('status', regex=False),
+                 labels.str.contains('work', regex=False)],
+                [self.MATRIX_IN, self.MATRIX_OUT, self.MATRIX_STATUS, self.MATRIX_WORK],
+                default=-1,
+            )
+            positions = np.flatnonzero(kinds >= 0)
+            if positions.size == 0:
+                raise ValueError("Parsed matrix attendance produced 0 rows. Verify header row and day columns.")
+            row_kinds = kinds[positions]
+
+            # A block starts at every InTime row and right after every WorkedHours row
+            starts = row_kinds == self.MATRIX_IN
+            starts[0] = True
+            starts[1:] |= row_kinds[:-1] == self.MATRIX_WORK
+            block_of = np.cumsum(starts) - 1
+            n_blocks = int(block_of[-1]) + 1
+
+            # Identity is carried forward from the last non-empty cell and read at the row where the block is flushed:
+            # the WorkedHours row, the next block's InTime row, or the last row of the sheet.
+            block_first = positions[starts]
+            block_last = positions[np.r_[starts[1:], True]]
+            flush_at = np.where(kinds[block_last] == self.MATRIX_WORK, block_last, np.r_[block_first[1:], len(body) - 1])
+            identity = []
+            for col in (layout['emp_id_col'], layout['name_col'], layout['post_col']):
+                text = self._cell_text(body.iloc[:, col].to_numpy(dtype=object)).to_numpy(dtype=object)
+                identity.append(self._forward_fill_text(text)[flush_at])
+
+            # Day cells of every labelled row, converted to text once
+            day_cells = body.iloc[positions, layout['day_col_indices']].to_numpy(dtype=object)
+            day_text = self._cell_text(day_cells.ravel()).to_numpy(dtype=object).reshape(day_cells.shape)
+
+            grids = []
+            for kind in (self.MATRIX_IN, self.MATRIX_OUT, self.MATRIX_STATUS, self.MATRIX_WORK):
+                grid = np.full((n_blocks, day_cells.shape[1]), '', dtype=object)
+                rows = np.flatnonzero(row_kinds == kind)
+                if rows.size:
+                    # A repeated label inside one block overwrites the earlier row
+                    blocks = block_of[rows]
+                    keep = np.r_[blocks[1:] != blocks[:-1], True]
+                    grid[blocks[keep]] = day_text[rows[keep]]
+                    if kind == self.MATRIX_STATUS:
+                        grid = pd.Series(grid.ravel(), dtype=object).str.upper().to_numpy(dtype=object).reshape(grid.shape)
+                grids.append(grid)
+
+            df_out = self.assemble_matrix_frame(identity, grids, layout['day_dates'], layout['day_names'])
+            if df_out.empty:
+                raise ValueError("Parsed matrix attendance produced 0 rows. Verify header row and day columns.")
+
+            if progress_callback:
+                progress_callback(70, f"Processed {len(df_out)} attendance records", rows=len(df_out))
+
+            return df_out
+        except Exception as e:
+            logger.error(f"Error processing matrix attendance file: {str(e)}")
+            raise ValueError(f"Matrix attendance processing failed: {str(e)}")
+
+    @staticmethod
+    def _cell_text(values: np.ndarray) -> pd.Series:
+        """Vectorized equivalent of ``'' if pd.isna(val) else str(val).strip()``"""
+        series = pd.Series(values, dtype=object)
+        text = series.astype(str).str.strip()
+        text[series.isna().to_numpy()] = ''
+        return text
+
+    @staticmethod
+    def _forward_fill_text(text: np.ndarray) -> np.ndarray:
+        """Carry the last non-empty string forward over empty ones ('' before the first value).
+        
+        Index-based so the object column is never run through Series.ffill, which
+        warns about downcasting when a column has no values at all.
+        """
+        positions = np.where(text != '', np.arange(len(text)), -1)
+        last = np.maximum.accumulate(positions) if len(text) else positions
+        return np.where(last >= 0, text[np.maximum(last, 0)], '').astype(object)
+
+    def locate_matrix_header(self, header_rows: List[List[Any]]) -> Dict[str, Any]:
+        """Find the '1 Mon' header row in the first rows of a sheet and resolve the column layout"""
+        day_header_pattern = re.compile(r"^\s*\d{1,2}\s+[A-Za-z]+\s*$")
+        header_row_idx = None
+        day_col_indices = []
+        for r, row_vals in enumerate(header_rows[:50]):
+            matches = [i for i, v in enumerate(row_vals) if isinstance(v, str) and day_header_pattern.match(v.strip())]
+            # Only consider day columns if they occur after the first 3 columns
+            matches = [i for i in matches if i >= 3]
+            if len(matches) >= 3:
+                header_row_idx = r
+                day_col_indices = matches
+                break
+
+        if header_row_idx is None:
+            raise ValueError("Could not locate header row with day headers like '1 Mon'")
+
+        headers = list(header_rows[header_row_idx])
+
+        # Identify important columns by header labels (case-insensitive)
+        def find_col(label_set, default_idx=None):
+            label_set = {s.lower() for s in label_set}
+            for idx, val in enumerate(headers):
+                text = str(val).strip().lower() if val is not None else ''
+                if text in label_set:
+                    return idx
+            return default_idx
+
+        # Normalize each day header once; ensure single weekday token
+        day_dates = []
+        day_names = []
+        for idx in day_col_indices:
+            day_header = str(headers[idx]).strip()
+            m = re.match(r"^(\d{1,2})\s+([A-Za-z]+)$", day_header)
+            parts = day_header.split()
+            if m:
+                day_names.append(m.group(2).strip())
+                day_dates.append(f"{m.group(1).zfill(2)} {m.group(2).strip()}")
+            elif len(parts) >= 2 and parts[0].isdigit():
+                # Fallback: take first two tokens if available
+                day_names.append(parts[1])
+                day_dates.append(f"{parts[0].zfill(2)} {parts[1]}")
             else:
-                raw = pd.read_excel(file_path, engine='openpyxl', header=None)
+                day_names.append(day_header)
+                day_dates.append(day_header or '')
+
+        return {
+            'header_row_idx': header_row_idx,
+            'headers': headers,
+            'sn_col': find_col({"sn", "sn.", "s.n."}, 0),
+            'emp_id_col': find_col({"emp id", "empid", "employee id", "emp no", "emp no."}, 1),
+            'name_col': find_col({"name", "employee name", "emp name"}, 2),
+            'post_col': find_col({"post", "designation", "desig", "designation"}, 3),
+            'time_col': find_col({"time"}, 4),
+            'day_col_indices': day_col_indices,
+            'day_dates': day_dates,
+            'day_names': day_names,
+        }
+
+    def process_matrix_attendance_stream(self, rows: Iterable[List[Any]], progress_callback: Optional[Callable] = None, chunk_blocks: int = 1000) -> pd.DataFrame:
+        """Streaming variant of process_matrix_attendance.
 
-            # Find header row by detecting multiple day-like headers in a row
-            header_row_idx = None
-            day_header_pattern = re.compile(r"^\s*\d{1,2}\s+[A-Za-z]+\s*$")
-            scan_limit = min(50, len(raw))
-            for r in range(scan_limit):
-                row_vals = raw.iloc[r].tolist()
-                matches = [i for i, v in enumerate(row_vals) if isinstance(v, str) and day_header_pattern.match(v.strip())]
-                # Only consider day columns if they occur after the first 3 columns
-                matches = [i for i in matches if i >= 3]
-                if len(matches) >= 3:
-                    header_row_idx = r
-                    day_col_indices = matches
+        Consumes rows one at a time (e.g. from ExcelReader.iter_rows) and
+        assembles employee blocks in chunks as they complete, so peak input
+        memory is one chunk of blocks instead of the whole sheet.
+        """
+        try:
+            if progress_callback:
+                progress_callback(40, "Streaming matrix attendance file...")
+
+            rows = iter(rows)
+            header_rows = []
+            for row in rows:
+                header_rows.append(row)
+                if len(header_rows) >= 50:
                     break
+            layout = self.locate_matrix_header(header_rows)
 
-            if header_row_idx is None:
-                raise ValueError("Could not locate header row with day headers like '1 Mon'")
-
-            headers = raw.iloc[header_row_idx].tolist()
-            # Identify important columns by header labels (case-insensitive)
-            def find_col(label_set, default_idx=None):
-                label_set = {s.lower() for s in label_set}
-                for idx, val in enumerate(headers):
-                    text = str(val).strip().lower() if val is not None else ''
-                    if text in label_set:
-                        return idx
-                return default_idx
-
-            sn_col = find_col({"sn", "sn.", "s.n."}, 0)
-            emp_id_col = find_col({"emp id", "empid", "employee id", "emp no", "emp no."}, 1)
-            name_col = find_col({"name", "employee name", "emp name"}, 2)
-            post_col = find_col({"post", "designation", "desig", "designation"}, 3)
-            time_col = find_col({"time"}, 4)
-
-            # Confirm or compute day_col_indices from headers (to the right of the Time column)
-            if not day_col_indices:
-                day_col_indices = []
-                for idx, val in enumerate(headers):
-                    if idx <= (time_col if time_col is not None else 3):
-                        continue
-                    text = str(val).strip() if val is not None else ''
-                    if day_header_pattern.match(text):
-                        day_col_indices.append(idx)
-
-            if not day_col_indices:
-                raise ValueError("No day columns found (expected headers like '1 Mon', '2 Tue')")
-
-            processed_rows = []
-
-            # Helpers
-            def cell_str(val):
-                return '' if pd.isna(val) else str(val).strip()
-
-            # Accumulators for a single employee block
-            last_emp_id = ''
-            last_name = ''
-            last_post = ''
-            cur_in = None
-            cur_out = None
-            cur_status = None
-            cur_hours = None
-
-            def extract_day_values(row):
-                return [cell_str(row.iloc[i]) for i in day_col_indices]
-
-            def flush_block():
-                nonlocal cur_in, cur_out, cur_status, cur_hours, last_emp_id, last_name, last_post
-                if cur_in is None and cur_out is None and cur_status is None and cur_hours is None:
-                    return
-                total_days = len(day_col_indices)
-                for j in range(total_days):
-                    raw_header = headers[day_col_indices[j]] if j < total_days else ''
-                    day_header = str(raw_header).strip()
-                    # Normalize header and derive parts; ensure single weekday token
-                    m = re.match(r"^(\d{1,2})\s+([A-Za-z]+)$", day_header)
-                    if m:
-                        day_num = m.group(1).zfill(2)
-                        day_name = m.group(2).strip()
-                        date_text = f"{day_num} {day_name}"
-                    else:
-                        # Fallback: take first two tokens if available
-                        parts = day_header.split()
-                        if len(parts) >= 2 and parts[0].isdigit():
-                            day_num = parts[0].zfill(2)
-                            day_name = parts[1]
-                            date_text = f"{day_num} {day_name}"
-                        else:
-                            day_name = day_header
-                            date_text = day_header or ''
-                    in_time = cur_in[j] if cur_in and j < len(cur_in) else ''
-                    out_time = cur_out[j] if cur_out and j < len(cur_out) else ''
-                    status_val = cur_status[j] if cur_status and j < len(cur_status) else ''
-                    hours_val = cur_hours[j] if cur_hours and j < len(cur_hours) else ''
-                    # Skip if all empty
-                    if not any([in_time, out_time, status_val, hours_val]):
-                        continue
-                    processed_rows.append({
-                        'Employee_ID': last_emp_id,
-                        'Employee_Name': last_name,
-                        'Designation': last_post,
-                        'Date': date_text,
-                        'Day_Name': day_name,
-                        'InTime': in_time,
-                        'OutTime': out_time,
-                        'Status': status_val,
-                        'WorkedHours': hours_val,
-                    })
-                cur_in = cur_out = cur_status = cur_hours = None
-
-            # Iterate rows
-            for r in range(header_row_idx + 1, len(raw)):
-                row = raw.iloc[r]
-
-                # Update identity if present on this row
-                id_val = cell_str(row.iloc[emp_id_col]) if emp_id_col is not None and emp_id_col < len(row) else ''
-                name_val = cell_str(row.iloc[name_col]) if name_col is not None and name_col < len(row) else ''
-                post_val = cell_str(row.iloc[post_col]) if post_col is not None and post_col < len(row) else ''
-
-                if id_val:
-                    last_emp_id = id_val
-                if name_val:
-                    last_name = name_val
-                if post_val:
-                    last_post = post_val
-
-                # Row type by 'Time' column label
-                label = cell_str(row.iloc[time_col]) if time_col is not None and time_col < len(row) else ''
-                label_low = label.lower()
-                if label_low.startswith('intime') or label_low == 'in time':
-                    # If a new InTime begins while we already have data, flush previous block first
-                    if any([cur_in, cur_out, cur_status, cur_hours]):
-                        flush_block()
-                    cur_in = extract_day_values(row)
-                    continue
-                if label_low.startswith('out'):
-                    cur_out = extract_day_values(row)
-                    continue
-                if 'status' in label_low:
-                    cur_status = [cell_str(v).upper() for v in extract_day_values(row)]
-                    continue
-                if 'work' in label_low:
-                    cur_hours = extract_day_values(row)
-                    # We assume a block ends after worked hours row
-                    flush_block()
-                    continue
-
-            # Flush any remaining at EOF
-            flush_block()
-
-            df_out = pd.DataFrame(processed_rows)
+            def body_rows():
+                yield from header_rows[layout['header_row_idx'] + 1:]
+                yield from rows
+
+            frames = []
+            chunk = []
+            total_blocks = 0
+            for block in self.iter_matrix_blocks(body_rows(), layout):
+                chunk.append(block)
+                if len(chunk) >= chunk_blocks:
+                    frames.append(self._frame_from_blocks(chunk, layout))
+                    total_blocks += len(chunk)
+                    chunk = []
+                    if progress_callback:
+                        progress_callback(55, f"Parsed {total_blocks} employee blocks...", rows=total_blocks * len(layout['day_col_indices']))
+            if chunk:
+                frames.append(self._frame_from_blocks(chunk, layout))
+
+            df_out = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
             if df_out.empty:
                 raise ValueError("Parsed matrix attendance produced 0 rows. Verify header row and day columns.")
 
             if progress_callback:
-                progress_callback(70, f"Processed {len(df_out)} attendance records")
+                progress_callback(70, f"Processed {len(df_out)} attendance records", rows=len(df_out))
 
             return df_out
         except Exception as e:
-            logger.error(f"Error processing matrix attendance file: {str(e)}")
+            logger.error(f"Error streaming matrix attendance file: {str(e)}")
             raise ValueError(f"Matrix attendance processing failed: {str(e)}")
 
+    def iter_matrix_blocks(self, rows: Iterable[List[Any]], layout: Dict[str, Any]) -> Iterator[tuple]:
+        """Yield (identity, [in, out, status, worked]) for each employee block as soon as it is complete"""
+        day_cols = layout['day_col_indices']
+        id_col, name_col, post_col, time_col = layout['emp_id_col'], layout['name_col'], layout['post_col'], layout['time_col']
+
+        def cell_str(row, idx):
+            val = row[idx] if idx is not None and idx < len(row) else None
+            return '' if pd.isna(val) else str(val).strip()
+
+        identity = ['', '', '']
+        current = [None, None, None, None]
+        for row in rows:
+            # Update identity if present on this row
+            for pos, col in enumerate((id_col, name_col, post_col)):
+                text = cell_str(row, col)
+                if text:
+                    identity[pos] = text
+
+            # Row type by 'Time' column label
+            label = cell_str(row, time_col).lower()
+            if label.startswith('intime') or label == 'in time':
+                kind = self.MATRIX_IN
+            elif label.startswith('out'):
+                kind = self.MATRIX_OUT
+            elif 'status' in label:
+                kind = self.MATRIX_STATUS
+            elif 'work' in label:
+                kind = self.MATRIX_WORK
+            else:
+                continue
+
+            # A new InTime while a block is open flushes the previous block first
+            if kind == self.MATRIX_IN and any(v is not None for v in current):
+                yield tuple(identity), current
+                current = [None, None, None, None]
+            values = [cell_str(row, idx) for idx in day_cols]
+            current[kind] = [v.upper() for v in values] if kind == self.MATRIX_STATUS else values
+            # We assume a block ends after worked hours row
+            if kind == self.MATRIX_WORK:
+                yield tuple(identity), current
+                current = [None, None, None, None]
+
+        # Flush any remaining at EOF
+        if any(v is not None for v in current):
+            yield tuple(identity), current
+
+    def _frame_from_blocks(self, blocks: List[tuple], layout: Dict[str, Any]) -> pd.DataFrame:
+        """Turn a chunk of streamed blocks into grids and melt them like the in-memory engine"""
+        n_days = len(layout['day_col_indices'])
+        identity = [np.array([block[0][pos] for block in blocks], dtype=object) for pos in range(3)]
+        grids = []
+        for kind in (self.MATRIX_IN, self.MATRIX_OUT, self.MATRIX_STATUS, self.MATRIX_WORK):
+            grid = np.full((len(blocks), n_days), '', dtype=object)
+            for b, (_, values) in enumerate(blocks):
+                if values[kind] is not None:
+                    grid[b] = values[kind]
+            grids.append(grid)
+        return self.assemble_matrix_frame(identity, grids, layout['day_dates'], layout['day_names'])
+
+    def assemble_matrix_frame(self, identity: List[np.ndarray], grids: List[np.ndarray], day_dates: List[str], day_names: List[str]) -> pd.DataFrame:
+        """Melt per-block InTime/OutTime/Status/Worked grids (blocks x days) into one row per employee-day"""
+        n_blocks, n_days = grids[0].shape
+        in_time, out_time, status, hours = (grid.ravel() for grid in grids)
+        # Skip employee-days where all four cells are empty
+        keep = (in_time != '') | (out_time != '') | (status != '') | (hours != '')
+        columns = [np.repeat(np.asarray(values, dtype=object), n_days) for values in identity]
+        columns.append(np.tile(np.asarray(day_dates, dtype=object), n_blocks))
+        columns.append(np.tile(np.asarray(day_names, dtype=object), n_blocks))
+        columns.extend([in_time, out_time, status, hours])
+        return pd.DataFrame(
+            {name: values[keep] for name, values in zip(self.MATRIX_COLUMNS, columns)},
+            columns=self.MATRIX_COLUMNS,
+        )
+
 
 class ExcelWriter:
     """Single Responsibility: Write Excel files"""
     
+    # Outputs with at least this many rows skip openpyxl and stream the sheet XML directly
+    XML_STREAMING_THRESHOLD_ROWS = 50000
+    
+    def __init__(self, xml_streaming_threshold: Optional[int] = None):
+        self.xml_writer = XlsxStreamWriter()
+        self.xml_streaming_threshold = self.XML_STREAMING_THRESHOLD_ROWS if xml_streaming_threshold is None else xml_streaming_threshold
+    
     def write_excel(self, data: pd.DataFrame, output_path: str, template_path: Optional[str] = None, progress_callback: Optional[Callable] = None) -> None:
         """Write processed data to Excel file"""
         try:
@@ -520,6 +707,8 @@ class ExcelWriter:
             
             if template_path:
                 self._write_with_template(data, output_path, template_path)
+            elif len(data) >= self.xml_streaming_threshold:
+                self._write_xml_stream(data, output_path)
             else:
                 self._write_new_file(data, output_path)
             
@@ -547,85 +736,279 @@ class ExcelWriter:
         template_wb.save(output_path)
     
     def _write_new_file(self, data: pd.DataFrame, output_path: str) -> None:
-        """Write data to a new Excel file"""
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Processed Data"
+        """Write data to a new Excel file, streaming rows through a write-only workbook"""
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Processed Data")
         
-        # Write headers
-        for col_idx, column in enumerate(data.columns, 1):
-            ws.cell(row=1, column=col_idx, value=column)
+        # Header row in the shared header style
+        header = StyleRegistry(wb).name('header')
+        header_cells = []
+        for column in data.columns:
+            cell = WriteOnlyCell(ws, value=column)
+            cell.style = header
+            header_cells.append(cell)
+        ws.append(header_cells)
         
-        # Write data
-        for idx, row in data.iterrows():
-            for col_idx, value in enumerate(row, 1):
-                ws.cell(row=idx + 2, column=col_idx, value=value)
+        # Data rows straight from the frame; no cell objects are kept
+        for row in data.itertuples(index=False, name=None):
+            ws.append(row)
         
-        # Apply formatting
-        self._apply_formatting(ws)
+        # Alternating light blue / light red data rows
+        if len(data) and len(data.columns):
+            StyleRegistry.band(ws, f"A2:{get_column_letter(len(data.columns))}{len(data) + 1}")
         
-        # Save
         wb.save(output_path)
     
-    def _apply_formatting(self, worksheet) -> None:
-        """Apply red and blue theme formatting"""
-        # Header formatting
-        header_font = Font(bold=True, color="FFFFFF")
-        header_fill = PatternFill(start_color="1F4E79", end_color="1F4E79", fill_type="solid")
-        
-        for cell in worksheet[1]:
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal="center")
-        
-        # Data row alternating colors
-        data_fill_1 = PatternFill(start_color="F0F8FF", end_color="F0F8FF", fill_type="solid")  # Light blue
-        data_fill_2 = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")  # Light red
+    def _write_xml_stream(self, data: pd.DataFrame, output_path: str) -> None:
+        """Write the same sheet as _write_new_file, generating the worksheet XML without openpyxl"""
+        self.xml_writer.write(list(data.columns), data.itertuples(index=False, name=None), output_path, n_rows=len(data))
+
+
+class AttendanceArtifactStore:
+    """Single Responsibility: persist the normalized attendance frame as a Parquet artifact.
+    
+    Parquet needs one type per column, so object columns holding mixed types
+    (e.g. numeric and text employee IDs) are stored as text; empty cells stay
+    null. Artifacts are plain data, so loading one never executes code.
+    """
+    
+    SUFFIX = '.parquet'
+    
+    def path_for(self, output_path: str) -> str:
+        """Artifact path next to the processed output, e.g. processed_x.attendance.parquet"""
+        base, _ = os.path.splitext(output_path)
+        return f"{base}.attendance{self.SUFFIX}"
+    
+    def save(self, data: pd.DataFrame, output_path: str) -> str:
+        """Write the artifact for a processed output and return its path"""
+        artifact_path = self.path_for(output_path)
+        # Report views may backfill the same artifact concurrently; publish it whole
+        with atomic_output(artifact_path) as tmp_path:
+            self._columnar(data).to_parquet(tmp_path, index=False)
+        logger.info(f"Saved attendance artifact: {artifact_path}")
+        return artifact_path
+    
+    def save_quietly(self, data: pd.DataFrame, output_path: str) -> Optional[str]:
+        """save(), returning None instead of raising; the artifact is only a cache of the upload"""
+        try:
+            return self.save(data, output_path)
+        except Exception as e:
+            logger.warning(f"Could not save attendance artifact for {output_path}: {e}")
+            return None
+    
+    def load(self, artifact_path: str) -> pd.DataFrame:
+        """Load an artifact written by save()"""
+        if not artifact_path.endswith(self.SUFFIX):
+            raise ValueError(f"Not a Parquet attendance artifact: {artifact_path}")
+        return pd.read_parquet(artifact_path)
+    
+    @staticmethod
+    def _columnar(data: pd.DataFrame) -> pd.DataFrame:
+        """Copy of the frame with mixed-type object columns converted to text"""
+        mixed = [
+            column for column in data.columns
+            if data[column].dtype == object and pd.api.types.infer_dtype(data[column], skipna=True).startswith('mixed')
+        ]
+        if not mixed:
+            return data
+        data = data.copy()
+        for column in mixed:
+            data[column] = data[column].map(lambda value: None if pd.isna(value) else str(value))
+        return data
+
+
+class FormatDetector:
+    """Single Responsibility: pick the parser for an upload from a small header window"""
+    
+    LAYOUT_MATRIX = 'matrix'
+    LAYOUT_LEGACY = 'legacy'
+    LAYOUT_TABULAR = 'tabular'
+    LAYOUT_UNKNOWN = 'unknown'
+    
+    HEADER_WINDOW_ROWS = 50
+    # Legacy parsing is only attempted from this score (a period in A9 or a row of dates) or for 'Report (1).xls'
+    LEGACY_MIN_CONFIDENCE = 0.4
+    LEGACY_FILENAME = 'Report (1).xls'
+    TABULAR_COLUMNS = ['Employee ID', 'Employee Name', 'Designation', 'Date', 'In Time', 'Out Time']
+    
+    def __init__(self, reader: Optional[ExcelReader] = None, processor: Optional[DataProcessor] = None):
+        self.reader = reader or ExcelReader()
+        self.processor = processor or DataProcessor()
+    
+    def read_header_window(self, file_path: str) -> List[List[Any]]:
+        """Read only the first rows of the sheet (read-only openpyxl for .xlsx, nrows for .xls)"""
+        if file_path.lower().endswith('.xlsx'):
+            rows = []
+            for row in self.reader.iter_rows(file_path):
+                rows.append(row)
+                if len(rows) >= self.HEADER_WINDOW_ROWS:
+                    break
+            return rows
+        window = pd.read_excel(file_path, engine='xlrd' if file_path.lower().endswith('.xls') else None, header=None, nrows=self.HEADER_WINDOW_ROWS)
+        return window.values.tolist()
+    
+    def detect(self, file_path: str, raw: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        """Score every known layout and return the best one with a confidence in [0, 1]
         
-        for row_idx in range(2, worksheet.max_row + 1):
-            fill = data_fill_1 if row_idx % 2 == 0 else data_fill_2
-            for cell in worksheet[row_idx]:
-                cell.fill = fill
+        When the caller already holds the raw grid the window is taken from it
+        instead of reading the file again.
+        """
+        if raw is not None:
+            header_rows = raw.head(self.HEADER_WINDOW_ROWS).values.tolist()
+        else:
+            try:
+                header_rows = self.read_header_window(file_path)
+            except Exception as e:
+                logger.warning(f"Could not read header window of {file_path}: {e}")
+                return {'layout': self.LAYOUT_UNKNOWN, 'confidence': 0.0, 'scores': {}}
+        detection = self.detect_rows(header_rows, file_path)
+        detection['header_rows'] = header_rows
+        return detection
+    
+    def detect_rows(self, header_rows: List[List[Any]], file_path: str = '') -> Dict[str, Any]:
+        """Score the layouts against an already loaded header window"""
+        scores = {
+            self.LAYOUT_MATRIX: self._score_matrix(header_rows),
+            self.LAYOUT_LEGACY: self._score_legacy(header_rows, file_path),
+            self.LAYOUT_TABULAR: self._score_tabular(header_rows),
+        }
+        layout, confidence = max(scores.items(), key=lambda item: item[1])
+        if confidence <= 0:
+            layout = self.LAYOUT_UNKNOWN
+        logger.info(f"Detected layout '{layout}' (confidence {confidence:.2f}) for {file_path or 'header window'}")
+        return {'layout': layout, 'confidence': round(confidence, 2), 'scores': scores}
+    
+    def allows_legacy(self, detection: Dict[str, Any], file_path: str) -> bool:
+        """Whether the legacy parser may run on a file, so other sheets are never forced into its layout"""
+        if detection['layout'] == self.LAYOUT_LEGACY or self.LEGACY_FILENAME in file_path:
+            return True
+        return detection.get('scores', {}).get(self.LAYOUT_LEGACY, 0.0) >= self.LEGACY_MIN_CONFIDENCE
+    
+    def _score_matrix(self, header_rows: List[List[Any]]) -> float:
+        """Matrix exports: a '1 Mon' day header row followed by InTime/OutTime/Status rows"""
+        try:
+            layout = self.processor.locate_matrix_header(header_rows)
+        except ValueError:
+            return 0.0
+        score = 0.6
+        headers = [str(v).strip().lower() for v in layout['headers'] if v is not None]
+        if 'time' in headers:
+            score += 0.2
+        labels = []
+        for row in header_rows[layout['header_row_idx'] + 1:]:
+            time_col = layout['time_col']
+            if time_col < len(row) and isinstance(row[time_col], str):
+                labels.append(row[time_col].strip().lower())
+        if any(label.startswith('intime') or label == 'in time' for label in labels):
+            score += 0.2
+        return score
+    
+    def _score_legacy(self, header_rows: List[List[Any]], file_path: str) -> float:
+        """Legacy exports: a period in A9 and a row of dates from column F around row 11"""
+        score = 0.0
+        if len(header_rows) > 8 and header_rows[8]:
+            period_text = str(header_rows[8][0]) if header_rows[8][0] is not None else ''
+            if any(keyword in period_text for keyword in ['Period:', 'PERIOD', 'period']):
+                score += 0.4
+        if self.processor.find_legacy_header_row(header_rows) is not None:
+            score += 0.5
+        if score and self.LEGACY_FILENAME in file_path:
+            score += 0.1
+        return score
+    
+    def _score_tabular(self, header_rows: List[List[Any]]) -> float:
+        """Flat tables: the first row carries the expected column names"""
+        if not header_rows:
+            return 0.0
+        first_row = {str(v).strip() for v in header_rows[0] if v is not None}
+        found = sum(1 for col in self.TABULAR_COLUMNS if col in first_row)
+        return 0.9 * found / len(self.TABULAR_COLUMNS)
+
+
+class FileMetadataExtractor:
+    """Single Responsibility: read file-level metadata (the reporting period) from the header window"""
+    
+    PERIOD_ROW = 8  # cell A9
+    PERIOD_LABEL = re.compile(r"(?i)^\s*period\s*:?,?\s*")
+    PERIOD_DATE = re.compile(r"\d{4}[/-]\d{1,2}[/-]\d{1,2}")
+    
+    @classmethod
+    def normalize_period(cls, raw_text) -> str:
+        """Period text without a leading 'Period:' label, or 'Unknown'"""
+        if raw_text is None or pd.isna(raw_text):
+            return "Unknown"
+        return cls.PERIOD_LABEL.sub("", str(raw_text).strip()) or "Unknown"
+    
+    @classmethod
+    def period_bounds(cls, period_text: str) -> tuple:
+        """First and last date of a period such as '2082/03/01 - 2082/03/32', kept as text (BS dates are not valid Gregorian dates)"""
+        dates = cls.PERIOD_DATE.findall(period_text or '')
+        if len(dates) >= 2:
+            return dates[0], dates[1]
+        return None, None
+    
+    def extract(self, header_rows: List[List[Any]]) -> Dict[str, Any]:
+        """Metadata of a file whose first rows are header_rows"""
+        period_cell = None
+        if len(header_rows) > self.PERIOD_ROW and header_rows[self.PERIOD_ROW]:
+            period_cell = header_rows[self.PERIOD_ROW][0]
+        period_text = self.normalize_period(period_cell)
+        period_start, period_end = self.period_bounds(period_text)
+        return {
+            'period_text': period_text,
+            'period_start': period_start,
+            'period_end': period_end,
+        }
 
 
 class ExcelProcessorService:
     """Main service class that orchestrates the processing workflow"""
     
-    def __init__(self):
+    # Uploads at or above this size are parsed through the streaming reader
+    STREAMING_THRESHOLD_BYTES = 4 * 1024 * 1024
+    
+    def __init__(self, streaming_threshold: Optional[int] = None):
         self.reader = ExcelReader()
         self.processor = DataProcessor()
         self.writer = ExcelWriter()
+        self.detector = FormatDetector(self.reader, self.processor)
+        self.metadata = FileMetadataExtractor()
+        self.artifacts = AttendanceArtifactStore()
+        self.streaming_threshold = self.STREAMING_THRESHOLD_BYTES if streaming_threshold is None else streaming_threshold
     
-    def process_file(self, input_path: str, output_path: str, template_path: Optional[str] = None, progress_callback: Optional[Callable] = None) -> Dict[str, Any]:
+    def process_file(self, input_path: str, output_path: str, template_path: Optional[str] = None, progress_callback: Optional[Callable] = None, layout: Optional[str] = None) -> Dict[str, Any]:
         """Main method to process Excel file"""
         try:
             if progress_callback:
                 progress_callback(10, "Starting file processing...")
             
-            # Prefer matrix-style parser if day headers are like '1 Mon'
-            try:
-                processed_data = self.processor.process_matrix_attendance(input_path, progress_callback)
-            except Exception as matrix_err:
-                logger.info(f"Matrix parser fallback: {matrix_err}")
-                # Fallback to attendance parser (legacy format)
-                if 'Report (1).xls' in input_path or self._is_attendance_file(input_path):
-                    processed_data = self.processor.process_attendance_file(input_path, progress_callback)
-                else:
-                    # Final fallback to general wide-format processor
-                    data = self.reader.read_excel(input_path, progress_callback)
-                    processed_data = self.processor.process_data(data, progress_callback)
+            processed_data, detection = self.parse_upload(input_path, progress_callback, layout)
             
             # Write to output file
             self.writer.write_excel(processed_data, output_path, template_path, progress_callback)
             
+            # Columnar copy of the normalized frame for report and preview views
+            if progress_callback:
+                progress_callback(95, "Saving attendance artifact...")
+            artifact_path = self.artifacts.save_quietly(processed_data, output_path)
+            try:
+                metadata = self.extract_metadata(input_path, detection.get('header_rows'))
+            except Exception as e:
+                logger.warning(f"Could not extract file metadata from {input_path}: {e}")
+                metadata = {}
+            
             if progress_callback:
-                progress_callback(100, f"Processing completed! {len(processed_data)} records processed.")
+                progress_callback(100, f"Processing completed! {len(processed_data)} records processed.", rows=len(processed_data))
             
             return {
                 'success': True,
                 'input_rows': len(processed_data),
                 'output_rows': len(processed_data),
-                'output_path': output_path
+                'output_path': output_path,
+                'artifact_path': artifact_path,
+                'layout': detection['layout'],
+                'layout_confidence': detection['confidence'],
+                'metadata': metadata,
             }
             
         except Exception as e:
@@ -635,33 +1018,74 @@ class ExcelProcessorService:
                 'error': str(e)
             }
     
-    def _is_attendance_file(self, file_path: str) -> bool:
-        """Check if the file is an attendance file based on content"""
-        try:
-            import pandas as pd
-            
-            # Try to read the file with pandas
+    def extract_metadata(self, input_path: str, header_rows: Optional[List[List[Any]]] = None) -> Dict[str, Any]:
+        """File-level metadata (see FileMetadataExtractor), reading the header window unless it is given"""
+        if header_rows is None:
+            header_rows = self.detector.read_header_window(input_path)
+        return self.metadata.extract(header_rows)
+    
+    def extract_attendance(self, input_path: str, progress_callback: Optional[Callable] = None, layout: Optional[str] = None) -> pd.DataFrame:
+        """Parse the upload into the normalized attendance frame, reading the workbook once"""
+        return self.parse_upload(input_path, progress_callback, layout)[0]
+    
+    def parse_upload(self, input_path: str, progress_callback: Optional[Callable] = None, layout: Optional[str] = None) -> tuple:
+        """Parse the upload with the parser for its layout.
+        
+        The layout is sniffed from the header window unless the caller already
+        knows it (e.g. stored on ProcessedFile). Only .xlsx files have a cheap
+        header window (read-only openpyxl); xlrd parses the whole workbook even
+        with nrows, so other files are read into the raw grid once and the
+        window is taken from it. If the chosen parser fails the
+        remaining parsers are tried against the same raw grid; the legacy
+        parser only when the detector found legacy markers (see
+        FormatDetector.allows_legacy). Returns the frame and the detection
+        that actually produced it.
+        """
+        raw = None
+        if layout:
+            detection = {'layout': layout, 'confidence': 1.0}
+        elif input_path.lower().endswith('.xlsx'):
+            detection = self.detector.detect(input_path)
+        else:
+            raw = self.reader.read_raw_grid(input_path, progress_callback)
+            detection = self.detector.detect(input_path, raw=raw)
+        
+        candidates = [FormatDetector.LAYOUT_MATRIX, FormatDetector.LAYOUT_LEGACY, FormatDetector.LAYOUT_TABULAR]
+        if detection['layout'] in candidates:
+            candidates.remove(detection['layout'])
+            candidates.insert(0, detection['layout'])
+        if not self.detector.allows_legacy(detection, input_path):
+            candidates.remove(FormatDetector.LAYOUT_LEGACY)
+        
+        errors = []
+        for candidate in candidates:
             try:
-                df = pd.read_excel(file_path, engine='openpyxl', header=None)
-            except Exception:
-                df = pd.read_excel(file_path, header=None)
-            
-            # Check if cell A9 (row 8, column 0) contains period information or similar
-            if len(df) > 8:
-                period_cell = df.iloc[8, 0]
-                period_text = str(period_cell) if period_cell is not None else ''
-                if any(keyword in period_text for keyword in ['Period:', 'PERIOD', 'period']):
-                    return True
-            
-            # Check if row 11 (index 10) has date-like headers starting from column F (index 5)
-            if len(df) > 10 and len(df.columns) > 5:
-                header_row = df.iloc[10]
-                sample_cells = [header_row[i] for i in range(5, min(len(header_row), 15))]
-                for cell in sample_cells:
-                    text = str(cell)
-                    if any(char.isdigit() for char in text) and ('/' in text or '-' in text):
-                        return True
-                    
+                # Very large .xlsx matrix exports are streamed so the whole sheet is never held in memory
+                if candidate == FormatDetector.LAYOUT_MATRIX and raw is None and self._should_stream(input_path):
+                    data = self.processor.process_matrix_attendance_stream(self.reader.iter_rows(input_path), progress_callback)
+                else:
+                    if raw is None:
+                        raw = self.reader.read_raw_grid(input_path, progress_callback)
+                    if candidate == FormatDetector.LAYOUT_MATRIX:
+                        data = self.processor.process_matrix_attendance(input_path, progress_callback, raw=raw)
+                    elif candidate == FormatDetector.LAYOUT_LEGACY:
+                        data = self.processor.process_attendance_file(input_path, progress_callback, raw=raw)
+                    else:
+                        data = self.processor.process_data(self.reader.frame_from_raw_grid(raw), progress_callback)
+            except Exception as e:
+                logger.info(f"Parser '{candidate}' failed for {input_path}: {e}")
+                errors.append(str(e))
+                continue
+            if candidate != detection['layout']:
+                detection = {'layout': candidate, 'confidence': 0.0, 'header_rows': detection.get('header_rows')}
+            return data, detection
+        
+        # Surface the error of the parser the detector picked
+        raise ValueError(errors[0])
+    
+    def _should_stream(self, file_path: str) -> bool:
+        """Only .xlsx files can be streamed (openpyxl read-only); .xls always goes through xlrd"""
+        try:
+            return file_path.lower().endswith('.xlsx') and os.path.getsize(file_path) >= self.streaming_threshold
+        except OSError:
             return False
-        except Exception:
-            return False 
\ No newline at end of file
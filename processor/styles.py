@@ -0,0 +1,89 @@
+"""
+Shared cell styles for the workbooks the app writes.
+Each look is registered once per workbook as a NamedStyle and applied by name,
+so no Font/Fill/Border/Alignment objects are built per cell. Row banding is a
+pair of conditional-formatting rules over the whole range rather than a fill
+on every cell.
+"""
+from openpyxl.formatting.rule import FormulaRule
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+THIN_SIDE = Side(style='thin')
+THIN_BORDER = Border(left=THIN_SIDE, right=THIN_SIDE, top=THIN_SIDE, bottom=THIN_SIDE)
+CENTERED = Alignment(horizontal="center", vertical="center", wrap_text=False)
+
+HEADER_COLOR = "1F4E79"
+EVEN_ROW_COLOR = "F0F8FF"  # Light blue
+ODD_ROW_COLOR = "FFE6E6"  # Light red
+
+
+def solid_fill(color: str) -> PatternFill:
+    return PatternFill(start_color=color, end_color=color, fill_type="solid")
+
+
+class StyleRegistry:
+    """Single Responsibility: register the app's NamedStyles on a workbook and apply them by name"""
+
+    STYLES = {
+        'title': {
+            'font': Font(bold=True, size=14, color="FFFFFF"),
+            'fill': solid_fill(HEADER_COLOR),
+        },
+        # Processed output: no borders, as it has always been written
+        'header': {
+            'font': Font(bold=True, color="FFFFFF"),
+            'fill': solid_fill(HEADER_COLOR),
+            'alignment': Alignment(horizontal="center", wrap_text=False),
+        },
+        # Segregation report sheets are fully bordered
+        'bordered_header': {
+            'font': Font(bold=True, color="FFFFFF"),
+            'fill': solid_fill(HEADER_COLOR),
+            'alignment': Alignment(horizontal="center", wrap_text=False),
+            'border': THIN_BORDER,
+        },
+        'centered': {
+            'alignment': CENTERED,
+        },
+        'time_label': {
+            'font': Font(bold=True),
+            'alignment': CENTERED,
+            'border': THIN_BORDER,
+        },
+    }
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self._registered = set(workbook.named_styles)
+
+    def name(self, style: str) -> str:
+        """Register the style on the workbook on first use and return its name"""
+        if style not in self._registered:
+            self.workbook.add_named_style(NamedStyle(name=style, **self.STYLES[style]))
+            self._registered.add(style)
+        return style
+
+    def apply(self, cell, style: str) -> None:
+        cell.style = self.name(style)
+
+    @staticmethod
+    def band_rules(group_formula: str = "ROW()", bordered: bool = False) -> list:
+        """
+        Conditional-formatting rules for alternating light blue / light red bands,
+        with thin borders when bordered. group_formula numbers the band a row
+        belongs to; even bands are blue.
+        """
+        return [
+            FormulaRule(
+                formula=[f"MOD({group_formula},2)={remainder}"],
+                fill=solid_fill(color),
+                border=THIN_BORDER if bordered else None,
+            )
+            for remainder, color in ((0, EVEN_ROW_COLOR), (1, ODD_ROW_COLOR))
+        ]
+
+    @classmethod
+    def band(cls, worksheet, cell_range: str, group_formula: str = "ROW()", bordered: bool = False) -> None:
+        """Band cell_range with band_rules(group_formula, bordered)"""
+        for rule in cls.band_rules(group_formula, bordered):
+            worksheet.conditional_formatting.add(cell_range, rule)
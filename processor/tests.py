@@ -0,0 +1,534 @@
+"""Tests for the processor app
+
+ParserTests and ReportCacheTests are SimpleTestCases and run without a
+database:
+
+    python manage.py test processor.tests.ParserTests processor.tests.ReportCacheTests
+
+The job queue tests need a live PostgreSQL server. The migrations use
+Postgres-only SQL and the queue relies on SELECT ... FOR UPDATE SKIP LOCKED,
+so SQLite cannot stand in for it. Start the compose database and point the
+settings at it; the DATABASE_USER role needs CREATEDB to create test_<name>:
+
+    docker compose up -d db
+    DATABASE_HOST=localhost python manage.py test processor
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from unittest import mock
+
+import openpyxl
+import pandas as pd
+from django.db import connection
+from django.db.models.signals import post_save, pre_save
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from processor.jobs import (
+    MAX_ATTEMPTS, ThrottledProgressRecorder, claim_next_job, enqueue_processing, requeue_stale_jobs, run_job,
+)
+from processor.models import ProcessedFile, ProcessingJob, StaffDetails, StaffVersion
+from processor.reports import ReportCache, total_days_in_period
+from processor.services import (
+    AttendanceArtifactStore, DataProcessor, ExcelProcessorService, ExcelReader, FileMetadataExtractor, FormatDetector,
+)
+from processor.views import progress_snapshot
+
+
+def save_workbook(directory, name, rows):
+    path = os.path.join(directory, name)
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for row in rows:
+        ws.append(row)
+    wb.save(path)
+    return path
+
+
+MATRIX_ROWS = [
+    ['Monthly Attendance'],
+    [],
+    ['SN', 'Emp ID', 'Name', 'Post', 'Time', '1 Sun', '2 Mon', '3 Tue'],
+    [1, '101', 'Ram Shrestha', 'Clerk', 'InTime', '09:00', '09:05', None],
+    [None, None, None, None, 'OutTime', '17:00', '17:10', None],
+    [None, None, None, None, 'Status', 'p', 'p', 'a'],
+    [None, None, None, None, 'Work', '8:00', '8:05', None],
+    [2, '102', 'Sita Rai', None, 'InTime', None, '10:00', None],
+    [None, None, None, None, 'OutTime', None, '14:00', None],
+    [None, None, None, None, 'Status', 'wo', 'p', None],
+    [None, None, None, None, 'Work', None, '4:00', None],
+]
+
+LEGACY_ROWS = (
+    [['Attendance Report']] + [[] for _ in range(7)]
+    + [['Period: 2082/03/01 - 2082/03/03'], []]
+    + [['ID', 'Name', 'Designation', None, None, '01/07/2025', '02/07/2025', '03/07/2025'],
+       ['201', 'Hari Thapa', 'Driver', None, None, 'P 09:00 17:30', 'A', 'P 22:00 06:00'],
+       ['202', 'Gita KC', 'Peon', None, None, 'L', None, 'H']]
+)
+
+TABULAR_ROWS = [
+    ['Employee ID', 'Employee Name', 'Designation', 'Date', 'In Time', 'Out Time'],
+    ['301', 'Maya Gurung', 'Officer', '2025-07-01', '2025-07-01 09:00', '2025-07-01 17:30'],
+    ['301', 'Maya Gurung', 'Officer', '2025-07-02', '2025-07-02 10:00', '2025-07-02 13:00'],
+]
+
+
+class ParserTests(SimpleTestCase):
+    """Parsed frames of small fixture workbooks, one per supported layout"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.tmpdir = tempfile.mkdtemp()
+        cls.matrix_path = save_workbook(cls.tmpdir, 'matrix.xlsx', MATRIX_ROWS)
+        cls.legacy_path = save_workbook(cls.tmpdir, 'legacy.xlsx', LEGACY_ROWS)
+        cls.tabular_path = save_workbook(cls.tmpdir, 'tabular.xlsx', TABULAR_ROWS)
+        cls.other_path = save_workbook(
+            cls.tmpdir, 'prices.xlsx', [['Product', 'Price', 'Qty']] + [[f'item {i}', i * 1.5, i] for i in range(20)])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.tmpdir, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_matrix_layout(self):
+        data, detection = ExcelProcessorService().parse_upload(self.matrix_path)
+        self.assertEqual(detection['layout'], FormatDetector.LAYOUT_MATRIX)
+        self.assertEqual(list(data.columns), DataProcessor.MATRIX_COLUMNS)
+        self.assertEqual(
+            data[['Employee_ID', 'Designation', 'Date', 'InTime', 'OutTime', 'Status', 'WorkedHours']].values.tolist(),
+            [
+                ['101', 'Clerk', '01 Sun', '09:00', '17:00', 'P', '8:00'],
+                ['101', 'Clerk', '02 Mon', '09:05', '17:10', 'P', '8:05'],
+                ['101', 'Clerk', '03 Tue', '', '', 'A', ''],
+                # Identity cells are carried forward from the block above
+                ['102', 'Clerk', '01 Sun', '', '', 'WO', ''],
+                ['102', 'Clerk', '02 Mon', '10:00', '14:00', 'P', '4:00'],
+            ],
+        )
+
+    def test_matrix_stream_matches_in_memory_parser(self):
+        processor = DataProcessor()
+        in_memory = processor.process_matrix_attendance(self.matrix_path)
+        streamed = processor.process_matrix_attendance_stream(ExcelReader().iter_rows(self.matrix_path), chunk_blocks=1)
+        pd.testing.assert_frame_equal(in_memory, streamed)
+
+    def test_streamed_rows_match_raw_grid_na_handling(self):
+        path = save_workbook(self.tmpdir, 'na.xlsx', [['Emp ID', 'Name'], ['N/A', 'NULL'], ['101', 'nan'], [7, 'Ram']])
+        reader = ExcelReader()
+        raw = reader.read_raw_grid(path).astype(object).where(lambda frame: frame.notna(), None)
+        self.assertEqual(list(reader.iter_rows(path)), raw.values.tolist())
+
+    def test_matrix_without_identity_values_does_not_warn(self):
+        rows = [[cell if i not in (1, 2, 3) or r < 3 else None for i, cell in enumerate(row)]
+                for r, row in enumerate(MATRIX_ROWS)]
+        path = save_workbook(self.tmpdir, 'anonymous.xlsx', rows)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            data = DataProcessor().process_matrix_attendance(path)
+        self.assertEqual([w for w in caught if issubclass(w.category, FutureWarning)], [])
+        self.assertEqual(set(data['Employee_ID']), {''})
+
+    def test_legacy_layout(self):
+        data, detection = ExcelProcessorService().parse_upload(self.legacy_path)
+        self.assertEqual(detection['layout'], FormatDetector.LAYOUT_LEGACY)
+        self.assertEqual(
+            data[['Employee_ID', 'Date', 'Day_Name', 'InTime', 'OutTime', 'Status', 'WorkedHours']].values.tolist(),
+            [
+                ['201', '2025-07-01', 'Tuesday', '09:00', '17:30', 'Present', 8.5],
+                ['201', '2025-07-02', 'Wednesday', None, None, 'Absent', 0.0],
+                ['201', '2025-07-03', 'Thursday', '22:00', '06:00', 'Present', 8.0],
+                ['202', '2025-07-01', 'Tuesday', None, None, 'Leave', 0.0],
+                ['202', '2025-07-03', 'Thursday', None, None, 'Holiday', 0.0],
+            ],
+        )
+
+    def test_tabular_layout(self):
+        data, detection = ExcelProcessorService().parse_upload(self.tabular_path)
+        self.assertEqual(detection['layout'], FormatDetector.LAYOUT_TABULAR)
+        self.assertEqual(data['WorkedHours'].tolist(), [8.5, 3.0])
+        self.assertEqual(data['Status'].tolist(), ['Present', 'Absent'])
+
+    def test_parse_upload_matches_direct_parsers(self):
+        service = ExcelProcessorService()
+        processor = DataProcessor()
+        pd.testing.assert_frame_equal(
+            service.extract_attendance(self.matrix_path), processor.process_matrix_attendance(self.matrix_path))
+        pd.testing.assert_frame_equal(
+            service.extract_attendance(self.legacy_path), processor.process_attendance_file(self.legacy_path))
+
+    def test_stored_layout_skips_detection(self):
+        service = ExcelProcessorService()
+        with mock.patch.object(service.detector, 'detect') as detect:
+            data = service.extract_attendance(self.legacy_path, layout=FormatDetector.LAYOUT_LEGACY)
+        detect.assert_not_called()
+        self.assertEqual(len(data), 5)
+
+    def test_xls_upload_is_read_once(self):
+        service = ExcelProcessorService()
+        raw = service.reader.read_raw_grid(self.legacy_path)
+        with mock.patch.object(service.reader, 'read_raw_grid', return_value=raw) as read_raw_grid, \
+                mock.patch.object(service.detector, 'read_header_window') as read_header_window:
+            data, detection = service.parse_upload(os.path.join(self.tmpdir, 'legacy.xls'))
+        read_header_window.assert_not_called()
+        read_raw_grid.assert_called_once()
+        self.assertEqual(detection['layout'], FormatDetector.LAYOUT_LEGACY)
+        self.assertEqual(len(detection['header_rows']), 13)
+        self.assertEqual(len(data), 5)
+
+    def test_non_attendance_sheet_is_not_parsed_as_legacy(self):
+        service = ExcelProcessorService()
+        with mock.patch.object(service.processor, 'process_attendance_file') as legacy:
+            with self.assertRaises(ValueError):
+                service.parse_upload(self.other_path)
+        legacy.assert_not_called()
+
+
+class PeriodTests(SimpleTestCase):
+
+    def test_metadata_bounds_of_the_period_cell(self):
+        metadata = FileMetadataExtractor().extract(LEGACY_ROWS[:10])
+        self.assertEqual(metadata, {
+            'period_text': '2082/03/01 - 2082/03/03',
+            'period_start': '2082/03/01',
+            'period_end': '2082/03/03',
+        })
+
+    def test_total_days_come_from_the_stored_bounds(self):
+        data = pd.DataFrame({'Date': ['2025-07-01', '2025-07-02']})
+        self.assertEqual(total_days_in_period(('2082/03/01', '2082/03/32'), data), 32)
+        # Without a stored period the distinct dates are counted
+        self.assertEqual(total_days_in_period((None, None), data), 2)
+
+
+class AttendanceArtifactTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.store = AttendanceArtifactStore()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_mixed_type_columns_round_trip_as_text(self):
+        data = pd.DataFrame({
+            'Employee_ID': [101, 'A7', None],
+            'Status': ['Present', 'Absent', None],
+            'WorkedHours': [8.5, 0.0, None],
+        })
+        path = self.store.save(data, os.path.join(self.tmpdir, 'processed_x.xlsx'))
+        self.assertTrue(path.endswith('processed_x.attendance.parquet'))
+        loaded = self.store.load(path)
+        self.assertEqual(loaded['Employee_ID'].tolist(), ['101', 'A7', None])
+        self.assertEqual(loaded['Status'].tolist(), ['Present', 'Absent', None])
+        self.assertEqual(loaded['WorkedHours'].tolist()[:2], [8.5, 0.0])
+        self.assertEqual(data['Employee_ID'].tolist(), [101, 'A7', None])
+
+    def test_failed_save_records_no_artifact(self):
+        with mock.patch.object(pd.DataFrame, 'to_parquet', side_effect=OSError('disk full')):
+            self.assertIsNone(self.store.save_quietly(pd.DataFrame({'a': [1]}), os.path.join(self.tmpdir, 'x.xlsx')))
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_only_parquet_artifacts_load(self):
+        path = os.path.join(self.tmpdir, 'processed_x.attendance.pkl')
+        pd.DataFrame({'a': [1]}).to_pickle(path)
+        with self.assertRaises(ValueError):
+            self.store.load(path)
+
+
+class JobQueueTests(TestCase):
+
+    def make_file(self):
+        return ProcessedFile.objects.create(original_file='uploads/report.xlsx')
+
+    def test_enqueue_reuses_active_job(self):
+        processed_file = self.make_file()
+        job = enqueue_processing(processed_file)
+        self.assertEqual(enqueue_processing(processed_file).pk, job.pk)
+        self.assertEqual(ProcessingJob.objects.count(), 1)
+
+    def test_claim_next_job_takes_oldest_queued(self):
+        older = ProcessingJob.objects.create(processed_file=self.make_file(), created_at=timezone.now() - timedelta(minutes=5))
+        ProcessingJob.objects.create(processed_file=self.make_file())
+
+        job = claim_next_job('worker-1')
+        self.assertEqual(job.pk, older.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'running')
+        self.assertEqual(job.worker_id, 'worker-1')
+        self.assertEqual(job.attempts, 1)
+        self.assertIsNotNone(job.heartbeat_at)
+
+        self.assertNotEqual(claim_next_job('worker-2').pk, older.pk)
+        self.assertIsNone(claim_next_job('worker-3'))
+
+    def test_requeue_stale_jobs(self):
+        stale = timezone.now() - timedelta(minutes=30)
+        requeued = ProcessingJob.objects.create(
+            processed_file=self.make_file(), status='running', worker_id='gone', attempts=1, heartbeat_at=stale)
+        exhausted = ProcessingJob.objects.create(
+            processed_file=self.make_file(), status='running', worker_id='gone', attempts=MAX_ATTEMPTS, heartbeat_at=stale)
+        alive = ProcessingJob.objects.create(
+            processed_file=self.make_file(), status='running', worker_id='alive', attempts=1, heartbeat_at=timezone.now())
+
+        self.assertEqual(requeue_stale_jobs(600), 2)
+
+        requeued.refresh_from_db()
+        self.assertEqual((requeued.status, requeued.worker_id), ('queued', None))
+        self.assertEqual(requeued.processed_file.status, 'pending')
+        exhausted.refresh_from_db()
+        self.assertEqual(exhausted.status, 'failed')
+        self.assertEqual(ProcessedFile.objects.get(pk=exhausted.processed_file_id).status, 'failed')
+        alive.refresh_from_db()
+        self.assertEqual(alive.status, 'running')
+
+        # The requeued job is claimed again and counts a second attempt
+        self.assertEqual(claim_next_job('worker-1').attempts, 2)
+
+    def test_progress_recorder_throttles_within_a_stage(self):
+        job = ProcessingJob.objects.create(processed_file=self.make_file())
+        recorder = ThrottledProgressRecorder(job, min_interval=60)
+        recorder(41, "Parsing...", rows=10)
+        recorder(55, "Parsing more...", rows=20)
+        job.refresh_from_db()
+        self.assertEqual((job.progress, job.stage, job.rows_processed), (41, 'parsing', 10))
+
+        # A new stage is written straight away
+        recorder(85, "Writing...")
+        job.refresh_from_db()
+        self.assertEqual((job.progress, job.stage, job.rows_processed), (85, 'writing', 20))
+
+
+class ProgressSnapshotTests(TestCase):
+
+    def setUp(self):
+        self.processed_file = ProcessedFile.objects.create(original_file='uploads/report.xlsx', status='pending')
+
+    def test_snapshot_is_one_query(self):
+        ProcessingJob.objects.create(processed_file=self.processed_file, created_at=timezone.now() - timedelta(minutes=5))
+        ProcessingJob.objects.create(
+            processed_file=self.processed_file, status='running', progress=55, stage='parsing',
+            progress_message='Parsing...', rows_processed=300, started_at=timezone.now() - timedelta(seconds=10))
+        with self.assertNumQueries(1):
+            payload = progress_snapshot(ProcessedFile.objects.all(), self.processed_file.pk)
+        self.assertEqual(
+            (payload['status'], payload['progress'], payload['stage'], payload['message'], payload['rows']),
+            ('pending', 55, 'parsing', 'Parsing...', 300))
+        self.assertGreater(payload['rows_per_second'], 0)
+
+    def test_file_without_a_job(self):
+        with self.assertNumQueries(1):
+            payload = progress_snapshot(ProcessedFile.objects.all(), self.processed_file.pk)
+        self.assertEqual((payload['progress'], payload['stage']), (0, 'queued'))
+
+    def test_file_outside_the_queryset(self):
+        self.assertIsNone(progress_snapshot(ProcessedFile.objects.none(), self.processed_file.pk))
+        self.assertIsNone(progress_snapshot(ProcessedFile.objects.all(), self.processed_file.pk + 1))
+
+
+class JobTemplateTests(TestCase):
+    """Templates uploaded for a run are removed once no job needs them"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        os.makedirs(os.path.join(self.media_root, 'templates'))
+        self.processed_file = ProcessedFile.objects.create(original_file='uploads/report.xlsx')
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+    def template(self, name='template.xlsx'):
+        path = os.path.join(self.media_root, 'templates', name)
+        open(path, 'wb').close()
+        return path
+
+    def test_run_job_removes_its_template(self):
+        job = enqueue_processing(self.processed_file, self.template())
+        with mock.patch('processor.jobs.process_uploaded_file', return_value={'success': True}):
+            self.assertEqual(run_job(job.pk), 'completed')
+        self.assertFalse(os.path.exists(job.template_path))
+
+    def test_failed_job_removes_its_template(self):
+        job = enqueue_processing(self.processed_file, self.template())
+        with mock.patch('processor.jobs.process_uploaded_file', side_effect=RuntimeError('boom')):
+            self.assertEqual(run_job(job.pk), 'failed')
+        self.assertFalse(os.path.exists(job.template_path))
+
+    def test_template_of_a_duplicate_enqueue_is_removed(self):
+        first = self.template('first.xlsx')
+        second = self.template('second.xlsx')
+        job = enqueue_processing(self.processed_file, first)
+        self.assertEqual(enqueue_processing(self.processed_file, second).pk, job.pk)
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+
+    def test_templates_outside_media_templates_are_kept(self):
+        path = os.path.join(self.media_root, 'report.xlsx')
+        open(path, 'wb').close()
+        job = enqueue_processing(self.processed_file, path)
+        with mock.patch('processor.jobs.process_uploaded_file', return_value={'success': True}):
+            run_job(job.pk)
+        self.assertTrue(os.path.exists(path))
+
+
+class ConcurrentEnqueueTests(TransactionTestCase):
+
+    def test_concurrent_enqueues_create_one_job(self):
+        processed_file = ProcessedFile.objects.create(original_file='uploads/report.xlsx')
+        create = ProcessingJob.objects.create
+
+        def slow_create(**kwargs):
+            # Widen the window between the active-job check and the insert
+            time.sleep(0.2)
+            return create(**kwargs)
+
+        jobs = []
+
+        def enqueue():
+            try:
+                jobs.append(enqueue_processing(processed_file).pk)
+            finally:
+                connection.close()
+
+        with mock.patch.object(ProcessingJob.objects, 'create', side_effect=slow_create):
+            threads = [threading.Thread(target=enqueue) for _ in range(3)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(jobs), 3)
+        self.assertEqual(len(set(jobs)), 1)
+        self.assertEqual(ProcessingJob.objects.count(), 1)
+
+
+class ReportCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ReportCache(self.root)
+        self.renders = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def render(self):
+        self.renders += 1
+        wb = openpyxl.Workbook()
+        wb.active['A1'] = self.renders
+        return wb
+
+    def get(self, content_hash='abc', department_id=None, revision='r1', staff_version=1):
+        """Name of the stored entry that was served"""
+        with self.open(content_hash, department_id, revision, staff_version) as cached:
+            return os.path.basename(cached.name)
+
+    def open(self, content_hash='abc', department_id=None, revision='r1', staff_version=1):
+        return self.cache.open_or_render(content_hash, 'detailed_attendance', department_id, revision, staff_version, self.render)
+
+    def reports(self):
+        return sorted(name for name in os.listdir(self.root) if name.endswith(ReportCache.SUFFIX))
+
+    def test_identical_request_is_rendered_once(self):
+        self.assertEqual(self.get(), self.get())
+        self.assertEqual(self.renders, 1)
+
+    def test_key_covers_department_revision_and_staff_version(self):
+        self.get()
+        self.get(department_id=3)
+        self.get(revision='r2')
+        self.get(staff_version=2)
+        self.get(content_hash='def')
+        self.assertEqual(self.renders, 5)
+
+    def test_new_revision_or_staff_version_replaces_older_entry(self):
+        first = self.get()
+        self.get(revision='r2')
+        latest = self.get(revision='r2', staff_version=2)
+        self.assertNotIn(first, self.reports())
+        self.assertEqual(self.reports(), [latest])
+
+    def test_open_entry_stays_readable_after_it_is_pruned(self):
+        with self.open() as cached:
+            self.get(staff_version=2)
+            self.assertFalse(os.path.exists(cached.name))
+            self.assertEqual(openpyxl.load_workbook(cached).active['A1'].value, 1)
+
+    def test_other_departments_are_kept(self):
+        self.get()
+        self.get(department_id=3)
+        self.get(department_id=3, staff_version=2)
+        self.assertEqual(len(self.reports()), 2)
+
+    def test_evict_removes_only_that_upload(self):
+        self.get()
+        self.get(department_id=3)
+        kept = self.get(content_hash='def')
+        locks = sorted(name for name in os.listdir(self.root) if name.startswith(ReportCache.LOCK_PREFIX))
+        self.assertEqual(self.cache.evict('abc'), 2)
+        self.assertEqual(self.reports(), [kept])
+        # Lock files may be held by other processes and are shared between keys
+        self.assertEqual(sorted(name for name in os.listdir(self.root) if name.startswith(ReportCache.LOCK_PREFIX)), locks)
+
+    def test_lock_files_are_bounded(self):
+        for content_hash in range(3 * ReportCache.LOCK_STRIPES):
+            self.get(content_hash=f'h{content_hash}')
+        locks = [name for name in os.listdir(self.root) if name.startswith(ReportCache.LOCK_PREFIX)]
+        self.assertLessEqual(len(locks), ReportCache.LOCK_STRIPES)
+
+
+class StaffVersionTests(TestCase):
+    """Cached reports are keyed on StaffVersion.current, so a staff write must change it"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.cache = ReportCache(self.root)
+        self.renders = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def render(self):
+        self.renders += 1
+        return openpyxl.Workbook()
+
+    def get(self, department_id):
+        with self.cache.open_or_render(
+                'abc', 'detailed_attendance', department_id, 'r1', StaffVersion.current(department_id), self.render):
+            pass
+
+    def save_staff(self, staff, stored_department_id):
+        # The staff_details table predates the migrations, so the save itself is simulated
+        with mock.patch.object(StaffDetails.objects, 'filter') as stored:
+            stored.return_value.values_list.return_value.first.return_value = stored_department_id
+            pre_save.send(sender=StaffDetails, instance=staff, raw=False)
+        post_save.send(sender=StaffDetails, instance=staff, created=False, raw=False)
+
+    def test_moving_staff_invalidates_the_old_department(self):
+        self.get(1)
+        self.get(2)
+        self.get(1)
+        self.assertEqual(self.renders, 2)
+
+        self.save_staff(StaffDetails(pk=7, staffid='101', department_id=2), stored_department_id=1)
+        self.get(1)
+        self.get(2)
+        self.get(None)
+        self.assertEqual(self.renders, 5)
+
+    def test_edit_within_a_department_keeps_other_departments(self):
+        self.get(1)
+        self.get(2)
+        self.save_staff(StaffDetails(pk=7, staffid='101', department_id=2), stored_department_id=2)
+        self.get(1)
+        self.get(2)
+        self.assertEqual(self.renders, 3)
@@ -0,0 +1,36 @@
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class Sha256UploadHandler(FileUploadHandler):
+    """
+    Hashes every uploaded file while it streams in.
+    Chunks are passed through untouched, so the regular memory/temporary-file
+    handlers further down the chain still store the file. Digests end up on
+    request.upload_sha256 keyed by form field name.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_sha256'):
+            self.request.upload_sha256 = {}
+        self.request.upload_sha256[self.field_name] = self.hasher.hexdigest()
+        # Let the next handler build the actual UploadedFile
+        return None
+
+
+def sha256_of_upload(uploaded_file):
+    """Hash an UploadedFile from its chunks (used when the upload handler did not run)"""
+    hasher = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        hasher.update(chunk)
+    uploaded_file.seek(0)
+    return hasher.hexdigest()
@@ -42,4 +42,5 @@ urlpatterns = [
     path('files/<int:file_id>/detailed-attendance-report/', views.generate_detailed_attendance_report, name='generate_detailed_attendance_report'),
     path('files/<int:file_id>/detailed-attendance/', views.generate_detailed_attendance_report, name='generate_detailed_attendance_report_short'),
     path('files/<int:file_id>/monthly-wages-report/', views.generate_monthly_wages_report, name='generate_monthly_wages_report'),
+    path('files/<int:file_id>/report-bundle/', views.generate_report_bundle, name='generate_report_bundle'),
 ] 
\ No newline at end of file
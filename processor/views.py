@@ -1,8 +1,7 @@
 
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import TemplateView, ListView, DetailView
-from django.views import View
-from django.http import JsonResponse, HttpResponse, Http404
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse, FileResponse
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
@@ -12,17 +11,21 @@ from django.conf import settings
 from psycopg2.extras import RealDictCursor
 from decouple import config
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import OuterRef, Subquery
 import logging
 import os
-import pandas as pd
-import openpyxl
 import psycopg2
 
 logger = logging.getLogger(__name__)
 
-from .models import ProcessedFile, StaffDetails, Section, Department
+from .models import ProcessedFile, ProcessingJob, StaffDetails, StaffVersion, Section, Department
 from .forms import FileUploadForm, ProcessingOptionsForm, StaffDetailsForm, StaffFilterForm, SectionForm, SectionFilterForm
 from .services import ExcelProcessorService
+from .attendance import AttendanceMatrix, AttendanceSummary
+from .reports import REPORT_SPECS, CompiledReport, ReportCache, SegregationReport, TemplateReportEngine, get_report, prefetch_first, render_pool, stream_zip
+from .uploadhandlers import sha256_of_upload
+from .jobs import discard_template, enqueue_processing
+from django.core.files.storage import default_storage
 
 
 def get_department_filtered_queryset(user, model_class):
@@ -32,55 +35,133 @@ def get_department_filtered_queryset(user, model_class):
     """
     if user.is_superuser:
         return model_class.objects.all()
-    elif user.department:
+    elif user.department_id:
         if model_class == ProcessedFile:
             # For files, filter by users in the same department
-            return model_class.objects.filter(user__department=user.department)
+            return model_class.objects.filter(user__department_id=user.department_id)
         elif model_class == StaffDetails:
             # For staff, filter by department
-            return model_class.objects.filter(department=user.department)
+            return model_class.objects.filter(department_id=user.department_id)
     else:
         # User has no department, return empty queryset
         return model_class.objects.none()
 
 
+def load_attendance_frame(processed_file, service=None):
+    """
+    Load the normalized attendance frame for a file.
+    Uses the columnar artifact written at processing time; older files are parsed
+    once from the original upload and the artifact is backfilled for next time.
+    """
+    service = service or ExcelProcessorService()
+    if processed_file.attendance_artifact:
+        try:
+            return service.artifacts.load(processed_file.attendance_artifact.path)
+        except Exception as e:
+            logger.warning(f"Could not load attendance artifact for file {processed_file.id}: {e}")
+    
+    df = service.extract_attendance(processed_file.original_file.path, layout=processed_file.detected_layout)
+    
+    if processed_file.status == 'completed':
+        try:
+            if processed_file.processed_file:
+                base_path = processed_file.processed_file.path
+            else:
+                base_path = os.path.join(settings.MEDIA_ROOT, 'processed', f"processed_{processed_file.filename()}")
+            artifact_path = service.artifacts.save(df, base_path)
+            processed_file.attendance_artifact = os.path.relpath(artifact_path, settings.MEDIA_ROOT)
+            processed_file.save(update_fields=['attendance_artifact'])
+        except Exception as e:
+            logger.warning(f"Could not backfill attendance artifact for file {processed_file.id}: {e}")
+    return df
+
+
+def report_cache():
+    """Disk cache of rendered template reports under media/reports"""
+    return ReportCache(os.path.join(settings.MEDIA_ROOT, 'reports'))
+
+
+def report_cache_key(processed_file):
+    """Upload key of a file's cached reports; files uploaded before content hashing use their id"""
+    return processed_file.content_hash or f'file{processed_file.id}'
+
+
+def file_period(processed_file, service=None):
+    """
+    Normalized period text of a file.
+    Comes from the metadata stored at processing time; files processed before
+    the metadata existed have it extracted from the upload's header rows once
+    and saved for next time.
+    """
+    if not processed_file.has_metadata:
+        service = service or ExcelProcessorService()
+        try:
+            processed_file.apply_metadata(service.extract_metadata(processed_file.original_file.path))
+            processed_file.save(update_fields=ProcessedFile.METADATA_FIELDS)
+        except Exception as e:
+            logger.error(f"Error extracting period: {e}")
+            return "Unknown"
+    return processed_file.period_text
+
+
 # Progress polling endpoint for AJAX
 @login_required(login_url='/app/login/')
 @require_GET
 def get_progress(request, progress_id):
-    """Return dummy progress info for file processing (expand as needed)"""
-    try:
-        processed_file = ProcessedFile.objects.get(id=progress_id)
-        if processed_file.status == 'completed':
-            return JsonResponse({
-                'progress': 100,
-                'status': 'completed',
-                'message': 'Processing complete.'
-            })
-        elif processed_file.status == 'failed':
-            return JsonResponse({
-                'progress': 100,
-                'status': 'failed',
-                'message': processed_file.error_message or 'Processing failed.'
-            })
-        elif processed_file.status == 'processing':
-            return JsonResponse({
-                'progress': 50,
-                'status': 'processing',
-                'message': 'Processing in progress...'
-            })
-        else:
-            return JsonResponse({
-                'progress': 10,
-                'status': 'pending',
-                'message': 'Waiting to start processing...'
-            })
-    except ProcessedFile.DoesNotExist:
+    """Return the persisted progress of the file's latest processing job"""
+    files_queryset = get_department_filtered_queryset(request.user, ProcessedFile)
+    payload = progress_snapshot(files_queryset, progress_id)
+    if payload is None:
         return JsonResponse({
             'progress': 100,
             'status': 'failed',
             'message': 'File not found.'
         }, status=404)
+    return JsonResponse(payload)
+
+
+PROGRESS_JOB_FIELDS = ('progress', 'stage', 'progress_message', 'rows_processed', 'started_at', 'finished_at')
+
+
+def progress_snapshot(files_queryset, file_id):
+    """
+    Progress payload of a file in files_queryset, or None if it is not there.
+    The file's status and its latest job's progress columns come back as one
+    row from a single query, so clients can poll it cheaply.
+    """
+    latest_job = ProcessingJob.objects.filter(processed_file=OuterRef('pk')).order_by('-created_at')
+    row = (files_queryset.filter(id=file_id)
+           .annotate(**{f'job_{name}': Subquery(latest_job.values(name)[:1]) for name in PROGRESS_JOB_FIELDS})
+           .values('status', 'error_message', *(f'job_{name}' for name in PROGRESS_JOB_FIELDS))
+           .first())
+    if row is None:
+        return None
+    processed_file = ProcessedFile(status=row['status'], error_message=row['error_message'])
+    # progress is never NULL on a job, so NULL means the file has none
+    job = None
+    if row['job_progress'] is not None:
+        job = ProcessingJob(**{name: row[f'job_{name}'] for name in PROGRESS_JOB_FIELDS})
+    return progress_payload(processed_file, job)
+
+
+def progress_payload(processed_file, job):
+    """Progress snapshot for a file, built from its latest ProcessingJob (None if it has none)"""
+    payload = {
+        'status': processed_file.status,
+        'progress': job.progress if job else 0,
+        'stage': job.stage if job else '',
+        'message': (job.progress_message if job else '') or '',
+        'elapsed': round(job.elapsed_seconds(), 1) if job else 0.0,
+        'rows': job.rows_processed if job else 0,
+        'rows_per_second': round(job.rows_per_second(), 1) if job else 0.0,
+    }
+    if processed_file.status == 'completed':
+        payload.update(progress=100, stage='done', message=payload['message'] or 'Processing complete.')
+    elif processed_file.status == 'failed':
+        payload.update(progress=100, message=processed_file.error_message or 'Processing failed.')
+    elif processed_file.status == 'pending' and not (job and job.started_at):
+        payload.update(stage='queued', message='Waiting to start processing...')
+    return payload
 from django.shortcuts import render, get_object_or_404, redirect
 from django.views.generic import TemplateView, ListView, DetailView
 from django.views import View
@@ -91,8 +172,6 @@ from django.utils.decorators import method_decorator
 from django.views.decorators.http import require_POST, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 import os
-import pandas as pd
-import openpyxl
 import psycopg2
 from django.conf import settings
 from psycopg2.extras import RealDictCursor
@@ -139,7 +218,32 @@ class HomeView(TemplateView):
             processed_file = upload_form.save(commit=False)
             processed_file.user = request.user
             processed_file.status = 'pending'
+            
+            # Hash computed by Sha256UploadHandler while the upload streamed in
+            uploaded = upload_form.cleaned_data['original_file']
+            processed_file.content_hash = getattr(request, 'upload_sha256', {}).get('original_file') or sha256_of_upload(uploaded)
+            
+            # Byte-identical re-upload of a completed file: reuse its stored upload and outputs
+            duplicate = None
+            if options_form.cleaned_data['output_type'] != 'template':
+                duplicate = ProcessedFile.find_completed_duplicate(processed_file.content_hash)
+            if duplicate:
+                processed_file.reuse_result_from(duplicate)
+                logger.info(f"Upload matches completed file {duplicate.id}; reusing its processed output")
             processed_file.save()
+            
+            if duplicate and request.headers.get('x-requested-with') != 'XMLHttpRequest':
+                messages.success(request, "File processed successfully! Identical upload found, previous results reused.")
+                return redirect('processor:home')
+
+            # Processing runs in `manage.py run_workers`; the request only queues it
+            if not duplicate:
+                template_path = None
+                if options_form.cleaned_data['output_type'] == 'template':
+                    template_file = options_form.cleaned_data['template_file']
+                    if template_file:
+                        template_path = default_storage.path(default_storage.save(os.path.join('templates', template_file.name), template_file))
+                enqueue_processing(processed_file, template_path)
 
             # For AJAX: return progress_id for polling
             if request.headers.get('x-requested-with') == 'XMLHttpRequest':
@@ -149,71 +253,7 @@ class HomeView(TemplateView):
                     'progress_id': processed_file.id
                 })
 
-            # Non-AJAX fallback: process immediately (legacy)
-            try:
-                service = ExcelProcessorService()
-                input_path = processed_file.original_file.path
-                output_filename = f"processed_{os.path.basename(input_path)}"
-                from django.conf import settings
-                output_path = os.path.join(settings.MEDIA_ROOT, 'processed', output_filename)
-                
-                logger.info(f"MEDIA_ROOT: {settings.MEDIA_ROOT}")
-                logger.info(f"Output path: {output_path}")
-                logger.info(f"Directory to create: {os.path.dirname(output_path)}")
-                
-                # Ensure the processed directory exists
-                try:
-                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                    logger.info(f"Ensured directory exists: {os.path.dirname(output_path)}")
-                    
-                    # Verify the directory was created
-                    if os.path.exists(os.path.dirname(output_path)):
-                        logger.info(f"Directory verification successful: {os.path.dirname(output_path)}")
-                        
-                        # Test if we can write to the directory
-                        test_file = os.path.join(os.path.dirname(output_path), '.test_write')
-                        try:
-                            with open(test_file, 'w') as f:
-                                f.write('test')
-                            os.remove(test_file)
-                            logger.info(f"Directory write test successful: {os.path.dirname(output_path)}")
-                        except Exception as write_error:
-                            logger.error(f"Directory write test failed: {os.path.dirname(output_path)} - {write_error}")
-                            raise Exception(f"Directory is not writable: {os.path.dirname(output_path)}")
-                    else:
-                        logger.error(f"Directory verification failed: {os.path.dirname(output_path)}")
-                        raise Exception(f"Directory was not created: {os.path.dirname(output_path)}")
-                        
-                except Exception as e:
-                    logger.error(f"Failed to create directory {os.path.dirname(output_path)}: {e}")
-                    raise
-
-                template_path = None
-                if options_form.cleaned_data['output_type'] == 'template':
-                    template_file = options_form.cleaned_data['template_file']
-                    if template_file:
-                        template_path = template_file.path
-
-                logger.info(f"Processing file: input_path={input_path}, output_path={output_path}")
-                result = service.process_file(input_path, output_path, template_path)
-
-                if result['success']:
-                    processed_file.status = 'completed'
-                    processed_file.processed_file = os.path.join('processed', output_filename)
-                    processed_file.save()
-                    messages.success(request, f"File processed successfully! {result['output_rows']} records processed.")
-                else:
-                    processed_file.status = 'failed'
-                    processed_file.error_message = result.get('error', 'Unknown error')
-                    processed_file.save()
-                    messages.error(request, f"Processing failed: {result.get('error', 'Unknown error')}")
-
-            except Exception as e:
-                processed_file.status = 'failed'
-                processed_file.error_message = str(e)
-                processed_file.save()
-                messages.error(request, f"Processing failed: {str(e)}")
-
+            messages.success(request, "File uploaded and queued for processing.")
             return redirect('processor:home')
 
         # If invalid, return errors for AJAX or render for normal
@@ -286,7 +326,7 @@ class DownloadView(View):
 
 @method_decorator(login_required(login_url='/app/login/'), name='dispatch')
 class ProcessFileView(View):
-    """AJAX endpoint for processing files"""
+    """AJAX endpoint that queues a file for the background workers"""
     def post(self, request, file_id):
         try:
             files_queryset = get_department_filtered_queryset(request.user, ProcessedFile)
@@ -298,67 +338,11 @@ class ProcessFileView(View):
                     'message': 'File already processed'
                 })
             
-            processed_file.status = 'processing'
-            processed_file.save()
-            
-            service = ExcelProcessorService()
-            input_path = processed_file.original_file.path
-            output_filename = f"processed_{os.path.basename(input_path)}"
-            # Use MEDIA_ROOT for proper path construction
-            from django.conf import settings
-            output_path = os.path.join(settings.MEDIA_ROOT, 'processed', output_filename)
-            
-            logger.info(f"MEDIA_ROOT: {settings.MEDIA_ROOT}")
-            logger.info(f"Output path: {output_path}")
-            logger.info(f"Directory to create: {os.path.dirname(output_path)}")
-            
-            # Ensure the processed directory exists
-            try:
-                os.makedirs(os.path.dirname(output_path), exist_ok=True)
-                logger.info(f"Ensured directory exists: {os.path.dirname(output_path)}")
-                
-                # Verify the directory was created
-                if os.path.exists(os.path.dirname(output_path)):
-                    logger.info(f"Directory verification successful: {os.path.dirname(output_path)}")
-                    
-                    # Test if we can write to the directory
-                    test_file = os.path.join(os.path.dirname(output_path), '.test_write')
-                    try:
-                        with open(test_file, 'w') as f:
-                            f.write('test')
-                        os.remove(test_file)
-                        logger.info(f"Directory write test successful: {os.path.dirname(output_path)}")
-                    except Exception as write_error:
-                        logger.error(f"Directory write test failed: {os.path.dirname(output_path)} - {write_error}")
-                        raise Exception(f"Directory is not writable: {os.path.dirname(output_path)}")
-                else:
-                    logger.error(f"Directory verification failed: {os.path.dirname(output_path)}")
-                    raise Exception(f"Directory was not created: {os.path.dirname(output_path)}")
-                    
-            except Exception as e:
-                logger.error(f"Failed to create directory {os.path.dirname(output_path)}: {e}")
-                raise
-            
-            logger.info(f"Processing file: input_path={input_path}, output_path={output_path}")
-            result = service.process_file(input_path, output_path)
-            
-            if result['success']:
-                processed_file.status = 'completed'
-                # Store relative path for Django FileField
-                processed_file.processed_file = os.path.join('processed', output_filename)
-                processed_file.save()
-                return JsonResponse({
-                    'success': True,
-                    'message': f"File processed successfully! {result['output_rows']} records processed."
-                })
-            else:
-                processed_file.status = 'failed'
-                processed_file.error_message = result.get('error', 'Unknown error')
-                processed_file.save()
-                return JsonResponse({
-                    'success': False,
-                    'message': f"Processing failed: {result.get('error', 'Unknown error')}"
-                })
+            enqueue_processing(processed_file)
+            return JsonResponse({
+                'success': True,
+                'message': 'File queued for processing.'
+            })
                 
         except Exception as e:
             # Safely handle cases where processed_file may not be set
@@ -372,7 +356,7 @@ class ProcessFileView(View):
             
             return JsonResponse({
                 'success': False,
-                'message': f"Processing failed: {str(e)}"
+                'message': f"Could not queue file for processing: {str(e)}"
             })
 
 
@@ -385,17 +369,23 @@ def delete_file(request, file_id):
 
     # Allow GET to act as a redirect-safe confirmationless delete fallback
     if request.method in ["POST", "DELETE", "GET"]:
-        # Delete associated files
-        if processed_file.original_file and os.path.exists(processed_file.original_file.path):
-            try:
-                os.remove(processed_file.original_file.path)
-            except Exception:
-                pass
-        if processed_file.processed_file and os.path.exists(processed_file.processed_file.path):
+        # Delete associated files (unless a deduplicated re-upload still points at them)
+        for field_name in ('original_file', 'processed_file', 'attendance_artifact'):
+            stored = getattr(processed_file, field_name)
+            if not stored or processed_file.is_shared_file(field_name):
+                continue
             try:
-                os.remove(processed_file.processed_file.path)
+                if os.path.exists(stored.path):
+                    os.remove(stored.path)
             except Exception:
                 pass
+        # Templates uploaded for its processing runs are not used by anything else
+        for template_path in processed_file.jobs.exclude(template_path=None).values_list('template_path', flat=True):
+            discard_template(template_path)
+        # Cached reports go with the last file of an upload
+        if not processed_file.content_hash or not ProcessedFile.objects.filter(
+                content_hash=processed_file.content_hash).exclude(pk=processed_file.pk).exists():
+            report_cache().evict(report_cache_key(processed_file))
         processed_file.delete()
         messages.success(request, "File deleted successfully.")
         # For AJAX requests, return to list via redirect; non-AJAX GET will also redirect
@@ -411,18 +401,8 @@ def preview_data(request, file_id):
     processed_file = get_object_or_404(files_queryset, id=file_id)
     
     try:
-        service = ExcelProcessorService()
-        input_path = processed_file.original_file.path
-        
-        # Extract data without writing to file (try matrix parser first)
-        try:
-            data = service.processor.process_matrix_attendance(input_path)
-        except Exception:
-            if 'Report (1).xls' in input_path or service._is_attendance_file(input_path):
-                data = service.processor.process_attendance_file(input_path)
-            else:
-                data = service.reader.read_excel(input_path)
-                data = service.processor.process_data(data)
+        # Normalized data from the columnar artifact (parses the upload only for older files)
+        data = load_attendance_frame(processed_file)
         
         # Convert to list for template
         if hasattr(data, 'to_dict'):
@@ -584,6 +564,7 @@ class StaffCreateView(View):
                         INSERT INTO staff_details (staffid, name, section_id, designation, department_id, weekly_off, level, type_of_employment, priority)
                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                     """, [staffid, name, section_id, designation, department_id, weekly_off, level, type_of_employment, priority])
+                StaffVersion.bump([department_id])
                 
                 messages.success(request, 'Staff member added successfully!')
                 return redirect('processor:staff_list')
@@ -674,7 +655,9 @@ class StaffUpdateView(View):
                             weekly_off = %s, level = %s, type_of_employment = %s, priority = %s, 
                             updated_at = CURRENT_TIMESTAMP
                         WHERE id = %s{department_filter}
+                        RETURNING department_id
                     """, params)
+                    StaffVersion.bump([row[0] for row in cursor.fetchall()])
                 
                 messages.success(request, 'Staff member updated successfully!')
                 return redirect('processor:staff_list')
@@ -722,7 +705,8 @@ def delete_staff(request, staff_id):
             staff_name = row[0]
             
             # Delete the staff member
-            cursor.execute("DELETE FROM staff_details WHERE id = %s", [staff_id])
+            cursor.execute("DELETE FROM staff_details WHERE id = %s RETURNING department_id", [staff_id])
+            StaffVersion.bump([row[0] for row in cursor.fetchall()])
             
             messages.success(request, f'Staff member "{staff_name}" deleted successfully!')
     except Exception as e:
@@ -737,16 +721,7 @@ def get_detailed_leave_details(request, file_id):
     try:
         files_queryset = get_department_filtered_queryset(request.user, ProcessedFile)
         processed_file = get_object_or_404(files_queryset, id=file_id)
-        import pandas as pd
-        if processed_file.processed_file:
-            try:
-                df = pd.read_excel(processed_file.processed_file.path)
-            except FileNotFoundError:
-                service = ExcelProcessorService()
-                df = service.processor.process_attendance_file(processed_file.original_file.path)
-        else:
-            service = ExcelProcessorService()
-            df = service.processor.process_attendance_file(processed_file.original_file.path)
+        df = load_attendance_frame(processed_file)
 
         # Check if required columns exist
         required_columns = ['Employee_ID', 'Employee_Name', 'Designation', 'Status', 'Date']
@@ -763,6 +738,7 @@ def get_detailed_leave_details(request, file_id):
 
         # Build leave details list
         leave_list = []
+        matrix = AttendanceMatrix.from_frame(df)
         
         # Get department-filtered employee IDs
         if not request.user.is_superuser and request.user.department:
@@ -770,66 +746,21 @@ def get_detailed_leave_details(request, file_id):
             from django.db import connection
             with connection.cursor() as cursor:
                 cursor.execute("SELECT staffid FROM staff_details WHERE department_id = %s", [request.user.department.id])
-                department_staff_ids = [row[0] for row in cursor.fetchall()]
+                department_staff_ids = set(row[0] for row in cursor.fetchall())
             
             # Filter employee IDs to only include those from the user's department
-            available_employee_ids = [emp_id for emp_id in df['Employee_ID'].dropna().unique() if str(emp_id) in department_staff_ids]
+            available_employee_ids = [emp_id for emp_id in matrix.employee_ids if str(emp_id) in department_staff_ids]
         else:
-            available_employee_ids = df['Employee_ID'].dropna().unique()
+            available_employee_ids = matrix.employee_ids
         
+        summary = AttendanceSummary(matrix)
         for employee_id in available_employee_ids:
-            employee_data = df[df['Employee_ID'] == employee_id]
-            if employee_data.empty:
-                continue
-            try:
-                employee_name = employee_data['Employee_Name'].iloc[0] if len(employee_data) > 0 else "Unknown"
-                designation = employee_data['Designation'].iloc[0] if len(employee_data) > 0 else "Unknown"
-            except (IndexError, KeyError):
-                employee_name = "Unknown"
-                designation = "Unknown"
-            present_days = absent_days = weekly_off_days = allowance_days = sick_leave_days = casual_leave_days = personal_leave_days = substitute_leave_days = duty_leave_days = other_leave_days = 0
-            for _, row in employee_data.iterrows():
-                status = str(row.get('Status', '')).strip().upper()
-                if 'P' in status or 'A *' in status:
-                    present_days += 1
-                    allowance_days += 1
-                elif status == 'A':
-                    absent_days += 1
-                elif 'WO' in status or 'HO' in status:
-                    present_days += 1
-                    weekly_off_days += 1
-                elif 'SL' in status:
-                    sick_leave_days += 1
-                elif 'CL' in status:
-                    casual_leave_days += 1
-                elif 'PL' in status:
-                    personal_leave_days += 1
-                elif 'SUBSTITUTE' in status or 'SUBL' in status:
-                    substitute_leave_days += 1
-                elif 'DUTY' in status:
-                    duty_leave_days += 1
-                    # Also count as other leave for the other_leave_days count
-                    other_leave_days += 1
-                elif 'L' in status:
-                    # Count as other leave for the other_leave_days count
-                    other_leave_days += 1
-                else:
-                    # Count as other leave if status doesn't match any specific leave type (PL, SL, CL, SUBSTITUTE)
-                    other_leave_days += 1
+            emp_index = matrix.row_of(employee_id)
             leave_list.append({
                 'employee_id': employee_id,
-                'employee_name': employee_name,
-                'designation': designation,
-                'present_days': present_days,
-                'absent_days': absent_days,
-                'weekly_off_days': weekly_off_days,
-                'allowance_days': allowance_days,
-                'sick_leave_days': sick_leave_days,
-                'casual_leave_days': casual_leave_days,
-                'personal_leave_days': personal_leave_days,
-                'substitute_leave_days': substitute_leave_days,
-                'duty_leave_days': duty_leave_days,
-                'other_leave_days': other_leave_days,
+                'employee_name': matrix.names[emp_index],
+                'designation': matrix.designations[emp_index],
+                **summary.totals(emp_index),
             })
 
         # Search filter
@@ -871,336 +802,35 @@ def get_detailed_leave_details(request, file_id):
 def generate_segregation_report(request, file_id):
     """Generate staff segregation report by sections"""
     from django.db import connection
-    import zipfile
-    import io
     from datetime import datetime
-    from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment
-    import pandas as pd
     
     try:
         processed_file = get_object_or_404(ProcessedFile, id=file_id)
         
-        # Extract data from the uploaded file
-        service = ExcelProcessorService()
-        input_path = processed_file.original_file.path
-        
-        # Get attendance data (matrix parser first)
-        try:
-            attendance_data = service.processor.process_matrix_attendance(input_path)
-        except Exception:
-            if 'Report (1).xls' in input_path or service._is_attendance_file(input_path):
-                attendance_data = service.processor.process_attendance_file(input_path)
-            else:
-                attendance_data = service.reader.read_excel(input_path)
-                attendance_data = service.processor.process_data(attendance_data)
+        # Get attendance data from the columnar artifact
+        attendance_data = load_attendance_frame(processed_file)
         
         if attendance_data.empty:
             messages.error(request, "No attendance data found in the file.")
             return redirect('processor:file_detail', file_id=file_id)
         
-        # Get unique employee IDs and filter out NaN values
-        unique_employee_ids = attendance_data['Employee_ID'].dropna().unique()
+        # Employee × day index over the attendance data (employee IDs exclude NaN)
+        matrix = AttendanceMatrix.from_frame(attendance_data)
         
-        # Fetch section, employment type, and priority information from database
-        employee_details = {}
+        # Fetch section, employment type, and priority information for all employees at once
         with connection.cursor() as cursor:
-            for emp_id in unique_employee_ids:
-                # Skip if emp_id is NaN or empty
-                if pd.isna(emp_id) or str(emp_id).strip() == '':
-                    continue
-                    
-                cursor.execute("SELECT section, type_of_employment, priority FROM staff_details WHERE staffid = %s AND type_of_employment IN ('permanent', 'contract')", [str(emp_id)])
-                row = cursor.fetchone()
-                if row:
-                    employee_details[emp_id] = {
-                        'section': row[0] if row[0] else "Unknown Section",
-                        'type_of_employment': row[1] if row[1] else 'monthly wages',
-                        'priority': row[2] if row[2] else 999
-                    }
-                else:
-                    employee_details[emp_id] = {
-                        'section': "Unknown Section",
-                        'type_of_employment': 'monthly wages',
-                        'priority': 999
-                    }
+            cursor.execute(SegregationReport.SQL, [[str(emp_id) for emp_id in matrix.employee_ids]])
+            columns = [col[0] for col in cursor.description]
+            staff_rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
         
-        # Group data by sections
-        section_data = {}
-        for emp_id in unique_employee_ids:
-            # Skip if emp_id is NaN or empty
-            if pd.isna(emp_id) or str(emp_id).strip() == '':
-                continue
-                
-            section = employee_details.get(emp_id, {}).get('section', "Unknown Section")
-            if section not in section_data:
-                section_data[section] = []
-            
-            # Get all records for this employee
-            emp_records = attendance_data[attendance_data['Employee_ID'] == emp_id]
-            section_data[section].extend(emp_records.to_dict('records'))
-        
-        # Create ZIP file with separate workbooks for each section
-        zip_buffer = io.BytesIO()
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            for section, records in section_data.items():
-                if not records:
-                    continue
-                
-                # Create workbook for this section
-                wb = Workbook()
-                ws = wb.active
-                ws.title = f"{section}_Attendance"
-                
-                # Get period information from the original file
-                period_info = "Unknown"
-                try:
-                    # Try to extract period from the original file
-                    service = ExcelProcessorService()
-                    input_path = processed_file.original_file.path
-                    if input_path.lower().endswith('.xls'):
-                        df = pd.read_excel(input_path, engine='xlrd', header=None)
-                    else:
-                        df = pd.read_excel(input_path, engine='openpyxl', header=None)
-                    
-                    if len(df) > 8:
-                        period_cell = df.iloc[8, 0]
-                        if pd.notna(period_cell):
-                            import re
-                            raw_text = str(period_cell)
-                            period_info = re.sub(r"(?i)^\s*period\s*:?,?\s*", "", raw_text).strip() or "Unknown"
-                except:
-                    pass
-                
-                # Write main title (single 'period' wording)
-                title_cell = ws.cell(row=1, column=1, value=f"Attendance Record of {section} for the period {period_info}")
-                title_cell.font = Font(bold=True, size=14, color="FFFFFF")
-                title_cell.fill = PatternFill(start_color="1F4E79", end_color="1F4E79", fill_type="solid")
-                ws.merge_cells('A1:Z1')  # Merge cells for title
-                
-                # Get unique dates for column headers
-                unique_dates = []
-                for record in records:
-                    date = record.get('Date', '')
-                    if date and date not in unique_dates:
-                        unique_dates.append(date)
-                unique_dates.sort()
-                
-                # Write employee info headers (row 3)
-                ws.cell(row=3, column=1, value="Emp ID").font = Font(bold=True)
-                ws.cell(row=3, column=2, value="Emp Name").font = Font(bold=True)
-                ws.cell(row=3, column=3, value="Designation").font = Font(bold=True)
-                
-                # Write Time header (row 3)
-                ws.cell(row=3, column=4, value="Time").font = Font(bold=True)
-                
-                # Write day headers starting from column 5
-                current_col = 5
-                import re
-                for date in unique_dates:
-                    day_name = ""
-                    day_number = ""
-                    # Prefer Day_Name from a record matching this date
-                    for record in records:
-                        if record.get('Date') == date:
-                            day_name = record.get('Day_Name', '')
-                            break
-                    # Parse "DD Weekday" from the date string (set once, no duplication)
-                    if isinstance(date, str):
-                        m = re.match(r"^\s*(\d{1,2})\s+([A-Za-z]+)\s*$", date)
-                        if m:
-                            day_number = m.group(1)
-                            # if day_name not set from record, take from header
-                            if not day_name:
-                                day_name = m.group(2)
-                        else:
-                            # Fallback: use the whole string as number, no duplicate name
-                            day_number = date
-                    header_text = f"{day_number} {day_name}".strip()
-                    ws.cell(row=3, column=current_col, value=header_text).font = Font(bold=True)
-                    current_col += 1
-                
-
-                
-                # Group records by employee
-                employee_data = {}
-                for record in records:
-                    emp_id = record.get('Employee_ID', '')
-                    if pd.isna(emp_id) or str(emp_id).strip() == '':
-                        continue
-                    
-                    if emp_id not in employee_data:
-                        emp_details = employee_details.get(emp_id, {})
-                        employee_data[emp_id] = {
-                            'name': record.get('Employee_Name', ''),
-                            'designation': record.get('Designation', ''),
-                            'type_of_employment': emp_details.get('type_of_employment', 'monthly wages'),
-                            'priority': emp_details.get('priority', 999),
-                            'daily_data': {}
-                        }
-                    
-                    date = record.get('Date', '')
-                    if date:
-                        employee_data[emp_id]['daily_data'][date] = {
-                            'in_time': record.get('InTime', ''),
-                            'out_time': record.get('OutTime', ''),
-                            'status': record.get('Status', ''),
-                            'worked_hours': record.get('WorkedHours', '')
-                        }
-                
-                # Sort employees according to priority first, then employment type
-                sorted_employees = sorted(employee_data.items(), key=lambda x: (
-                    # First by priority (ascending)
-                    x[1].get('priority', 999),
-                    # Then by employment type (permanent first, then contract)
-                    0 if x[1].get('type_of_employment') == 'permanent' else 
-                    1 if x[1].get('type_of_employment') == 'contract' else 2,
-                    # Then by staffid numeric part (ascending) - handle text staffids
-                    int(''.join(filter(str.isdigit, str(x[0])))) if ''.join(filter(str.isdigit, str(x[0]))) and ''.join(filter(str.isdigit, str(x[0]))).isdigit() else 999999
-                ))
-                
-                # Write employee data - each employee takes 4 rows
-                current_row = 5
-                for emp_id, emp_info in sorted_employees:
-                    # Row 1: In Time
-                    ws.cell(row=current_row, column=1, value=emp_id)
-                    ws.cell(row=current_row, column=2, value=emp_info['name'])
-                    ws.cell(row=current_row, column=3, value=emp_info['designation'])
-                    ws.cell(row=current_row, column=4, value="In Time").font = Font(bold=True)
-                    
-                    # Fill In Time data for each day
-                    current_col = 5
-                    for date in unique_dates:
-                        if date in emp_info['daily_data']:
-                            ws.cell(row=current_row, column=current_col, value=emp_info['daily_data'][date]['in_time'])
-                        current_col += 1
-                    current_row += 1
-                    
-                    # Row 2: Out Time
-                    ws.cell(row=current_row, column=4, value="Out Time").font = Font(bold=True)
-                    
-                    # Fill Out Time data for each day
-                    current_col = 5
-                    for date in unique_dates:
-                        if date in emp_info['daily_data']:
-                            ws.cell(row=current_row, column=current_col, value=emp_info['daily_data'][date]['out_time'])
-                        current_col += 1
-                    current_row += 1
-                    
-                    # Row 3: Status
-                    ws.cell(row=current_row, column=4, value="Status").font = Font(bold=True)
-                    
-                    # Fill Status data for each day
-                    current_col = 5
-                    for date in unique_dates:
-                        if date in emp_info['daily_data']:
-                            ws.cell(row=current_row, column=current_col, value=emp_info['daily_data'][date]['status'])
-                        current_col += 1
-                    current_row += 1
-                    
-                    # Row 4: Worked Hours
-                    ws.cell(row=current_row, column=4, value="Worked Hours").font = Font(bold=True)
-                    
-                    # Fill Worked Hours data for each day
-                    current_col = 5
-                    for date in unique_dates:
-                        if date in emp_info['daily_data']:
-                            ws.cell(row=current_row, column=current_col, value=emp_info['daily_data'][date]['worked_hours'])
-                        current_col += 1
-                    current_row += 1
-                
-                # Apply formatting and merging
-                from openpyxl.styles import Border, Side
-                
-                # Define border style
-                thin_border = Border(
-                    left=Side(style='thin'),
-                    right=Side(style='thin'),
-                    top=Side(style='thin'),
-                    bottom=Side(style='thin')
-                )
-                
-                # Header row formatting (row 3)
-                for col in range(1, current_col):
-                    cell = ws.cell(row=3, column=col)
-                    cell.font = Font(bold=True, color="FFFFFF")
-                    cell.fill = PatternFill(start_color="1F4E79", end_color="1F4E79", fill_type="solid")
-                    cell.alignment = Alignment(horizontal="center", wrap_text=False)
-                    cell.border = thin_border
-                
-                # Set fixed height for header row
-                ws.row_dimensions[3].height = 20
-                
-                # Merge employee info cells and apply borders
-                current_row = 5
-                for emp_id, emp_info in sorted_employees:
-                    # Merge employee info cells (columns A-C) for 4 rows
-                    ws.merge_cells(f'A{current_row}:A{current_row + 3}')  # Emp ID
-                    ws.merge_cells(f'B{current_row}:B{current_row + 3}')  # Emp Name
-                    ws.merge_cells(f'C{current_row}:C{current_row + 3}')  # Designation
-                    
-                    # Apply borders and formatting to merged cells
-                    for col in range(1, 4):
-                        cell = ws.cell(row=current_row, column=col)
-                        cell.border = thin_border
-                        cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=False)
-                    
-                    # Set fixed row height to prevent word wrap
-                    fixed_row_height = 20  # Single line height
-                    
-                    # Set row heights for all 4 rows of this employee
-                    ws.row_dimensions[current_row].height = fixed_row_height
-                    ws.row_dimensions[current_row + 1].height = fixed_row_height
-                    ws.row_dimensions[current_row + 2].height = fixed_row_height
-                    ws.row_dimensions[current_row + 3].height = fixed_row_height
-                    
-                    # Apply borders to all data cells for this employee
-                    for row in range(current_row, current_row + 4):
-                        for col in range(1, current_col):
-                            cell = ws.cell(row=row, column=col)
-                            cell.border = thin_border
-                            cell.alignment = Alignment(horizontal="center", vertical="center", wrap_text=False)
-                    
-                    # Apply alternating colors
-                    for row in range(current_row, current_row + 4):
-                        for col in range(1, current_col):
-                            cell = ws.cell(row=row, column=col)
-                            employee_group = (current_row - 5) // 4
-                            if employee_group % 2 == 0:
-                                cell.fill = PatternFill(start_color="F0F8FF", end_color="F0F8FF", fill_type="solid")
-                            else:
-                                cell.fill = PatternFill(start_color="FFE6E6", end_color="FFE6E6", fill_type="solid")
-                    
-                    current_row += 4
-                
-                # Set column widths directly
-                ws.column_dimensions['A'].width = 12  # Emp ID
-                ws.column_dimensions['B'].width = 30  # Emp Name
-                ws.column_dimensions['C'].width = 25  # Designation
-                ws.column_dimensions['D'].width = 15   # Time
-                
-                # Set day column widths
-                for col in range(5, current_col):
-                    try:
-                        column_letter = ws.cell(row=1, column=col).column_letter
-                        ws.column_dimensions[column_letter].width = 12
-                    except:
-                        continue
-                
-                # Save workbook to ZIP
-                excel_buffer = io.BytesIO()
-                wb.save(excel_buffer)
-                excel_buffer.seek(0)
-                
-                # Clean section name for filename
-                clean_section_name = "".join(c for c in section if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                filename = f"{clean_section_name}_Attendance_Report.xlsx"
-                
-                zip_file.writestr(filename, excel_buffer.getvalue())
+        report = SegregationReport(matrix, staff_rows, file_period(processed_file))
         
-        # Prepare response
-        zip_buffer.seek(0)
-        response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
+        # Stream a ZIP with separate workbooks for each section, one section at a time.
+        # The section lookup and the first workbook run before the response starts, so their errors still redirect.
+        workbooks = prefetch_first(report.workbooks(
+            pool=render_pool(settings.REPORT_RENDER_PROCESSES), in_flight=settings.REPORT_RENDER_PROCESSES))
+        response = StreamingHttpResponse(
+            stream_zip(workbooks, f"Segregation report for file {processed_file.id}"), content_type='application/zip')
         response['Content-Disposition'] = f'attachment; filename="staff_segregation_report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip"'
         
         return response
@@ -1210,633 +840,154 @@ def generate_segregation_report(request, file_id):
         return redirect('processor:file_detail', file_id=file_id)
 
 
-@login_required(login_url='/app/login/')
-def generate_detailed_attendance_report(request, file_id):
-    """Generate detailed attendance report using template"""
+def render_template_report(request, file_id, report_name):
+    """Fill the named report template for a processed file and return it as a download"""
+    report = get_report(report_name)
+    title = report.spec.title
     try:
         files_queryset = get_department_filtered_queryset(request.user, ProcessedFile)
         processed_file = get_object_or_404(files_queryset, id=file_id)
         
-        # Get the processed file path
-        if processed_file.processed_file:
-            file_path = os.path.join(settings.MEDIA_ROOT, str(processed_file.processed_file))
-        else:
-            file_path = os.path.join(settings.MEDIA_ROOT, str(processed_file.original_file))
-        
-        if not os.path.exists(file_path):
+        if not processed_file.attendance_artifact and not os.path.exists(processed_file.original_file.path):
             return JsonResponse({'error': 'File not found'}, status=404)
         
-        # Load the processed data using matrix parser
-        try:
-            svc = ExcelProcessorService()
-            df = svc.processor.process_matrix_attendance(file_path)
-        except Exception:
-            df = pd.read_excel(file_path)
-        
-        # Get unique employee IDs
-        unique_employee_ids = df['Employee_ID'].dropna().unique()
-        
-        # Database connection
-        conn = psycopg2.connect(
-            host=config('DATABASE_HOST', default='localhost'),
-            database=config('DATABASE_NAME', default='admin_db'),
-            user=config('DATABASE_USER', default='postgres'),
-            password=config('DATABASE_PASSWORD', default='Testing@123'),
-            port=config('DATABASE_PORT', default='5432')
-        )
-        
-        # Get staff details ordered by priority first, then employment type
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Build department filter
-        department_filter = ""
-        params = [list(unique_employee_ids)]
-        if not request.user.is_superuser and request.user.department:
-            department_filter = " AND department_id = %s"
-            params.append(request.user.department.id)
-        
-        cursor.execute(f"""
-            SELECT staffid, name, designation, level, section, weekly_off, type_of_employment, priority
-            FROM staff_details 
-            WHERE staffid = ANY(%s) 
-            AND type_of_employment IN ('permanent', 'contract')
-            {department_filter}
-            ORDER BY 
-                priority ASC,
-                CASE 
-                    WHEN type_of_employment = 'permanent' THEN 1
-                    WHEN type_of_employment = 'contract' THEN 2
-                    ELSE 3
-                END,
-                CASE 
-                    WHEN REGEXP_REPLACE(staffid, '[^0-9]', '', 'g') ~ '^[0-9]+$' 
-                    THEN CAST(REGEXP_REPLACE(staffid, '[^0-9]', '', 'g') AS INTEGER)
-                    ELSE 999999
-                END ASC
-        """, params)
-        
-        staff_details = {row['staffid']: row for row in cursor.fetchall()}
-        cursor.close()
-        conn.close()
-        
-        # Load the template
-        template_path = os.path.join(settings.BASE_DIR, 'static', 'detailed_attendance_template.xlsx')
-        
-        if not os.path.exists(template_path):
+        engine = TemplateReportEngine(os.path.join(settings.BASE_DIR, 'static'))
+        if not os.path.exists(engine.template_path(report)):
             return JsonResponse({'error': 'Template file not found'}, status=404)
         
-        # Load template and create a copy
-        wb = openpyxl.load_workbook(template_path)
-        ws = wb['Template Sheet']  # Use the specific sheet name
-        
-        # Copy row heights from template
-        for row_num in range(1, ws.max_row + 1):
-            if ws.row_dimensions[row_num].height is not None:
-                # Preserve the original row height
-                original_height = ws.row_dimensions[row_num].height
-                ws.row_dimensions[row_num].height = original_height
-        
-        # Extract and normalize period from the original file
-        period = "Unknown"
-        try:
-            original_file_path = os.path.join(settings.MEDIA_ROOT, str(processed_file.original_file))
-            if os.path.exists(original_file_path):
-                original_df = pd.read_excel(original_file_path, header=None)
-                if len(original_df) >= 9:
-                    period_cell = original_df.iloc[8, 0]
-                    if pd.notna(period_cell):
-                        import re
-                        raw_text = str(period_cell).strip()
-                        # Remove leading 'Period:' (any case) and surrounding spaces
-                        period = re.sub(r"(?i)^\s*period\s*:?,?\s*", "", raw_text) or "Unknown"
-        except Exception as e:
-            logger.error(f"Error extracting period: {e}")
-        
-        # Helper function to safely set cell value
-        def safe_set_cell(worksheet, cell_address, value):
-            """Safely set cell value, handling merged cells"""
-            try:
-                cell = worksheet[cell_address]
-                # Check if cell is part of a merged range
-                for merged_range in worksheet.merged_cells.ranges:
-                    if cell_address in merged_range:
-                        # Set value to the top-left cell of the merged range
-                        top_left_cell = merged_range.top_left
-                        worksheet[top_left_cell] = value
-                        return
-                # If not merged, set normally
-                worksheet[cell_address] = value
-            except Exception as e:
-                logger.warning(f"Could not set cell {cell_address}: {e}")
-        
-        # Fill period in E1 (single 'Period:' prefix)
-        safe_set_cell(ws, 'E1', f"Period: {period}")
+        department_id = None
+        if not request.user.is_superuser and request.user.department:
+            department_id = request.user.department.id
         
-        # Calculate total number of days in the selected period
-        total_days = 0
-        try:
-            # Extract start and end dates from period string
-            if ' - ' in period:
-                period_parts = period.split(' - ')
-                if len(period_parts) == 2:
-                    start_date_str = period_parts[0].strip()
-                    end_date_str = period_parts[1].strip()
-                    
-                    # Parse the dates (assuming format like 2082/03/01)
-                    try:
-                        # Split by '/' and extract year, month, day
-                        start_parts = start_date_str.split('/')
-                        end_parts = end_date_str.split('/')
-                        
-                        if len(start_parts) == 3 and len(end_parts) == 3:
-                            start_day = int(start_parts[2])
-                            end_day = int(end_parts[2])
-                            
-                            # Calculate total days (inclusive)
-                            total_days = end_day - start_day + 1
-                        else:
-                            # Fallback: count unique dates from data
-                            unique_dates = df['Date'].dropna().unique()
-                            total_days = len(unique_dates)
-                    except (ValueError, IndexError):
-                        # Fallback: count unique dates from data
-                        unique_dates = df['Date'].dropna().unique()
-                        total_days = len(unique_dates)
-                else:
-                    # Fallback: count unique dates from data
-                    unique_dates = df['Date'].dropna().unique()
-                    total_days = len(unique_dates)
-            else:
-                # Fallback: count unique dates from data
-                unique_dates = df['Date'].dropna().unique()
-                total_days = len(unique_dates)
-        except Exception as e:
-            logger.error(f"Error calculating total days: {e}")
-            total_days = 0
-        
-        # Fill total days in F2
-        safe_set_cell(ws, 'F2', total_days)
-        
-        # Process each employee in sorted order
-        row = 4  # Start from row 4
-        sorted_staff = list(staff_details.values())
-        for staff in sorted_staff:
-            emp_id = staff['staffid']
-            emp_data = df[df['Employee_ID'] == emp_id]
-            
-            # Calculate attendance statistics
-            present_days = 0
-            absent_days = 0
-            weekly_off_days = 0
-            allowance_days = 0
-            personal_leave_days = 0
-            sick_leave_days = 0
-            casual_leave_days = 0
-            substitute_leave_days = 0
-            duty_leave_days = 0
-            other_leave_days = 0
-            
-            present_dates = []
-            absent_dates = []
-            weekly_off_dates = []
-            allowance_dates = []
-            personal_leave_dates = []
-            sick_leave_dates = []
-            casual_leave_dates = []
-            substitute_leave_dates = []
-            duty_leave_dates = []
-            other_leave_dates = []
-            
-            # Process each day for this employee
-            for _, emp_row in emp_data.iterrows():
-                try:
-                    status = str(emp_row.get('Status', '')).strip().upper()
-                    date = emp_row.get('Date', '')
-                    in_time = emp_row.get('InTime', '')
-                    out_time = emp_row.get('OutTime', '')
-                except (KeyError, AttributeError):
-                    continue
-                
-                # Determine attendance status
-                if 'P' in status or 'A *' in status:
-                    present_days += 1
-                    present_dates.append(date)
-                    allowance_days += 1
-                    allowance_dates.append(date)
-                elif status == 'A':
-                    absent_days += 1
-                    absent_dates.append(date)
-                elif 'WO' in status or 'HO' in status:
-                    present_days += 1
-                    present_dates.append(date)
-                    weekly_off_days += 1
-                    weekly_off_dates.append(date)
-                    
-                    # Check if there's actual work time recorded for allowance
-                    has_work_time = (in_time and str(in_time).strip() != '' and str(in_time).strip() != 'nan') or \
-                                  (out_time and str(out_time).strip() != '' and str(out_time).strip() != 'nan')
-                    if has_work_time:
-                        allowance_days += 1
-                        allowance_dates.append(date)
-                elif 'PL' in status:
-                    personal_leave_days += 1
-                    personal_leave_dates.append(date)
-                elif 'SL' in status:
-                    sick_leave_days += 1
-                    sick_leave_dates.append(date)
-                elif 'CL' in status:
-                    casual_leave_days += 1
-                    casual_leave_dates.append(date)
-                elif 'SUBSTITUTE' in status or 'SUBL' in status:
-                    substitute_leave_days += 1
-                    substitute_leave_dates.append(date)
-                elif 'DUTY' in status:
-                    duty_leave_days += 1
-                    duty_leave_dates.append(date)
-                    # Also count as other leave for the M column (but don't add to other_leave_dates to avoid duplication in remarks)
-                    other_leave_days += 1
-                elif 'L' in status:
-                    # Count as other leave for the M column
-                    other_leave_days += 1
-                    other_leave_dates.append(date)
-                else:
-                    # Count as other leave if status doesn't match any specific leave type (PL, SL, CL, SUBSTITUTE)
-                    other_leave_days += 1
-                    other_leave_dates.append(date)
+        def render_report():
+            # Load the normalized data from the columnar artifact
+            df = load_attendance_frame(processed_file)
+            unique_employee_ids = df['Employee_ID'].dropna().unique()
             
-            # Fill data in the template
-            safe_set_cell(ws, f'B{row}', staff['name'].title())  # Proper case name
-            safe_set_cell(ws, f'C{row}', staff['staffid'])
-            safe_set_cell(ws, f'D{row}', staff['designation'])
-            safe_set_cell(ws, f'E{row}', staff['level'])
-            safe_set_cell(ws, f'F{row}', present_days)
-            safe_set_cell(ws, f'G{row}', personal_leave_days)  # PL count
-            safe_set_cell(ws, f'H{row}', sick_leave_days)      # SL count
-            safe_set_cell(ws, f'I{row}', casual_leave_days)    # CL count
-            safe_set_cell(ws, f'J{row}', substitute_leave_days) # Substitute count
-            safe_set_cell(ws, f'L{row}', absent_days)          # Absent count
-            safe_set_cell(ws, f'M{row}', other_leave_days)     # Other leave count
-            safe_set_cell(ws, f'N{row}', allowance_days)       # Allowance count
+            # Database connection
+            conn = psycopg2.connect(
+                host=config('DATABASE_HOST', default='localhost'),
+                database=config('DATABASE_NAME', default='admin_db'),
+                user=config('DATABASE_USER', default='postgres'),
+                password=config('DATABASE_PASSWORD', default='Testing@123'),
+                port=config('DATABASE_PORT', default='5432')
+            )
+            cursor = conn.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(*report.staff_query(unique_employee_ids, department_id))
+            staff_details = {row['staffid']: row for row in cursor.fetchall()}
+            cursor.close()
+            conn.close()
             
-            # Fill weekly off day name instead of count
-            weekly_off_day = staff.get('weekly_off', '').title() if staff.get('weekly_off') else ''
-            safe_set_cell(ws, f'R{row}', weekly_off_day)
+            period = file_period(processed_file)
+            period_bounds = (processed_file.period_start, processed_file.period_end)
             
-            # Create leave details string (show only day numbers)
-            import re
-            def day_only(val):
-                s = str(val)
-                m = re.match(r"\s*(\d{1,2})\b", s)
-                return m.group(1) if m else s
-            def join_days(values):
-                return ", ".join(day_only(v) for v in values)
-            leave_details = []
-            if personal_leave_dates:
-                leave_details.append(f"PL on {join_days(personal_leave_dates)}")
-            if casual_leave_dates:
-                leave_details.append(f"CL on {join_days(casual_leave_dates)}")
-            if sick_leave_dates:
-                leave_details.append(f"SL on {join_days(sick_leave_dates)}")
-            if substitute_leave_dates:
-                leave_details.append(f"SUBSTITUTE on {join_days(substitute_leave_dates)}")
-            if duty_leave_dates:
-                leave_details.append(f"DUTY on {join_days(duty_leave_dates)}")
-            if other_leave_dates:
-                leave_details.append(f"Other on {join_days(other_leave_dates)}")
-            if absent_dates:
-                leave_details.append(f"Absent on {join_days(absent_dates)}")
-            
-            safe_set_cell(ws, f'S{row}', ', '.join(leave_details))
-            
-            row += 1
-        
-        # Save the filled template
-        output_filename = f"detailed_attendance_{processed_file.id}.xlsx"
-        output_path = os.path.join(settings.MEDIA_ROOT, 'processed', output_filename)
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        wb.save(output_path)
+            return engine.render(report, staff_details.values(), df, period, period_bounds=period_bounds)
+        
+        # Same upload, report, department, template/spec revision and staff data: hand back the stored file
+        cached_report = report_cache().open_or_render(
+            report_cache_key(processed_file),
+            report_name,
+            department_id,
+            engine.revision(report),
+            StaffVersion.current(department_id),
+            render_report,
+        )
         
-        # Return the file for download
-        with open(output_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="{output_filename}"'
-            return response
+        # Return the file for download; the open handle stays valid if the entry is replaced
+        output_filename = report.spec.output_name.format(file_id=processed_file.id)
+        return FileResponse(
+            cached_report,
+            as_attachment=True,
+            filename=output_filename,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
             
     except Exception as e:
-        logger.error(f"Error generating detailed attendance report: {str(e)}")
-        return JsonResponse({'error': f'Error generating detailed attendance report: {str(e)}'}, status=500)
+        logger.error(f"Error generating {title}: {str(e)}")
+        return JsonResponse({'error': f'Error generating {title}: {str(e)}'}, status=500)
+
+
+@login_required(login_url='/app/login/')
+def generate_detailed_attendance_report(request, file_id):
+    """Generate detailed attendance report using template"""
+    return render_template_report(request, file_id, 'detailed_attendance')
 
 
 @login_required(login_url='/app/login/')
 def generate_monthly_wages_report(request, file_id):
     """Generate monthly wages report using template"""
+    return render_template_report(request, file_id, 'monthly_wages')
+
+
+@login_required(login_url='/app/login/')
+def generate_report_bundle(request, file_id):
+    """
+    Detailed attendance, monthly wages and segregation reports in one archive.
+    The upload is loaded, aggregated and matched against staff_details once for all three;
+    template reports already in the ReportCache are not rendered again.
+    """
+    from django.db import connection
+    
     try:
         files_queryset = get_department_filtered_queryset(request.user, ProcessedFile)
         processed_file = get_object_or_404(files_queryset, id=file_id)
         
-        # Get the processed file path
-        if processed_file.processed_file:
-            file_path = os.path.join(settings.MEDIA_ROOT, str(processed_file.processed_file))
-        else:
-            file_path = os.path.join(settings.MEDIA_ROOT, str(processed_file.original_file))
-        
-        if not os.path.exists(file_path):
+        if not processed_file.attendance_artifact and not os.path.exists(processed_file.original_file.path):
             return JsonResponse({'error': 'File not found'}, status=404)
         
-        # Load the processed data using matrix parser
-        try:
-            svc = ExcelProcessorService()
-            df = svc.processor.process_matrix_attendance(file_path)
-        except Exception:
-            df = pd.read_excel(file_path)
-        
-        # Get unique employee IDs
-        unique_employee_ids = df['Employee_ID'].dropna().unique()
-        
-        # Database connection
-        conn = psycopg2.connect(
-            host=config('DATABASE_HOST', default='localhost'),
-            database=config('DATABASE_NAME', default='admin_db'),
-            user=config('DATABASE_USER', default='postgres'),
-            password=config('DATABASE_PASSWORD', default='Testing@123'),
-            port=config('DATABASE_PORT', default='5432')
-        )
-        
-        # Get staff details ordered by priority first, then employment type
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # Build department filter
-        department_filter = ""
-        params = [list(unique_employee_ids)]
-        if not request.user.is_superuser and request.user.department:
-            department_filter = " AND department_id = %s"
-            params.append(request.user.department.id)
-        
-        cursor.execute(f"""
-            SELECT staffid, name, designation, level, section, weekly_off, type_of_employment, priority
-            FROM staff_details 
-            WHERE staffid = ANY(%s) 
-            AND type_of_employment = 'monthly wages'
-            {department_filter}
-            ORDER BY 
-                priority ASC,
-                CASE 
-                    WHEN REGEXP_REPLACE(staffid, '[^0-9]', '', 'g') ~ '^[0-9]+$' 
-                    THEN CAST(REGEXP_REPLACE(staffid, '[^0-9]', '', 'g') AS INTEGER)
-                    ELSE 999999
-                END ASC
-        """, params)
-        
-        staff_details = {row['staffid']: row for row in cursor.fetchall()}
-        cursor.close()
-        conn.close()
-        
-        # Load the template (using the same template for now)
-        template_path = os.path.join(settings.BASE_DIR, 'static', 'detailed_attendance_template.xlsx')
-        
-        if not os.path.exists(template_path):
+        engine = TemplateReportEngine(os.path.join(settings.BASE_DIR, 'static'))
+        reports = [get_report(name) for name in REPORT_SPECS]
+        if not all(os.path.exists(engine.template_path(report)) for report in reports):
             return JsonResponse({'error': 'Template file not found'}, status=404)
         
-        # Load template and create a copy
-        wb = openpyxl.load_workbook(template_path)
-        ws = wb['Template Sheet']  # Use the specific sheet name
-        
-        # Copy row heights from template
-        for row_num in range(1, ws.max_row + 1):
-            if ws.row_dimensions[row_num].height is not None:
-                # Preserve the original row height
-                original_height = ws.row_dimensions[row_num].height
-                ws.row_dimensions[row_num].height = original_height
-        
-        # Extract period from the original file
-        period = "Unknown Period"
-        try:
-            original_file_path = os.path.join(settings.MEDIA_ROOT, str(processed_file.original_file))
-            if os.path.exists(original_file_path):
-                # Read the original file to get period
-                original_df = pd.read_excel(original_file_path, header=None)
-                if len(original_df) >= 9:
-                    period_cell = original_df.iloc[8, 0]  # A9 cell
-                    if pd.notna(period_cell):
-                        period = str(period_cell)
-        except Exception as e:
-            logger.error(f"Error extracting period: {e}")
-        
-        # Helper function to safely set cell value
-        def safe_set_cell(worksheet, cell_address, value):
-            """Safely set cell value, handling merged cells"""
-            try:
-                cell = worksheet[cell_address]
-                # Check if cell is part of a merged range
-                for merged_range in worksheet.merged_cells.ranges:
-                    if cell_address in merged_range:
-                        # Set value to the top-left cell of the merged range
-                        top_left_cell = merged_range.top_left
-                        worksheet[top_left_cell] = value
-                        return
-                # If not merged, set normally
-                worksheet[cell_address] = value
-            except Exception as e:
-                logger.warning(f"Could not set cell {cell_address}: {e}")
+        df = load_attendance_frame(processed_file)
+        if df.empty:
+            return JsonResponse({'error': 'No attendance data found in the file.'}, status=400)
         
-        # Fill period in E1
-        safe_set_cell(ws, 'E1', f"Period: {period}")
-        
-        # Calculate total number of days in the selected period
-        total_days = 0
-        try:
-            # Extract start and end dates from period string
-            if ' - ' in period:
-                period_parts = period.split(' - ')
-                if len(period_parts) == 2:
-                    start_date_str = period_parts[0].strip()
-                    end_date_str = period_parts[1].strip()
-                    
-                    # Parse the dates (assuming format like 2082/03/01)
-                    try:
-                        # Split by '/' and extract year, month, day
-                        start_parts = start_date_str.split('/')
-                        end_parts = end_date_str.split('/')
-                        
-                        if len(start_parts) == 3 and len(end_parts) == 3:
-                            start_day = int(start_parts[2])
-                            end_day = int(end_parts[2])
-                            
-                            # Calculate total days (inclusive)
-                            total_days = end_day - start_day + 1
-                        else:
-                            # Fallback: count unique dates from data
-                            unique_dates = df['Date'].dropna().unique()
-                            total_days = len(unique_dates)
-                    except (ValueError, IndexError):
-                        # Fallback: count unique dates from data
-                        unique_dates = df['Date'].dropna().unique()
-                        total_days = len(unique_dates)
-                else:
-                    # Fallback: count unique dates from data
-                    unique_dates = df['Date'].dropna().unique()
-                    total_days = len(unique_dates)
-            else:
-                # Fallback: count unique dates from data
-                unique_dates = df['Date'].dropna().unique()
-                total_days = len(unique_dates)
-        except Exception as e:
-            logger.error(f"Error calculating total days: {e}")
-            total_days = 0
-        
-        # Fill total days in F2
-        safe_set_cell(ws, 'F2', total_days)
-        
-        # Process each employee in sorted order
-        row = 4  # Start from row 4
-        sorted_staff = list(staff_details.values())
-        for staff in sorted_staff:
-            emp_id = staff['staffid']
-            emp_data = df[df['Employee_ID'] == emp_id]
-            
-            # Calculate attendance statistics
-            present_days = 0
-            absent_days = 0
-            weekly_off_days = 0
-            allowance_days = 0
-            personal_leave_days = 0
-            sick_leave_days = 0
-            casual_leave_days = 0
-            substitute_leave_days = 0
-            duty_leave_days = 0
-            other_leave_days = 0
-            
-            present_dates = []
-            absent_dates = []
-            weekly_off_dates = []
-            allowance_dates = []
-            personal_leave_dates = []
-            sick_leave_dates = []
-            casual_leave_dates = []
-            substitute_leave_dates = []
-            duty_leave_dates = []
-            other_leave_dates = []
-            
-            # Process each day for this employee
-            for _, emp_row in emp_data.iterrows():
-                try:
-                    status = str(emp_row.get('Status', '')).strip().upper()
-                    date = emp_row.get('Date', '')
-                    in_time = emp_row.get('InTime', '')
-                    out_time = emp_row.get('OutTime', '')
-                except (KeyError, AttributeError):
-                    continue
-                
-                # Determine attendance status
-                if 'P' in status or 'A *' in status:
-                    present_days += 1
-                    present_dates.append(date)
-                    allowance_days += 1
-                    allowance_dates.append(date)
-                elif status == 'A':
-                    absent_days += 1
-                    absent_dates.append(date)
-                elif 'WO' in status or 'HO' in status:
-                    present_days += 1
-                    present_dates.append(date)
-                    weekly_off_days += 1
-                    weekly_off_dates.append(date)
-                    
-                    # Check if there's actual work time recorded for allowance
-                    has_work_time = (in_time and str(in_time).strip() != '' and str(in_time).strip() != 'nan') or \
-                                  (out_time and str(out_time).strip() != '' and str(out_time).strip() != 'nan')
-                    if has_work_time:
-                        allowance_days += 1
-                        allowance_dates.append(date)
-                elif 'PL' in status:
-                    personal_leave_days += 1
-                    personal_leave_dates.append(date)
-                elif 'SL' in status:
-                    sick_leave_days += 1
-                    sick_leave_dates.append(date)
-                elif 'CL' in status:
-                    casual_leave_days += 1
-                    casual_leave_dates.append(date)
-                elif 'SUBSTITUTE' in status or 'SUBL' in status:
-                    substitute_leave_days += 1
-                    substitute_leave_dates.append(date)
-                elif 'DUTY' in status:
-                    duty_leave_days += 1
-                    duty_leave_dates.append(date)
-                    # Also count as other leave for the M column (but don't add to other_leave_dates to avoid duplication in remarks)
-                    other_leave_days += 1
-                elif 'L' in status:
-                    # Count as other leave for the M column
-                    other_leave_days += 1
-                    other_leave_dates.append(date)
-                else:
-                    # Count as other leave if status doesn't match any specific leave type (PL, SL, CL, SUBSTITUTE)
-                    other_leave_days += 1
-                    other_leave_dates.append(date)
-            
-            # Fill data in the template
-            safe_set_cell(ws, f'B{row}', staff['name'].title())  # Proper case name
-            safe_set_cell(ws, f'C{row}', staff['staffid'])
-            safe_set_cell(ws, f'D{row}', staff['designation'])
-            safe_set_cell(ws, f'E{row}', staff['level'])
-            safe_set_cell(ws, f'F{row}', present_days)
-            safe_set_cell(ws, f'G{row}', personal_leave_days)  # PL count
-            safe_set_cell(ws, f'H{row}', sick_leave_days)      # SL count
-            safe_set_cell(ws, f'I{row}', casual_leave_days)    # CL count
-            safe_set_cell(ws, f'J{row}', substitute_leave_days) # Substitute count
-            safe_set_cell(ws, f'L{row}', absent_days)          # Absent count
-            safe_set_cell(ws, f'M{row}', other_leave_days)     # Other leave count
-            safe_set_cell(ws, f'N{row}', allowance_days)       # Allowance count
-            
-            # Fill weekly off day name instead of count
-            weekly_off_day = staff.get('weekly_off', '').title() if staff.get('weekly_off') else ''
-            safe_set_cell(ws, f'R{row}', weekly_off_day)
-            
-            # Create leave details string (show only day numbers)
-            import re
-            def day_only(val):
-                s = str(val)
-                m = re.match(r"\s*(\d{1,2})\b", s)
-                return m.group(1) if m else s
-            def join_days(values):
-                return ", ".join(day_only(v) for v in values)
-            leave_details = []
-            if personal_leave_dates:
-                leave_details.append(f"PL on {join_days(personal_leave_dates)}")
-            if casual_leave_dates:
-                leave_details.append(f"CL on {join_days(casual_leave_dates)}")
-            if sick_leave_dates:
-                leave_details.append(f"SL on {join_days(sick_leave_dates)}")
-            if substitute_leave_dates:
-                leave_details.append(f"SUBSTITUTE on {join_days(substitute_leave_dates)}")
-            if duty_leave_dates:
-                leave_details.append(f"DUTY on {join_days(duty_leave_dates)}")
-            if other_leave_dates:
-                leave_details.append(f"Other on {join_days(other_leave_dates)}")
-            if absent_dates:
-                leave_details.append(f"Absent on {join_days(absent_dates)}")
-            
-            safe_set_cell(ws, f'S{row}', ', '.join(leave_details))
-            
-            row += 1
-        
-        # Save the filled template
-        output_filename = f"monthly_wages_attendance_{processed_file.id}.xlsx"
-        output_path = os.path.join(settings.MEDIA_ROOT, 'processed', output_filename)
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        # Shared aggregates: one matrix, one status classification, one staff query
+        matrix = AttendanceMatrix.from_frame(df)
+        summary = AttendanceSummary(matrix)
+        with connection.cursor() as cursor:
+            cursor.execute(CompiledReport.ALL_STAFF_SQL, [[str(emp_id) for emp_id in matrix.employee_ids]])
+            columns = [col[0] for col in cursor.description]
+            staff_rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
         
-        wb.save(output_path)
+        department_id = None
+        if not request.user.is_superuser and request.user.department:
+            department_id = request.user.department.id
+        period = file_period(processed_file)
+        period_bounds = (processed_file.period_start, processed_file.period_end)
+        
+        cache = report_cache()
+        cache_key = report_cache_key(processed_file)
+        staff_version = StaffVersion.current(department_id)
+        
+        def members():
+            # Template reports come from the same ReportCache as the single-report views
+            for report in reports:
+                cached = cache.open_or_render(
+                    cache_key, report.spec.name, department_id, engine.revision(report), staff_version,
+                    lambda: engine.render(report, report.select(staff_rows, department_id), df, period,
+                                          period_bounds=period_bounds, summary=summary),
+                )
+                with cached:
+                    yield report.spec.output_name.format(file_id=processed_file.id), cached.read()
+            workbooks = SegregationReport(matrix, staff_rows, period).workbooks(
+                pool=render_pool(settings.REPORT_RENDER_PROCESSES), in_flight=settings.REPORT_RENDER_PROCESSES)
+            for filename, data in workbooks:
+                yield f'segregation/{filename}', data
+        
+        # The first member is produced before the response starts, so its errors still return JSON
+        response = StreamingHttpResponse(
+            stream_zip(prefetch_first(members()), f"Report bundle for file {processed_file.id}"),
+            content_type='application/zip',
+        )
+        response['Content-Disposition'] = f'attachment; filename="report_bundle_{processed_file.id}.zip"'
+        return response
         
-        # Return the file for download
-        with open(output_path, 'rb') as f:
-            response = HttpResponse(f.read(), content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="{output_filename}"'
-            return response
-            
     except Exception as e:
-        logger.error(f"Error generating monthly wages report: {str(e)}")
-        return JsonResponse({'error': f'Error generating monthly wages report: {str(e)}'}, status=500)
+        logger.error(f"Error generating report bundle: {str(e)}")
+        return JsonResponse({'error': f'Error generating report bundle: {str(e)}'}, status=500)
 
 
 # Section Management Views
@@ -1977,6 +1128,7 @@ class SectionCreateView(View):
                         INSERT INTO sections (name, code, department_id, description, is_active)
                         VALUES (%s, %s, %s, %s, %s)
                     """, [name, code, department_id, description, is_active])
+                StaffVersion.bump([department_id])
                 
                 messages.success(request, 'Section added successfully!')
                 return redirect('processor:section_list')
@@ -2071,12 +1223,18 @@ class SectionUpdateView(View):
                     raise Http404("Section not found")
                 
                 with connection.cursor() as cursor:
+                    # Both the old and the new department see the change
+                    cursor.execute("SELECT department_id FROM sections WHERE id = %s", [section_id])
+                    touched = [row[0] for row in cursor.fetchall()]
                     cursor.execute(f"""
                         UPDATE sections 
                         SET name = %s, code = %s, department_id = %s, description = %s, 
                             is_active = %s, updated_at = CURRENT_TIMESTAMP
                         WHERE id = %s{department_filter}
+                        RETURNING department_id
                     """, params)
+                    touched += [row[0] for row in cursor.fetchall()]
+                    StaffVersion.bump(touched)
                 
                 messages.success(request, 'Section updated successfully!')
                 return redirect('processor:section_list')
@@ -2149,7 +1307,8 @@ def delete_section(request, section_id):
     if request.method in ["POST", "DELETE", "GET"]:
         try:
             with connection.cursor() as cursor:
-                cursor.execute("DELETE FROM sections WHERE id = %s", [section_id])
+                cursor.execute("DELETE FROM sections WHERE id = %s RETURNING department_id", [section_id])
+                StaffVersion.bump([row[0] for row in cursor.fetchall()])
             
             messages.success(request, 'Section deleted successfully!')
         except Exception as e:
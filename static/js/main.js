@@ -59,21 +59,53 @@ $(document).ready(function() {
         return cookieValue;
     }
 
+    function renderProgress(data) {
+        var pct = Math.max(0, Math.min(100, data.progress || 0));
+        var message = data.message || 'Processing file...';
+        if (data.rows_per_second) {
+            message += ' (' + Math.round(data.rows_per_second) + ' rows/s, ' + Math.round(data.elapsed || 0) + 's)';
+        }
+        $('#progress-section').show();
+        $('#progress-message').text(message);
+        $('#progress-bar').css('width', pct + '%').attr('aria-valuenow', pct);
+        $('#progress-text').text(pct + '%');
+    }
+
+    function finishProgress(data) {
+        $('#submit-btn').prop('disabled', false).html('Upload');
+        if (data.status === 'completed') {
+            showAlert('Processing complete!', 'success');
+            setTimeout(function() { location.reload(); }, 1500);
+        } else {
+            showAlert('Processing failed: ' + data.message, 'danger');
+        }
+    }
+
+    function isFinished(data) {
+        return data.status === 'completed' || data.status === 'failed';
+    }
+
+    // Poll the progress snapshot, backing off from 2s to 10s while nothing changes
     function pollProgress(progress_id) {
+        var delay = 2000;
+        var lastProgress = null;
         function check() {
             $.get('/app/progress/' + progress_id + '/', function(data) {
-                // Update progress bar/spinner here as needed
-                if (data.status === 'completed' || data.status === 'failed') {
-                    $('#submit-btn').prop('disabled', false).html('Upload');
-                    if (data.status === 'completed') {
-                        showAlert('Processing complete!', 'success');
-                        setTimeout(function() { location.reload(); }, 1500);
-                    } else {
-                        showAlert('Processing failed: ' + data.message, 'danger');
-                    }
+                renderProgress(data);
+                if (isFinished(data)) {
+                    finishProgress(data);
+                    return;
+                }
+                if (data.progress !== lastProgress) {
+                    delay = 2000;
+                    lastProgress = data.progress;
                 } else {
-                    setTimeout(check, 2000);
+                    delay = Math.min(delay * 1.5, 10000);
                 }
+                setTimeout(check, delay);
+            }).fail(function() {
+                delay = Math.min(delay * 2, 10000);
+                setTimeout(check, delay);
             });
         }
         check();